@@ -1,14 +1,38 @@
+import os
+import sqlite3
+
 import click
-# import sqlite3
-from io import StringIO
 
-from src.web_server import create_app
-from src.utils import *
+from src.config import DEFAULT_ILIAS_URL, parse_config
+from src.database import connect, init_db
+
+# The modules of the modes (and with them dash, flask, selenium, rich, openpyxl and numpy) are imported
+# in the branch of their mode only, so every mode starts up without loading the dependencies of the others
+
+
+def import_assignment_sheets(lecture_marker, output_dir, config, workers):
+    from src.bootstrap import bootstrap_assignments
+
+    conn = connect(os.path.join(output_dir, f'{lecture_marker}.sqlite3'))
+    report = bootstrap_assignments(conn, parse_config(config).values(), workers)
+    conn.close()
+    print(f"Imported {len(report['imported'])}, skipped {len(report['skipped'])} unchanged and "
+          f"failed {len(report['failed'])} assignment sheet(s).")
+
+
+def server_metrics(metrics, slow_callback_ms):
+    # A slow-callback threshold alone instruments the server too, but without serving '/metrics'
+    if not metrics and slow_callback_ms is None:
+        return {}
+    from src.metrics import Metrics
+
+    return {'metrics': Metrics(None if slow_callback_ms is None else slow_callback_ms / 1000),
+            'expose_metrics': metrics}
 
 
 @click.command()
 @click.option("-m", "--mode", default="webserver",
-              help="either 'webserver', 'legacy', or 'feedback' specifying the operation mode, default='webserver'")
+              help="either 'webserver', 'serve', 'legacy', 'feedback', 'export', 'import', 'bootstrap', or 'gradebook' specifying the operation mode, default='webserver'")
 @click.option("-l", "--lecture-marker", default="ssbi25",
               help="string-marker to be added to output filenames, default='ssbi25'")
 @click.option("-o", "--output-dir", default="example",
@@ -17,101 +41,105 @@ from src.utils import *
               help="filepath to configuration file containing all specifications of the assignments, default='example/config_example.txt'")
 @click.option("-u", "--feedback-dir", default="example/ass1",
               help="output directory for feedbacks to upload (only relevant if mode='feedback'), default='example/ass1'")
-def main(mode, lecture_marker, output_dir, config, feedback_dir):
-    if mode in ['legacy', 'webserver', 'feedback']:
-        if mode == 'feedback':
+@click.option("--changeset", default=None,
+              help="changeset file to write (mode='export') or apply (mode='import'), default='<output-dir>/<lecture-marker>_changes.jsonl'")
+@click.option("--since", default=None,
+              help="only export gradings changed after this unix timestamp or ISO date/time (only relevant if mode='export'), default=all gradings")
+@click.option("--merge-policy", default="theirs", type=click.Choice(['theirs', 'mine', 'newest']),
+              help="which version of a task graded on both sides to keep (only relevant if mode='import'), default='theirs'")
+@click.option("--gradebook", default=None,
+              help="file to write the gradebook of all assignments to, as CSV if it ends with '.csv' and as xlsx otherwise (only relevant if mode='gradebook'), default='<output-dir>/<lecture-marker>_gradebook.xlsx'")
+@click.option("--totals-only", is_flag=True, default=False,
+              help="only write the points per assignment to the gradebook, not those per task (only relevant if mode='gradebook')")
+@click.option("--host", default="127.0.0.1",
+              help="interface the web server listens on (only relevant if mode='webserver' or 'serve'), default='127.0.0.1'")
+@click.option("--port", default=8050, type=int,
+              help="port the web server listens on (only relevant if mode='webserver' or 'serve'), default=8050")
+@click.option("--threads", default=8, type=int,
+              help="number of worker threads and database connections (only relevant if mode='serve'), default=8")
+@click.option("--bootstrap", is_flag=True, default=False,
+              help="import the ILIAS sheets of all assignments listed in the config before starting (only relevant if mode='webserver' or 'serve')")
+@click.option("--workers", default=None, type=int,
+              help="number of worker processes parsing ILIAS sheets or transcribing grading sheets in parallel (only relevant if mode='bootstrap', 'legacy' or with '--bootstrap'), default=number of CPUs")
+@click.option("--upload-workers", default=4, type=int,
+              help="number of feedback files uploaded concurrently (only relevant if mode='feedback'), default=4")
+@click.option("--ilias-url", default=DEFAULT_ILIAS_URL,
+              help=f"start page of the ILIAS instance to upload to (only relevant if mode='feedback'), default='{DEFAULT_ILIAS_URL}'")
+@click.option("--metrics", is_flag=True, default=False,
+              help="record latency histograms of callbacks and SQL statements and serve them on '/metrics' (only relevant if mode='webserver' or 'serve')")
+@click.option("--slow-callback-ms", default=None, type=float,
+              help="log every callback taking longer than this many milliseconds (only relevant if mode='webserver' or 'serve'), default=off")
+def main(mode, lecture_marker, output_dir, config, feedback_dir, changeset, since, merge_policy, gradebook, totals_only,
+         host, port, threads, bootstrap, workers, upload_workers, ilias_url, metrics, slow_callback_ms):
+    if mode in ['legacy', 'webserver', 'serve', 'feedback', 'export', 'import', 'bootstrap', 'gradebook']:
+        if mode in ['export', 'import']:
+            from src.changeset import export_changeset, import_changeset, parse_since
+
+            database = os.path.join(output_dir, f'{lecture_marker}.sqlite3')
+            if not os.path.exists(database):
+                raise IOError(f"Database {database} does not exist.")
+            changeset = changeset or os.path.join(output_dir, f'{lecture_marker}_changes.jsonl')
+            conn = sqlite3.connect(database)
+            init_db(conn)
+            if mode == 'export':
+                with open(changeset, 'w', encoding='utf-8') as f:
+                    report = export_changeset(conn, f, parse_since(since))
+                print(f"Exported {report['tasks']} changed task(s) to {changeset}. "
+                      f"Use '--since {report['until']}' to export only later changes next time.")
+            else:
+                with open(changeset, 'r', encoding='utf-8') as f:
+                    report = import_changeset(conn, f, merge_policy)
+                print(f"Applied {report['tasks']} of {report['received']} changed task(s) for {report['teams']} team(s).")
+            conn.close()
+        elif mode == 'feedback':
             if not feedback_dir:
                 raise ValueError("For mode='feedback' the parameter '--feedback-dir' has to be specified.")
             if not os.path.exists(feedback_dir):
                 raise IOError(f"Feedback directory {feedback_dir} does not exist.")
-            upload_to_ilias(feedback_dir)
+            from src.ilias import upload_to_ilias
+
+            upload_to_ilias(feedback_dir, upload_workers, ilias_url)
+        elif mode == 'bootstrap':
+            import_assignment_sheets(lecture_marker, output_dir, config, workers)
+        elif mode == 'gradebook':
+            from src.config import LectureConfig
+            from src.gradebook import export_gradebook
+
+            database = os.path.join(output_dir, f'{lecture_marker}.sqlite3')
+            if not os.path.exists(database):
+                raise IOError(f"Database {database} does not exist.")
+            gradebook = gradebook or os.path.join(output_dir, f'{lecture_marker}_gradebook.xlsx')
+            conn = connect(database)
+            init_db(conn)
+            report = export_gradebook(conn, LectureConfig(config), gradebook,
+                                      'csv' if gradebook.lower().endswith('.csv') else 'xlsx', totals_only)
+            conn.close()
+            print(f"Wrote the points of {report['students']} student(s) in {len(report['assignments'])} "
+                  f"assignment(s) to {gradebook}.")
         elif mode == 'webserver':
-            app = create_app(lecture_marker, output_dir, config)
-            app.run(host='127.0.0.1', debug=False, port=8050)
+            from src.web_server import create_app
+
+            if bootstrap:
+                import_assignment_sheets(lecture_marker, output_dir, config, workers)
+            app = create_app(lecture_marker, output_dir, config, **server_metrics(metrics, slow_callback_ms))
+            app.run(host=host, debug=False, port=port)
+        elif mode == 'serve':
+            from waitress import serve
+
+            from src.web_server import create_app
+
+            if bootstrap:
+                import_assignment_sheets(lecture_marker, output_dir, config, workers)
+            app = create_app(lecture_marker, output_dir, config, pool_size=threads,
+                             **server_metrics(metrics, slow_callback_ms))
+            print(f"Serving on http://{host}:{port} with {threads} threads")
+            serve(app, host=host, port=port, threads=threads)
         else:
-            output_dir = output_dir + '/' if not output_dir.endswith('/') else output_dir
-            assignments = read_config(config)
-            # database_name = f"{lecture_marker}.sqlite3"
-
-            for i in range(len(assignments["nums"])):
-                failed = False
-                assignment_no = assignments["nums"][i]
-                filepath = assignments["files"][i]
-                tasks_and_max_points = assignments["tasks"][i]
-
-                # # Check whether Ilias Assignment excel was given
-                # try:
-                #     assignment_xlsx = assignments["ass_xl"][i]
-                # except IndexError:
-                #     assignment_xlsx = None
-                #     print(f"No path specified for Ilias assignment excel for assignment no.{assignment_no}.\n"
-                #           f"Skipping database table creation.")
-                # # If Ilias Assignment excel was given, attempt to create database
-                # if assignment_xlsx:
-                #     try:
-                #         sqlite_filepath = output_dir + database_name
-                #         conn = sqlite3.connect(sqlite_filepath)
-                #         _ = excel_to_sqlite(assignment_xlsx, conn, True)
-                #         conn.close()
-                #         pass
-                #     except ValueError:
-                #         print("Error: Database option format must be 'xlsx_file:sqlite_file'")
-
-                empty_table_str = "task,points_reached,points_max,comment\n"
-                for task, max_points in tasks_and_max_points.items():
-                    empty_table_str += f"{task},,{max_points},\n"
-                empty_table = pd.read_csv(StringIO(empty_table_str),
-                                          sep=',',
-                                          index_col=False,
-                                          dtype={'task': int, 'points_reached': float, 'points_max': float, 'comment': str})
-
-                if os.path.exists(filepath):
-                    # sanity test
-                    test_no_of_elements(open(filepath, 'r').read().split('\n'), len(tasks_and_max_points))
-
-                    try:
-                        df = pd.read_csv(filepath, sep=',', index_col=0)
-                    except pd.errors.ParserError as e:
-                        raise IOError(f"Unable to parse csv {filepath} with pandas (Message: {e})")
-                    for names, point_list in {name: {task: df.loc[name, task] for task in df.columns} for name in df.index}.items():
-                        for name in names.split(','):
-                            out_str = ''
-                            for task, point_comment in point_list.items():
-                                if ':' in str(point_comment):
-                                    points, comment = point_comment.split(':', 1)
-                                else:
-                                    points = point_comment
-                                    comment = ''
-                                comment = comment.replace('|', '\n')
-                                empty_table.loc[int(task) - 1, "points_reached"] = float(points)
-                                empty_table.loc[int(task) - 1, "comment"] = str(comment)
-                            out_str += empty_table.to_markdown(index=None)
-                            try:
-                                total_points_reached = empty_table["points_reached"].astype(float).sum()
-                                total_max_points = empty_table["points_max"].astype(float).sum()
-                                out_str += f'\nTotal points reached: {total_points_reached} of {total_max_points}'
-                            except ValueError:
-                                print(f"Found non-floatable value in feedback for {name}.")
-                                continue
-
-                            if (total_points_reached <= total_max_points) and ("TODO" not in out_str):
-                                if not os.path.exists(f"{output_dir}ass{assignment_no}"):
-                                    os.mkdir(f"{output_dir}ass{assignment_no}")
-                                with open(f"{output_dir}ass{assignment_no}/{lecture_marker}_ass{assignment_no}_feedback_{name}.md", 'w') as f:
-                                    f.write(out_str)
-                            elif total_points_reached > total_max_points:
-                                print(f"Error. Total points calculated exceed total points intended:\n{out_str}\n")
-                            elif "TODO" in out_str:
-                                print(f"Error. Found TODO in output:\n{out_str}\n")
-                            else:
-                                print(f"Unknown Error in output:\n{out_str}\n")
-                else:
-                    print(f"Could not find {filepath}.")
-                    failed = True
-                if not failed:
-                    print(f"Finished writing outputs for {filepath}.")
+            from src.legacy import transcribe_lecture
+
+            transcribe_lecture(parse_config(config).values(), lecture_marker, output_dir, workers)
     else:
-        raise ValueError("Parameter '--mode' has to be specified as either 'legacy', 'webserver', or 'feedback'.")
+        raise ValueError("Parameter '--mode' has to be specified as either 'legacy', 'webserver', 'serve', 'feedback', 'export', 'import', 'bootstrap', or 'gradebook'.")
 
 
 if __name__ == "__main__":
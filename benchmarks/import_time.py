@@ -0,0 +1,88 @@
+"""
+Check the import time of every mode of the command line against a budget, measured with 'python -X importtime':
+
+    python -m benchmarks.import_time [--runs 3] [--scale 1.0] [--output import_times.json]
+
+Besides the time, each mode must not import the heavy dependencies of other modes. The exit code is 1 if any mode
+exceeds its budget or imports a forbidden module.
+"""
+import json
+import subprocess
+import sys
+
+import click
+
+# Modules imported by a mode on top of the command line itself, its budget in milliseconds and the dependencies it
+# must not load. The budgets leave room for slower machines, they are meant to catch new top-level imports.
+MODES = {
+    'cli': ([], 250, ['dash', 'flask', 'selenium', 'rich', 'openpyxl', 'numpy', 'pandas']),
+    'legacy': (['src.legacy'], 600, ['dash', 'flask', 'selenium', 'rich', 'openpyxl', 'pandas']),
+    'feedback': (['src.ilias'], 500, ['dash', 'flask', 'openpyxl', 'numpy', 'pandas']),
+    'export/import': (['src.changeset'], 300, ['dash', 'flask', 'selenium', 'rich', 'openpyxl', 'numpy', 'pandas']),
+    'gradebook': (['src.gradebook'], 300, ['dash', 'flask', 'selenium', 'rich', 'openpyxl', 'numpy', 'pandas']),
+    'bootstrap': (['src.bootstrap'], 500, ['dash', 'flask', 'selenium', 'rich', 'numpy', 'pandas']),
+    'webserver': (['src.web_server'], 3000, ['selenium', 'pandas']),
+}
+_CLI_MODULE = 'assignment_feedback'
+
+
+def _top_level_imports(stderr: str) -> dict[str, int]:
+    # Lines look like 'import time:  self [us] | cumulative | imported package', nested imports are indented
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or line.count('|') != 2:
+            continue
+        _, cumulative, name = line.split('|')
+        if cumulative.strip().isdigit() and not name.startswith('  '):
+            imports[name.strip()] = int(cumulative)
+    return imports
+
+
+def measure_imports(modules: list[str]) -> tuple[float, set[str]]:
+    """
+    Milliseconds spent importing 'modules' in a fresh interpreter (interpreter startup excluded) and all modules
+    loaded by then
+    """
+    statement = f"import sys; import {', '.join(modules)}; sys.stdout.write(' '.join(sys.modules))"
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], capture_output=True, text=True,
+                            check=True)
+    baseline = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import sys'], capture_output=True,
+                              text=True, check=True)
+    startup = _top_level_imports(baseline.stderr)
+    imports = _top_level_imports(result.stderr)
+    return (sum(cumulative for name, cumulative in imports.items() if name not in startup) / 1000,
+            set(result.stdout.split()))
+
+
+def check_modes(runs: int = 3, scale: float = 1.0) -> list[dict]:
+    results = []
+    for mode, (modules, budget, forbidden) in MODES.items():
+        measurements = [measure_imports([_CLI_MODULE] + modules) for _ in range(runs)]
+        milliseconds = min(ms for ms, _ in measurements)
+        loaded = measurements[0][1]
+        results.append({'mode': mode, 'milliseconds': round(milliseconds, 1), 'budget': budget * scale,
+                        'forbidden': sorted(module for module in forbidden if module in loaded)})
+    return results
+
+
+@click.command()
+@click.option("--runs", default=3, type=int, help="fresh interpreters per mode, the fastest one counts, default=3")
+@click.option("--scale", default=1.0, type=float, help="factor applied to all budgets, default=1.0")
+@click.option("--output", default=None, help="write the results as JSON to this file")
+def main(runs, scale, output):
+    results = check_modes(runs, scale)
+    failed = False
+    for result in results:
+        over_budget = result['milliseconds'] > result['budget']
+        failed |= over_budget or bool(result['forbidden'])
+        status = 'OK' if not over_budget and not result['forbidden'] else 'FAIL'
+        print(f"{result['mode']:<14} {result['milliseconds']:>8.1f} ms  (budget {result['budget']:.0f} ms)  {status}"
+              + (f"  imports {', '.join(result['forbidden'])}" if result['forbidden'] else ''))
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=1)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Local stand-in for the ILIAS pages used by the feedback upload: the hand-ins table of an assignment, the
+'Evaluation by File' upload page of each team and its upload form. Run it standalone and pass its URL as
+'--ilias-url' to try the upload mode offline:
+
+    python -m benchmarks.mock_ilias --teams 200 --latency 0.05
+"""
+import html
+import json
+import random
+import secrets
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import click
+
+_LABELS = {'en': {'evaluation': 'Evaluation by File', 'upload': 'Upload', 'success': 'The file has been uploaded.'},
+           'de': {'evaluation': 'Rückmeldung per Datei', 'upload': 'Hochladen',
+                  'success': 'Die Datei wurde hochgeladen.'}}
+_SESSION_COOKIE = 'PHPSESSID'
+
+
+class MockIlias:
+    """
+    State of the mock: the teams of one assignment, the files uploaded per team and the behaviour to simulate
+    """
+    def __init__(self, teams: int = 50, latency: float = 0.0, failure_rate: float = 0.0, language: str = 'en',
+                 seed: int = 0):
+        self.teams = [str(100000 + i) for i in range(teams)]
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.labels = _LABELS[language]
+        self.session = secrets.token_hex(16)
+        self.token = secrets.token_hex(8)
+        self.uploads = {team: [] for team in self.teams}
+        self.requests = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'requests': self.requests, 'failures': self.failures,
+                    'uploads': sum(len(files) for files in self.uploads.values()),
+                    'teams_uploaded': sum(1 for files in self.uploads.values() if files),
+                    'duplicates': sum(len(files) - 1 for files in self.uploads.values() if len(files) > 1)}
+
+    def fail(self) -> bool:
+        with self._lock:
+            failed = self._random.random() < self.failure_rate
+            self.failures += failed
+            return failed
+
+    def hand_ins_page(self) -> str:
+        rows = ''.join(f'<tr><td><div class="il-user small">Team {i + 1} ({team})</div></td>'
+                       f'<td><button class="btn btn-default" data-action="ilias.php?baseClass=ilexercisehandlergui'
+                       f'&amp;cmd=listFiles&amp;member_id={team}">{self.labels["evaluation"]}</button></td></tr>'
+                       for i, team in enumerate(self.teams))
+        return (f'<html><body><h1>Hand-ins</h1><div class="table-responsive"><table class="table">'
+                f'<tr><th>Team</th><th>Action</th></tr>{rows}</table></div></body></html>')
+
+    def upload_page(self, team: str, success: bool = False) -> str:
+        files = ''.join(f'<tr><td><a href="#">{html.escape(name)}</a></td></tr>' for name in self.uploads[team])
+        alert = f'<div class="alert alert-success">{self.labels["success"]}</div>' if success else ''
+        return (f'<html><body>{alert}<form action="ilias.php?baseClass=ilexercisehandlergui&amp;cmd=post'
+                f'&amp;member_id={team}&amp;rtoken={self.token}" method="post" enctype="multipart/form-data">'
+                f'<input type="hidden" name="MAX_FILE_SIZE" value="20971520">'
+                f'<input type="file" id="new_file" name="new_file">'
+                f'<input type="submit" class="btn" name="cmd[uploadFile]" value="{self.labels["upload"]}"></form>'
+                f'<table class="table table-striped">{files}</table></body></html>')
+
+
+def make_handler(ilias: MockIlias):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, body: str = '', headers: dict = None):
+            self.send_response(status)
+            for name, value in dict({'Content-Type': 'text/html; charset=utf-8'}, **(headers or {})).items():
+                self.send_header(name, value)
+            data = body.encode()
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _logged_in(self) -> bool:
+            return f"{_SESSION_COOKIE}={ilias.session}" in (self.headers.get('Cookie') or '')
+
+        def _begin(self) -> dict:
+            with ilias._lock:
+                ilias.requests += 1
+            if ilias.latency:
+                time.sleep(ilias.latency)
+            return {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+
+        def do_GET(self):
+            query = self._begin()
+            path = urlparse(self.path).path
+            if path == '/mock/stats':
+                self._send(200, json.dumps(ilias.stats()), {'Content-Type': 'application/json'})
+            elif path in ('/', '/login.php'):
+                # Logging in is just visiting the start page
+                self._send(200, '<html><body><a href="ilias.php?baseClass=ilexercisehandlergui&amp;cmd=members">'
+                                'Hand-ins</a></body></html>',
+                           {'Set-Cookie': f"{_SESSION_COOKIE}={ilias.session}; Path=/"})
+            elif not self._logged_in():
+                self._send(200, '<html><body><form id="login"></form></body></html>')
+            elif query.get('cmd') == 'members':
+                self._send(200, ilias.hand_ins_page())
+            elif query.get('cmd') == 'listFiles' and query.get('member_id') in ilias.uploads:
+                self._send(200, ilias.upload_page(query['member_id'], success=query.get('uploaded') == '1'))
+            else:
+                self._send(404, 'Not found')
+
+        def do_POST(self):
+            query = self._begin()
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            team = query.get('member_id')
+            if not self._logged_in() or query.get('rtoken') != ilias.token or team not in ilias.uploads:
+                self._send(403, 'Forbidden')
+                return
+            if ilias.fail():
+                self._send(500, '<html><body><div class="alert alert-danger">Internal error</div></body></html>')
+                return
+            message = BytesParser(policy=HTTP).parsebytes(
+                f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode() + body)
+            fields = {part.get_param('name', header='content-disposition'): part for part in message.iter_parts()}
+            upload = fields.get('new_file')
+            if upload is None or not upload.get_filename() or 'cmd[uploadFile]' not in fields:
+                self._send(200, ilias.upload_page(team))
+                return
+            with ilias._lock:
+                ilias.uploads[team].append(upload.get_filename())
+            # Like ILIAS, answer the upload with a redirect to the upload page showing the success message
+            self._send(303, '', {'Location': f"ilias.php?baseClass=ilexercisehandlergui&cmd=listFiles"
+                                             f"&member_id={team}&uploaded=1"})
+
+    return Handler
+
+
+def start_mock_ilias(ilias: MockIlias, host: str = '127.0.0.1', port: int = 0) -> tuple[ThreadingHTTPServer, str]:
+    """
+    Serve the mock in a background thread, returns the server and its base URL
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(ilias))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_port}/"
+
+
+def hand_ins_url(base_url: str) -> str:
+    return base_url.rstrip('/') + '/ilias.php?baseClass=ilexercisehandlergui&cmd=members'
+
+
+@click.command()
+@click.option("--teams", default=50, type=int, help="number of teams listed on the hand-ins page, default=50")
+@click.option("--latency", default=0.0, type=float, help="seconds every request is delayed, default=0")
+@click.option("--failure-rate", default=0.0, type=float, help="share of uploads answered with an error, default=0")
+@click.option("--language", default='en', type=click.Choice(['en', 'de']), help="language of the pages, default='en'")
+@click.option("--host", default="127.0.0.1", help="interface to listen on, default='127.0.0.1'")
+@click.option("--port", default=8081, type=int, help="port to listen on, default=8081")
+def main(teams, latency, failure_rate, language, host, port):
+    ilias = MockIlias(teams, latency, failure_rate, language)
+    server = ThreadingHTTPServer((host, port), make_handler(ilias))
+    print(f"Mock ILIAS on http://{host}:{port}/ (hand-ins page: {hand_ins_url(f'http://{host}:{port}/')})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(ilias.stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+Time every hot path of the tool on a synthetic lecture (see benchmarks/synthetic_lecture.py): the xlsx import, the web
+server callbacks (requested through Dash's HTTP endpoint like the browser does) and the legacy transcription:
+
+    python -m benchmarks.suite --teams 300 --tasks 6 --lines 4 --repeat 5 --output results.json [--compare old.json]
+
+The results are written as JSON, comparing them with the results of an earlier version shows regressions.
+"""
+import base64
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import click
+
+from benchmarks.synthetic_lecture import generate_lecture
+from src.config import LectureConfig, parse_config
+from src.database import connect, init_db
+from src.legacy import transcribe_lecture
+from src.utils import excel_to_sqlite
+from src.web_server import create_app
+
+# Ratio of two medians above which the comparison flags a benchmark as regressed, differences below the noise floor
+# (in seconds) are never flagged
+_REGRESSION_RATIO = 1.2
+_NOISE_SECONDS = 0.005
+# Pause before stepping to the next team, standing in for the tutor reading the current one
+_THINK_SECONDS = 0.05
+
+
+class DashClient:
+    """
+    Trigger the callbacks of a Dash app through its '/_dash-update-component' endpoint with the Flask test client
+    """
+    def __init__(self, app):
+        self.client = app.test_client()
+        self.dependencies = self.client.get('/_dash-dependencies').get_json()
+
+    @staticmethod
+    def _matches(dependency_id, component_id) -> bool:
+        # Pattern-matching ids are listed as JSON with wildcards, a concrete id matches on its 'type'
+        if isinstance(component_id, dict):
+            return dependency_id.startswith('{') and json.loads(dependency_id).get('type') == component_id['type']
+        return dependency_id == component_id
+
+    def _dependency(self, component_id, prop):
+        for dependency in self.dependencies:
+            if any(self._matches(i['id'], component_id) and i['property'] == prop for i in dependency['inputs']):
+                return dependency
+        raise KeyError(f"No callback triggered by {component_id}.{prop}")
+
+    @staticmethod
+    def _outputs(output):
+        outputs = []
+        for part in output.strip('.').split('...') if output.startswith('..') else [output]:
+            component_id, prop = part.rsplit('.', 1)
+            outputs.append({'id': json.loads(component_id) if component_id.startswith('{') else component_id,
+                            'property': prop})
+        return outputs if output.startswith('..') else outputs[0]
+
+    def call(self, trigger, inputs, state=(), no_output=False):
+        """
+        Run the callback triggered by 'trigger' (an id/property pair), 'inputs' and 'state' list the values of all
+        inputs and states of the callback in the shape Dash sends them
+        """
+        dependency = self._dependency(trigger['id'], trigger['property'])
+        component_id = trigger['id']
+        if isinstance(component_id, dict):
+            component_id = json.dumps(component_id, separators=(',', ':'), sort_keys=True)
+        payload = {'output': dependency['output'],
+                   'outputs': [] if no_output else self._outputs(dependency['output']),
+                   'inputs': list(inputs), 'state': list(state),
+                   'changedPropIds': [f"{component_id}.{trigger['property']}"]}
+        response = self.client.post('/_dash-update-component', json=payload)
+        if response.status_code not in (200, 204):
+            raise RuntimeError(f"Callback failed with status {response.status_code}: {response.data[:500]!r}")
+        return response.data
+
+
+def measure(function, repeat: int, setup=None) -> dict:
+    """
+    Run 'function' 'repeat' times (after 'setup', which is not timed) and summarize the wall times in seconds
+    """
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        runs.append(time.perf_counter() - start)
+    return {'min': min(runs), 'median': statistics.median(runs), 'mean': statistics.fmean(runs), 'max': max(runs),
+            'runs': runs}
+
+
+def _value(component_id, prop, value):
+    return {'id': component_id, 'property': prop, 'value': value}
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_suite(teams: int = 300, tasks: int = 6, assignments: int = 3, lines: int = 4, repeat: int = 5,
+              workers: int = None) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        lecture = generate_lecture(os.path.join(directory, 'lecture'), teams, tasks, assignments, lines)
+        assignment = lecture.assignments[0]
+
+        # Import of one ILIAS sheet into a fresh database
+        import_db = os.path.join(directory, 'import.sqlite3')
+
+        def fresh_import_db():
+            if os.path.exists(import_db):
+                os.remove(import_db)
+
+        def import_sheet():
+            conn = connect(import_db)
+            init_db(conn)
+            excel_to_sqlite(lecture.xlsx[0], conn, table_name=assignment)
+            conn.close()
+
+        results['excel_to_sqlite'] = measure(import_sheet, repeat, fresh_import_db)
+
+        # Web server callbacks on a copy of the pre-graded database
+        web_dir = os.path.join(directory, 'web')
+        os.makedirs(web_dir)
+        shutil.copy(lecture.database, os.path.join(web_dir, f"{lecture.lecture_marker}.sqlite3"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            app = create_app(lecture.lecture_marker, web_dir, lecture.config)
+        client = DashClient(app)
+        team = str(lecture.teams[len(lecture.teams) // 2])
+
+        submission_inputs = [_value('assignment-select', 'value', assignment), _value('filter-team', 'value', None),
+                             _value('filter-name', 'value', None), _value('filter-status', 'value', 'all'),
+                             _value('sort-teams', 'value', 'team'),
+                             _value('submission-pagination', 'active_page', 1),
+                             _value('submission-refresh', 'data', None)]
+        results['get_submission_list'] = measure(
+            lambda: client.call(submission_inputs[0], submission_inputs), repeat)
+
+        view_button = {'type': 'view-button', 'index': team}
+        view_state = submission_inputs[:5]
+        results['get_grading_view'] = measure(
+            lambda: client.call({'id': view_button, 'property': 'n_clicks'}, [[_value(view_button, 'n_clicks', 1)]],
+                                view_state), repeat)
+
+        # Save all tasks of the team with 'lines' comment lines each, changing them on every run. The grading view
+        # is opened (untimed) before each save, as saves are based on the gradings it shows.
+        spec = LectureConfig(lecture.config).for_table(assignment)
+        line_ids = [f"{task}_{i}" for task in spec.tasks for i in range(lines)]
+        save_state = {}
+
+        def open_team():
+            response = json.loads(client.call({'id': view_button, 'property': 'n_clicks'},
+                                              [[_value(view_button, 'n_clicks', 1)]], view_state))
+            run = len(save_state)
+            save_state[run] = [
+                [_value({'type': 'penalty-input', 'index': i}, 'value', -1) for i in line_ids],
+                [_value({'type': 'comment-input', 'index': i}, 'value', f"Comment {i} ({run})") for i in line_ids],
+                [_value({'type': 'comment-input', 'index': i}, 'id', {'type': 'comment-input', 'index': i})
+                 for i in line_ids],
+                _value('team-name', 'children', team), _value('assignment-select', 'value', assignment),
+                _value('grading-base', 'data', response['response']['grading-base']['data'])]
+
+        results['save_gradings'] = measure(
+            lambda: client.call({'id': 'save-button', 'property': 'n_clicks'}, [_value('save-button', 'n_clicks', 1)],
+                                save_state[len(save_state) - 1], no_output=True), repeat, open_team)
+
+        # Suggestions for a partly typed comment, looked up in the in-memory comment index
+        comment_input = {'type': 'comment-input', 'index': f"{spec.tasks[0]}_0"}
+        results['suggest_comments'] = measure(
+            lambda: client.call({'id': comment_input, 'property': 'value'},
+                                [_value(comment_input, 'value', 'missing'), []],
+                                [_value({'type': 'comment-suggestion-data', 'index': comment_input['index']}, 'data',
+                                        None)]), repeat)
+
+        # Step to the next team without changes, the neighbours of the open team are prefetched in the meantime
+        navigation = {}
+
+        def next_team_state():
+            if not navigation:
+                response = json.loads(client.call({'id': view_button, 'property': 'n_clicks'},
+                                                  [[_value(view_button, 'n_clicks', 1)]], view_state))['response']
+                navigation.update(base=response['grading-base']['data'], order=response['grading-order']['data'])
+            lines = [(f"{task}_{i}", line) for task, task_lines in navigation['base']['lines'].items()
+                     for i, line in enumerate(task_lines)]
+            navigation['state'] = [
+                [_value({'type': 'penalty-input', 'index': i}, 'value', line[0]) for i, line in lines],
+                [_value({'type': 'comment-input', 'index': i}, 'value', line[1]) for i, line in lines],
+                [_value({'type': 'comment-input', 'index': i}, 'id', {'type': 'comment-input', 'index': i})
+                 for i, _ in lines],
+                _value('team-name', 'children', navigation['base']['team']),
+                _value('grading-base', 'data', navigation['base']), _value('grading-order', 'data', navigation['order'])]
+            time.sleep(_THINK_SECONDS)
+
+        def next_team():
+            response = json.loads(client.call({'id': 'save-next', 'property': 'n_clicks'},
+                                              [_value('save-previous', 'n_clicks', None),
+                                               _value('save-next', 'n_clicks', 1)], navigation['state']))
+            navigation['base'] = response['response']['grading-base']['data']
+
+        results['next_team'] = measure(next_team, repeat, next_team_state)
+
+        with open(lecture.other_database, 'rb') as f:
+            other_database = 'data:application/octet-stream;base64,' + base64.b64encode(f.read()).decode()
+        merge_inputs = [_value('upload-db', 'contents', other_database),
+                        _value('upload-db', 'filename', os.path.basename(lecture.other_database)),
+                        _value('upload-db', 'last_modified', time.time())]
+        results['merge_grading_from_other_tutors'] = measure(
+            lambda: client.call(merge_inputs[0], merge_inputs, [_value('merge-policy', 'value', 'newest')],
+                                no_output=True), repeat)
+
+        # Read from the summary tables, the time should not grow with the number of teams
+        results['open_statistics'] = measure(
+            lambda: client.call({'id': 'open-stats', 'property': 'n_clicks'}, [_value('open-stats', 'n_clicks', 1)],
+                                [_value('assignment-select', 'value', assignment)]), repeat)
+
+        results['export_lecture_gradebook'] = measure(
+            lambda: client.call({'id': 'export-gradebook', 'property': 'n_clicks'},
+                                [_value('export-gradebook', 'n_clicks', 1)]), repeat)
+
+        # The first run renders all feedbacks, later ones are served from the feedback cache
+        results['generate_feedback'] = measure(
+            lambda: client.call({'id': 'generate', 'property': 'n_clicks'}, [_value('generate', 'n_clicks', 1)],
+                                [_value('assignment-select', 'value', assignment)]), repeat)
+        app.extensions['db_pool'].close()
+
+        # Legacy transcription of all assignments, from scratch and rerun without changes
+        legacy_dir = os.path.join(directory, 'legacy')
+        specs = parse_config(lecture.config).values()
+        with contextlib.redirect_stdout(io.StringIO()):
+            results['legacy_transcription'] = measure(
+                lambda: transcribe_lecture(specs, lecture.lecture_marker, legacy_dir, workers), repeat,
+                lambda: shutil.rmtree(legacy_dir, ignore_errors=True))
+            results['legacy_transcription_unchanged'] = measure(
+                lambda: transcribe_lecture(specs, lecture.lecture_marker, legacy_dir, workers), repeat)
+
+    return {'meta': {'commit': _git_commit(), 'python': platform.python_version(), 'platform': platform.platform(),
+                     'cpus': os.cpu_count(), 'date': time.strftime('%Y-%m-%dT%H:%M:%S')},
+            'scale': {'teams': teams, 'tasks': tasks, 'assignments': assignments, 'lines': lines, 'repeat': repeat,
+                      'workers': workers},
+            'results': results}
+
+
+def compare(report: dict, previous: dict) -> list[str]:
+    """
+    One line per benchmark with the median of both reports, regressions are marked
+    """
+    lines = []
+    if report['scale'] != previous.get('scale'):
+        lines.append(f"Note: the scale differs from the previous report ({previous.get('scale')})")
+    for name, result in report['results'].items():
+        before = previous.get('results', {}).get(name)
+        if before is None:
+            lines.append(f"{name:<34} {result['median']:>9.4f}s  (new)")
+            continue
+        ratio = result['median'] / before['median'] if before['median'] else float('inf')
+        regressed = ratio > _REGRESSION_RATIO and result['median'] - before['median'] > _NOISE_SECONDS
+        flag = '  REGRESSION' if regressed else ''
+        lines.append(f"{name:<34} {result['median']:>9.4f}s  was {before['median']:>9.4f}s  x{ratio:.2f}{flag}")
+    return lines
+
+
+@click.command()
+@click.option("--teams", default=300, type=int, help="number of teams per assignment, default=300")
+@click.option("--tasks", default=6, type=int, help="number of tasks per assignment, default=6")
+@click.option("--assignments", default=3, type=int, help="number of assignments, default=3")
+@click.option("--lines", default=4, type=int, help="maximum number of comment lines per graded task, default=4")
+@click.option("--repeat", default=5, type=int, help="runs per benchmark, default=5")
+@click.option("--workers", default=None, type=int, help="worker processes of the legacy transcription")
+@click.option("--output", default=None, help="write the results as JSON to this file")
+@click.option("--compare", "previous", default=None, help="JSON results of an earlier run to compare with")
+def main(teams, tasks, assignments, lines, repeat, workers, output, previous):
+    report = run_suite(teams, tasks, assignments, lines, repeat, workers)
+    if previous:
+        with open(previous, 'r') as f:
+            lines_out = compare(report, json.load(f))
+    else:
+        lines_out = [f"{name:<34} {result['median']:>9.4f}s  (min {result['min']:.4f}s, max {result['max']:.4f}s)"
+                     for name, result in report['results'].items()]
+    print('\n'.join(lines_out))
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=1)
+    if previous and any(line.endswith('REGRESSION') for line in lines_out):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Generate a synthetic lecture at a configurable scale: ILIAS assignment sheets, the lecture config, legacy grading CSVs
+and a pre-graded database (plus the database of a second tutor to merge):
+
+    python -m benchmarks.synthetic_lecture --teams 300 --tasks 6 --assignments 3 --lines 4 -o /tmp/lecture
+"""
+import os
+import random
+import sqlite3
+from typing import NamedTuple
+
+import click
+import openpyxl
+
+from src.database import init_db, set_team_grades
+from src.utils import excel_to_sqlite
+
+_FIRST_NAMES = ['Alex', 'Eliza', 'Karl', 'May', 'Jonas', 'Lea', 'Mehmet', 'Sofia', 'Lukas', 'Hannah', 'Yusuf', 'Marie',
+                'Finn', 'Emma', 'Paul', 'Mia', 'Ben', 'Lina', 'Noah', 'Clara']
+_LAST_NAMES = ['Muster', 'Ley', 'May', 'Karl', 'Schmidt', 'Müller', 'Yilmaz', 'Weber', 'Fischer', 'Wagner', 'Becker',
+               'Hoffmann', 'Schulz', 'Koch', 'Richter', 'Klein', 'Wolf', 'Neumann', 'Schwarz', 'Zimmermann']
+_COMMENTS = ['Missing edge case for empty input', 'Off-by-one error in the loop bound', 'Plot axes are not labelled',
+             'Runtime analysis is incomplete', 'Nice and clean solution', 'Wrong base case of the recursion',
+             'Explanation lacks a justification', 'Code does not run on the example input', 'Units are missing',
+             'Consider vectorizing this computation', 'The proof skips the induction step', 'Good documentation']
+_ILIAS_HEADER = ['Nachname', 'Vorname', 'Anmeldename', 'Datum der letzten Abgabe', 'Team', 'Dateiabgabe 1',
+                 'Dateiabgabe 2', 'Dateiabgabe 3', 'Dateiabgabe 4']
+
+
+class SyntheticLecture(NamedTuple):
+    directory: str
+    lecture_marker: str
+    config: str
+    database: str
+    other_database: str
+    assignments: list[str]
+    xlsx: list[str]
+    teams: list[int]
+
+
+def _max_points(tasks: int) -> dict[str, str]:
+    points = [100 // tasks] * tasks
+    points[0] += 100 - sum(points)
+    return {str(task + 1): str(p) for task, p in enumerate(points)}
+
+
+def _grading(rng: random.Random, tasks: dict[str, str], lines: int) -> dict[str, list]:
+    feedbacks = {}
+    for task in tasks:
+        if rng.random() < 0.2:
+            continue
+        feedbacks[task] = [(rng.choice([None, -0.5, -1, -2, -5]), rng.choice(_COMMENTS))
+                           for _ in range(rng.randint(1, lines))]
+    return feedbacks
+
+
+def generate_lecture(directory: str, teams: int = 300, tasks: int = 6, assignments: int = 3, lines: int = 4,
+                     members: int = 2, lecture_marker: str = 'synthetic', seed: int = 0) -> SyntheticLecture:
+    """
+    Write all files of a synthetic lecture into 'directory'. Every assignment sheet lists 'members' students for each
+    of the 'teams' teams, gradings have up to 'lines' comment lines per task.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    team_ids = [100000 + i for i in range(teams)]
+    students = {team: [(rng.choice(_FIRST_NAMES), f"{rng.choice(_LAST_NAMES)}{i}") for i in range(members)]
+                for team in team_ids}
+    max_points = _max_points(tasks)
+
+    names, sheets, config = [], [], []
+    for number in range(1, assignments + 1):
+        name = f"Assignment {number}"
+        xlsx = os.path.join(directory, f"{name}.xlsx")
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet(name)
+        sheet.append(_ILIAS_HEADER)
+        for team, team_students in students.items():
+            for first_name, last_name in team_students:
+                sheet.append([last_name, first_name, f"{first_name[0].lower()}.{last_name.lower()}",
+                              '2025-01-01 10:00:00', team, f"{name}_{team}.zip", None, None, None])
+        workbook.save(xlsx)
+
+        # Grading sheet of the legacy mode: "names","points:comment|comment",...
+        csv_path = os.path.join(directory, f"grading_ass{number:02d}.csv")
+        with open(csv_path, 'w') as f:
+            f.write(',' + ','.join(max_points) + '\n')
+            for team, team_students in students.items():
+                cells = []
+                for task, task_max in max_points.items():
+                    comments = rng.sample(_COMMENTS, rng.randint(0, lines))
+                    reached = max(float(task_max) - len(comments), 0)
+                    cells.append(f'"{reached:g}' + (':' + '|'.join(f"-1 {comment}" for comment in comments)
+                                                    if comments else '') + '"')
+                names_cell = ','.join(f"{first_name}{last_name}".lower() for first_name, last_name in team_students)
+                f.write(f'"{names_cell}",' + ','.join(cells) + '\n')
+
+        config += ['# =====================================================', f"number={number}",
+                   f"filepath={csv_path}", f"max_points={max_points}", f"assignment_xlsx={xlsx}"]
+        names.append(name)
+        sheets.append(xlsx)
+
+    config_path = os.path.join(directory, f"config_{lecture_marker}.txt")
+    with open(config_path, 'w') as f:
+        f.write('\n'.join(config) + '\n')
+
+    # Two tutors' databases over the same sheets, the second one grading every other team differently
+    database = os.path.join(directory, f"{lecture_marker}.sqlite3")
+    other_database = os.path.join(directory, f"{lecture_marker}_other.sqlite3")
+    for path, graded in ((database, team_ids), (other_database, team_ids[::2])):
+        if os.path.exists(path):
+            os.remove(path)
+        conn = sqlite3.connect(path)
+        init_db(conn)
+        for name, xlsx in zip(names, sheets):
+            excel_to_sqlite(xlsx, conn, table_name=name)
+            with conn:
+                for team in graded:
+                    set_team_grades(conn, name, team, _grading(rng, max_points, lines))
+        conn.close()
+
+    return SyntheticLecture(directory, lecture_marker, config_path, database, other_database, names, sheets, team_ids)
+
+
+@click.command()
+@click.option("-o", "--output-dir", required=True, help="directory to write the lecture to")
+@click.option("--teams", default=300, type=int, help="number of teams per assignment, default=300")
+@click.option("--tasks", default=6, type=int, help="number of tasks per assignment, default=6")
+@click.option("--assignments", default=3, type=int, help="number of assignments, default=3")
+@click.option("--lines", default=4, type=int, help="maximum number of comment lines per graded task, default=4")
+@click.option("--members", default=2, type=int, help="number of students per team, default=2")
+@click.option("--seed", default=0, type=int, help="random seed, default=0")
+def main(output_dir, teams, tasks, assignments, lines, members, seed):
+    lecture = generate_lecture(output_dir, teams, tasks, assignments, lines, members, seed=seed)
+    print(f"Wrote {len(lecture.assignments)} assignment(s) with {teams} teams each to {output_dir} "
+          f"(config: {lecture.config}, database: {lecture.database})")
+
+
+if __name__ == "__main__":
+    main()
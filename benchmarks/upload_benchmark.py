@@ -0,0 +1,86 @@
+"""
+Time the feedback upload end to end against the local mock ILIAS, without a browser:
+
+    python -m benchmarks.upload_benchmark --teams 200 --latency 0.02 --failure-rate 0.05 --workers 1,4,8
+
+Each run uploads one feedback file per team, then reruns the upload (resuming from the journal) until every team got
+its feedback, and reports the upload throughput of the first pass and whether any team received a file twice.
+"""
+import json
+import os
+import tempfile
+import time
+from urllib.request import Request, urlopen
+
+import click
+
+from benchmarks.mock_ilias import MockIlias, hand_ins_url, start_mock_ilias
+from src.ilias import _JOURNAL_NAME, find_upload_urls, list_feedback_files, upload_feedbacks
+
+# Upper bound of resumed runs after the first pass, failures are random so a few retries are expected
+_MAX_RETRIES = 10
+
+
+def _log_in(base_url: str) -> dict[str, str]:
+    # Stands in for the user logging in within the browser, the session cookie is all the uploads need
+    with urlopen(base_url) as response:
+        cookie = response.headers['Set-Cookie'].split(';', 1)[0]
+    return {'Cookie': cookie}
+
+
+def run_upload_benchmark(teams: int, latency: float, failure_rate: float, workers: int, seed: int = 0) -> dict:
+    ilias = MockIlias(teams, latency, failure_rate, seed=seed)
+    server, base_url = start_mock_ilias(ilias)
+    try:
+        headers = _log_in(base_url)
+        with urlopen(Request(hand_ins_url(base_url), headers=headers)) as response:
+            upload_urls = find_upload_urls(response.read().decode(), response.geturl())
+
+        with tempfile.TemporaryDirectory() as feedback_dir:
+            for team in ilias.teams:
+                with open(os.path.join(feedback_dir, f"{team}_Doe_Roe.md"), 'w') as f:
+                    f.write(f"# Feedback for Team {team}\n\nOverall Score: **42/100**\n")
+            per_team_feedbacks = list_feedback_files(feedback_dir)
+            journal = os.path.join(feedback_dir, _JOURNAL_NAME)
+
+            start = time.perf_counter()
+            first = upload_feedbacks(upload_urls, per_team_feedbacks, headers, journal, workers)
+            first_seconds = time.perf_counter() - start
+            retries = 0
+            report = first
+            while report['failed'] and retries < _MAX_RETRIES:
+                retries += 1
+                report = upload_feedbacks(upload_urls, per_team_feedbacks, headers, journal, workers)
+            total_seconds = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    stats = ilias.stats()
+    return {'teams': teams, 'latency': latency, 'failure_rate': failure_rate, 'workers': workers,
+            'first_pass_seconds': round(first_seconds, 3),
+            'uploads_per_second': round(first['uploaded'] / first_seconds, 2) if first_seconds else None,
+            'first_pass_failed': first['failed'], 'retries': retries, 'total_seconds': round(total_seconds, 3),
+            'complete': stats['teams_uploaded'] == teams, 'duplicates': stats['duplicates'],
+            'requests': stats['requests']}
+
+
+@click.command()
+@click.option("--teams", default=200, type=int, help="number of teams to upload feedbacks for, default=200")
+@click.option("--latency", default=0.02, type=float, help="seconds the mock delays every request, default=0.02")
+@click.option("--failure-rate", default=0.05, type=float, help="share of uploads the mock rejects, default=0.05")
+@click.option("--workers", default="1,4,8", help="comma separated numbers of upload workers to compare, default='1,4,8'")
+@click.option("--output", default=None, help="write the results as JSON to this file")
+def main(teams, latency, failure_rate, workers, output):
+    results = [run_upload_benchmark(teams, latency, failure_rate, int(n)) for n in workers.split(',')]
+    for result in results:
+        print(f"workers={result['workers']:>3}  {result['uploads_per_second']:>8} uploads/s  "
+              f"first pass {result['first_pass_seconds']}s with {result['first_pass_failed']} failed, "
+              f"{result['retries']} resumed run(s), complete={result['complete']}, duplicates={result['duplicates']}")
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
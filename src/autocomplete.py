@@ -0,0 +1,132 @@
+import sqlite3
+import threading
+from bisect import bisect_left
+from collections import Counter
+from heapq import nsmallest
+from typing import Iterable, NamedTuple, Optional
+
+# Length of the substrings the comments are indexed by, shorter search terms are looked up by prefix
+_GRAM = 3
+
+
+class Suggestion(NamedTuple):
+    comment: str
+    # the penalty most often given together with the comment, None if it usually comes without one
+    penalty: Optional[float]
+    uses: int
+
+
+def _normalize(text: str) -> str:
+    return ' '.join(text.lower().split())
+
+
+def _grams(text: str) -> set[str]:
+    return {text[i:i + _GRAM] for i in range(len(text) - _GRAM + 1)}
+
+
+def _penalty(penalty) -> Optional[float]:
+    try:
+        return None if penalty is None or penalty == '' else float(penalty)
+    except (TypeError, ValueError):
+        return None
+
+
+class CommentIndex:
+    """
+    In-memory index of every comment given in the lecture, for suggestions while typing a comment. Comments are found
+    by any part of them through an index of their 3-grams, and ranked by how often they were given.
+    """
+    def __init__(self):
+        self._penalties = {}
+        self._normalized = {}
+        self._grams = {}
+        self._sorted = []
+        self._lock = threading.Lock()
+
+    def build(self, conn: sqlite3.Connection) -> None:
+        """
+        (Re)build the index from all comment lines stored in the database
+        """
+        penalties = {}
+        for comment, penalty, uses in conn.execute("SELECT comment, penalty, COUNT(*) FROM grades "
+                                                   "WHERE TRIM(comment) != '' GROUP BY comment, penalty"):
+            penalties.setdefault(comment.strip(), Counter())[_penalty(penalty)] += uses
+        normalized = {comment: _normalize(comment) for comment in penalties}
+        grams = {}
+        for comment, text in normalized.items():
+            for gram in _grams(text):
+                grams.setdefault(gram, set()).add(comment)
+        with self._lock:
+            self._penalties, self._normalized, self._grams = penalties, normalized, grams
+            self._sorted = sorted((text, comment) for comment, text in normalized.items())
+
+    def add(self, lines: Iterable) -> None:
+        """
+        Count the (penalty, comment) lines of a saved grading
+        """
+        with self._lock:
+            for penalty, comment in lines:
+                if not comment or not comment.strip():
+                    continue
+                comment = comment.strip()
+                if comment not in self._penalties:
+                    text = self._normalized[comment] = _normalize(comment)
+                    self._penalties[comment] = Counter()
+                    for gram in _grams(text):
+                        self._grams.setdefault(gram, set()).add(comment)
+                    self._sorted.insert(bisect_left(self._sorted, (text, comment)), (text, comment))
+                self._penalties[comment][_penalty(penalty)] += 1
+
+    def remove(self, lines: Iterable) -> None:
+        """
+        Forget the (penalty, comment) lines a saved grading replaced
+        """
+        with self._lock:
+            for penalty, comment in lines:
+                if not comment or comment.strip() not in self._penalties:
+                    continue
+                comment = comment.strip()
+                counts = self._penalties[comment]
+                counts[_penalty(penalty)] -= 1
+                if counts[_penalty(penalty)] <= 0:
+                    del counts[_penalty(penalty)]
+                if counts:
+                    continue
+                text = self._normalized.pop(comment)
+                del self._penalties[comment]
+                for gram in _grams(text):
+                    self._grams[gram].discard(comment)
+                    if not self._grams[gram]:
+                        del self._grams[gram]
+                del self._sorted[bisect_left(self._sorted, (text, comment))]
+
+    def _candidates(self, query: str) -> Iterable[str]:
+        # Every word of the query must occur in a comment, the words long enough to have 3-grams narrow the search
+        words = query.split()
+        grams = set().union(*(_grams(word) for word in words))
+        if not grams:
+            start = bisect_left(self._sorted, (query,))
+            candidates = []
+            for text, comment in self._sorted[start:]:
+                if not text.startswith(query):
+                    break
+                candidates.append(comment)
+            return candidates
+        postings = sorted((self._grams.get(gram, set()) for gram in grams), key=len)
+        candidates = postings[0].intersection(*postings[1:])
+        return [comment for comment in candidates if all(word in self._normalized[comment] for word in words)]
+
+    def suggest(self, text: str, limit: int = 5) -> list[Suggestion]:
+        """
+        The most frequently given comments containing all words of 'text', those starting with it first
+        """
+        query = _normalize(text or '')
+        if not query:
+            return []
+        with self._lock:
+            candidates = self._candidates(query)
+            uses = {comment: sum(self._penalties[comment].values()) for comment in candidates}
+            best = nsmallest(limit, candidates, key=lambda comment: (not self._normalized[comment].startswith(query),
+                                                                     -uses[comment], len(comment), comment))
+            return [Suggestion(comment, self._penalties[comment].most_common(1)[0][0], uses[comment])
+                    for comment in best]
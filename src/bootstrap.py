@@ -0,0 +1,76 @@
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterable, Optional
+
+from src.config import AssignmentSpec
+from src.database import get_assignment_sources, init_db, table_exists
+from src.utils import file_sha256, iter_xlsx_rows, replace_assignment_table
+
+
+def _read_sheet(xlsx_file: str) -> list[tuple]:
+    # Runs in a worker process, the parsed rows are sent back to the single writer
+    return list(iter_xlsx_rows(xlsx_file))
+
+
+def bootstrap_assignments(conn: sqlite3.Connection, specs: Iterable[AssignmentSpec],
+                          workers: Optional[int] = None) -> dict:
+    """
+    Import the ILIAS sheets ('assignment_xlsx') of all configured assignments at once. Sheets are parsed in parallel
+    worker processes and written in a single transaction afterwards. Tables whose sheet is unchanged since their
+    last import are skipped, re-imported sheets keep the gradings of their assignment.
+    """
+    init_db(conn)
+    sources = get_assignment_sources(conn)
+    report = {'imported': [], 'skipped': [], 'failed': []}
+    pending = {}
+    for spec in specs:
+        if not spec.xlsx:
+            continue
+        table_name = os.path.splitext(os.path.basename(spec.xlsx))[0]
+        if table_name in pending or table_name in report['skipped']:
+            continue
+        if not os.path.exists(spec.xlsx):
+            print(f"Could not find {spec.xlsx}")
+            report['failed'].append(table_name)
+            continue
+        digest = file_sha256(spec.xlsx)
+        if sources.get(table_name) == digest and table_exists(conn, table_name):
+            report['skipped'].append(table_name)
+        else:
+            pending[table_name] = (spec.xlsx, digest)
+
+    parsed = {}
+    if len(pending) == 1:
+        # Not worth starting a pool for a single sheet
+        (table_name, (xlsx_file, _)), = pending.items()
+        try:
+            parsed[table_name] = _read_sheet(xlsx_file)
+        except Exception as e:
+            print(f"Error reading {xlsx_file}: {str(e)}")
+            report['failed'].append(table_name)
+    elif pending:
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(pending))) as executor:
+            futures = {executor.submit(_read_sheet, xlsx_file): table_name
+                       for table_name, (xlsx_file, _) in pending.items()}
+            for future in as_completed(futures):
+                table_name = futures[future]
+                try:
+                    parsed[table_name] = future.result()
+                except Exception as e:
+                    print(f"Error reading {pending[table_name][0]}: {str(e)}")
+                    report['failed'].append(table_name)
+
+    if parsed:
+        conn.commit()
+        conn.execute("BEGIN")
+        try:
+            for table_name in sorted(parsed):
+                replace_assignment_table(conn, table_name, iter(parsed[table_name]), keep_grades=True,
+                                         source_hash=pending[table_name][1])
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        report['imported'] = sorted(parsed)
+    return report
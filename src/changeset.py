@@ -0,0 +1,124 @@
+import itertools
+import json
+import sqlite3
+from datetime import datetime
+from typing import IO, Optional, Union
+
+from src.database import apply_merge_staging, create_merge_staging, drop_merge_staging, team_key
+
+_CHANGESET_FORMAT = 'grading-changeset'
+_CHANGESET_VERSION = 1
+# Number of changed tasks staged per executemany while importing
+_BATCH_SIZE = 500
+# Keys every change record of a changeset must have
+_CHANGE_KEYS = ('assignment', 'team', 'task', 'lines', 'updated_at')
+
+
+def parse_since(since: Union[str, float, None]) -> float:
+    """
+    Accept either a unix timestamp or an ISO 8601 date/time as the starting point of a changeset
+    """
+    if since in (None, ''):
+        return 0.0
+    try:
+        return float(since)
+    except ValueError:
+        return datetime.fromisoformat(str(since)).timestamp()
+
+
+def export_changeset(conn: sqlite3.Connection, fp: IO[str], since: float = 0.0) -> dict:
+    """
+    Write every task graded after 'since' as one JSON line (assignment, team, task, lines, updated_at), preceded by
+    a header line. The header's 'until' may be used as 'since' of the next export.
+    """
+    until, count = conn.execute("SELECT MAX(updated_at), COUNT(*) FROM grade_tasks WHERE updated_at > ?",
+                                (since,)).fetchone()
+    until = until if until is not None else since
+    fp.write(json.dumps({'format': _CHANGESET_FORMAT, 'version': _CHANGESET_VERSION,
+                         'since': since, 'until': until, 'tasks': count}) + '\n')
+
+    rows = conn.execute("""SELECT t.assignment, t.team, t.task, t.updated_at, g.line, g.penalty, g.comment
+                           FROM grade_tasks t
+                           LEFT JOIN grades g ON g.assignment = t.assignment AND g.team = t.team AND g.task = t.task
+                           WHERE t.updated_at > ? AND t.updated_at <= ?
+                           ORDER BY t.updated_at, t.assignment, t.team, t.task, g.line""", (since, until))
+    for (assignment, team, task, updated_at), lines in itertools.groupby(rows, key=lambda row: tuple(row[:4])):
+        fp.write(json.dumps({'assignment': assignment, 'team': team, 'task': task,
+                             'lines': [[line[5], line[6]] for line in lines if line[4] is not None],
+                             'updated_at': updated_at}) + '\n')
+    return {'since': since, 'until': until, 'tasks': count}
+
+
+def _stage_batch(conn: sqlite3.Connection, batch: list[dict], staged: set) -> None:
+    # A task occurring repeatedly (e.g. in concatenated changesets) is taken from its last occurrence,
+    # within the batch as well as across batches
+    changes = {}
+    for change in batch:
+        key = (change['assignment'], team_key(change['team']), str(change['task']))
+        changes[key] = change
+    for key in changes:
+        if key in staged:
+            conn.execute("DELETE FROM temp.merge_grades WHERE assignment = ? AND team = ? AND task = ?", key)
+        staged.add(key)
+    conn.executemany("INSERT OR REPLACE INTO temp.merge_tasks_in VALUES (?, ?, ?, ?)",
+                     [key + (change['updated_at'],) for key, change in changes.items()])
+    conn.executemany("INSERT INTO temp.merge_grades VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     [key + (i, penalty, comment, change['updated_at'])
+                      for key, change in changes.items() for i, (penalty, comment) in enumerate(change['lines'])])
+
+
+def _check_header(header) -> None:
+    if not isinstance(header, dict) or header.get('format') != _CHANGESET_FORMAT or header.get('version') != _CHANGESET_VERSION:
+        raise ValueError("Not a grading changeset or unsupported changeset version.")
+
+
+def _read_change(line: str, number: int) -> Optional[dict]:
+    """
+    Parse one line of a changeset, None for the header of a concatenated changeset
+    """
+    try:
+        change = json.loads(line)
+    except ValueError as e:
+        raise ValueError(f"Line {number} of the changeset is not valid JSON: {e}") from e
+    if not isinstance(change, dict):
+        raise ValueError(f"Line {number} of the changeset is not a change record.")
+    if 'format' in change:
+        _check_header(change)
+        return None
+    missing = [key for key in _CHANGE_KEYS if key not in change]
+    if missing:
+        raise ValueError(f"Line {number} of the changeset is missing {', '.join(missing)}.")
+    if not isinstance(change['lines'], list) or not all(isinstance(line, list) and len(line) == 2
+                                                        for line in change['lines']):
+        raise ValueError(f"Line {number} of the changeset has malformed lines, expected [penalty, comment] pairs.")
+    return change
+
+
+def import_changeset(conn: sqlite3.Connection, fp: IO[str], policy: str = 'theirs') -> dict:
+    """
+    Apply a changeset written by export_changeset in a single transaction, resolving conflicts per task like a merge
+    """
+    _check_header(json.loads(fp.readline() or '{}'))
+
+    conn.commit()
+    create_merge_staging(conn)
+    try:
+        with conn:
+            staged = set()
+            batch = []
+            for number, line in enumerate(fp, start=2):
+                if not line.strip():
+                    continue
+                change = _read_change(line, number)
+                if change is None:
+                    continue
+                batch.append(change)
+                if len(batch) >= _BATCH_SIZE:
+                    _stage_batch(conn, batch, staged)
+                    batch = []
+            _stage_batch(conn, batch, staged)
+            teams, tasks = apply_merge_staging(conn, policy)
+        return {'received': len(staged), 'teams': teams, 'tasks': tasks}
+    finally:
+        conn.rollback()
+        drop_merge_staging(conn)
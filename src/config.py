@@ -0,0 +1,88 @@
+import ast
+import os
+import re
+import threading
+from typing import NamedTuple, Optional
+
+# Start page of the ILIAS instance the feedbacks are uploaded to
+DEFAULT_ILIAS_URL = 'https://ovidius.uni-tuebingen.de/'
+
+
+class AssignmentSpec(NamedTuple):
+    number: int
+    tasks: tuple[str, ...]
+    max_points: tuple[float, ...]
+    filepath: Optional[str] = None
+    xlsx: Optional[str] = None
+
+    def task_max_points(self) -> dict[str, float]:
+        return dict(zip(self.tasks, self.max_points))
+
+    @property
+    def total_points(self) -> float:
+        return sum(self.max_points)
+
+
+def assignment_number(table_name: str) -> Optional[int]:
+    assignment_match = re.search(r'\d+$', table_name or '')
+    return int(assignment_match.group()) if assignment_match else None
+
+
+def parse_config(config: str) -> dict[int, AssignmentSpec]:
+    """
+    Parse a lecture configuration file into assignment specs keyed by assignment number
+    """
+    blocks = []
+    with open(config, 'r') as f:
+        for line in f.read().split('\n'):
+            if line.startswith('number='):
+                blocks.append({'number': int(line.replace('number=', ''))})
+            elif not blocks:
+                continue
+            elif line.startswith('filepath='):
+                blocks[-1]['filepath'] = line.replace('filepath=', '')
+            elif line.startswith('max_points='):
+                blocks[-1]['max_points'] = ast.literal_eval(line.replace('max_points=', ''))
+            elif line.startswith('assignment_xlsx='):
+                blocks[-1]['xlsx'] = line.replace('assignment_xlsx=', '')
+
+    specs = {}
+    for block in blocks:
+        if 'max_points' not in block:
+            raise IOError(f"Configuration is missing max_points for assignment no.{block['number']}.")
+        tasks = tuple(str(task) for task in block['max_points'].keys())
+        specs[block['number']] = AssignmentSpec(number=block['number'],
+                                                tasks=tasks,
+                                                max_points=tuple(float(p) for p in block['max_points'].values()),
+                                                filepath=block.get('filepath'),
+                                                xlsx=block.get('xlsx'))
+    return specs
+
+
+class LectureConfig:
+    """
+    Lecture configuration that is parsed once and only reloaded if the file on disk changed
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime = None
+        self._specs = {}
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> dict[int, AssignmentSpec]:
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._specs = parse_config(self.path)
+                    self._mtime = mtime
+        return self._specs
+
+    def get(self, number: Optional[int]) -> Optional[AssignmentSpec]:
+        return self._refresh().get(number)
+
+    def for_table(self, table_name: str) -> Optional[AssignmentSpec]:
+        return self.get(assignment_number(table_name))
+
+    def specs(self) -> list[AssignmentSpec]:
+        return list(self._refresh().values())
@@ -0,0 +1,652 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+# Tables that hold tool state and are not assignments imported from ILIAS
+_INTERNAL_TABLES = ('grades', 'feedback_cache', 'grade_tasks', 'assignment_sources', 'task_deductions',
+                    'deduction_counts', 'comment_counts', 'assignment_stats')
+
+
+def _create_grades_table(conn: sqlite3.Connection) -> None:
+    conn.execute("""CREATE TABLE IF NOT EXISTS grades (
+                        assignment TEXT NOT NULL,
+                        team TEXT NOT NULL,
+                        task TEXT NOT NULL,
+                        line INTEGER NOT NULL,
+                        penalty NUMERIC,
+                        comment TEXT,
+                        updated_at REAL NOT NULL,
+                        PRIMARY KEY (assignment, team, task, line)
+                    ) WITHOUT ROWID""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_grades_team ON grades (team)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_grades_assignment ON grades (assignment)")
+
+    # One-time migration of the JSON blobs formerly stored in the 'Grade' column of each assignment table
+    now = time.time()
+    for assignment in list_assignments(conn):
+        for team, feedbacks in _read_json_grades(conn, assignment).items():
+            for task, lines in feedbacks.items():
+                _insert_task_lines(conn, assignment, team, task, lines, now)
+
+
+def _create_feedback_cache_table(conn: sqlite3.Connection) -> None:
+    # Rendered feedback per team, valid as long as the hash over its inputs is unchanged
+    conn.execute("""CREATE TABLE IF NOT EXISTS feedback_cache (
+                        assignment TEXT NOT NULL,
+                        team TEXT NOT NULL,
+                        hash TEXT NOT NULL,
+                        markdown TEXT NOT NULL,
+                        PRIMARY KEY (assignment, team)
+                    ) WITHOUT ROWID""")
+
+
+def _create_grade_tasks_table(conn: sqlite3.Connection) -> None:
+    # Last write of every graded task, also kept for tasks whose comment lines were all removed
+    conn.execute("""CREATE TABLE IF NOT EXISTS grade_tasks (
+                        assignment TEXT NOT NULL,
+                        team TEXT NOT NULL,
+                        task TEXT NOT NULL,
+                        updated_at REAL NOT NULL,
+                        PRIMARY KEY (assignment, team, task)
+                    ) WITHOUT ROWID""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_grade_tasks_updated_at ON grade_tasks (updated_at)")
+    conn.execute("""INSERT OR IGNORE INTO grade_tasks (assignment, team, task, updated_at)
+                    SELECT assignment, team, task, MAX(updated_at) FROM grades GROUP BY assignment, team, task""")
+
+
+def _index_assignment_teams(conn: sqlite3.Connection) -> None:
+    # Assignment tables imported by older versions have no index on their Team column
+    for assignment in list_assignments(conn):
+        if 'Team' in [row[1] for row in conn.execute(f"PRAGMA table_info([{assignment}])")]:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS [idx_{assignment}_team] ON [{assignment}] (Team)")
+
+
+def _create_assignment_sources_table(conn: sqlite3.Connection) -> None:
+    # Hash of the xlsx file each assignment table was last imported from
+    conn.execute("""CREATE TABLE IF NOT EXISTS assignment_sources (
+                        assignment TEXT PRIMARY KEY,
+                        sha256 TEXT NOT NULL,
+                        imported_at REAL NOT NULL
+                    ) WITHOUT ROWID""")
+
+
+def _add_grade_task_versions(conn: sqlite3.Connection) -> None:
+    # Version of every graded task, bumped by each write, saves from the grading view compare and swap it.
+    # Version 0 stands for a task that was never graded.
+    conn.execute("ALTER TABLE grade_tasks ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+
+def _create_statistics_tables(conn: sqlite3.Connection) -> None:
+    # Summaries behind the statistics of an assignment, kept up to date by triggers on the grades table so that
+    # every way of writing gradings (saves, merges, changesets, imports) maintains them in passing:
+    # the deduction of every graded task of a team, how many teams share each deduction of a task,
+    # how often each comment was given and the number of teams and graded teams of each assignment
+    conn.execute("""CREATE TABLE IF NOT EXISTS task_deductions (
+                        assignment TEXT NOT NULL,
+                        team TEXT NOT NULL,
+                        task TEXT NOT NULL,
+                        deduction REAL NOT NULL,
+                        lines INTEGER NOT NULL,
+                        PRIMARY KEY (assignment, team, task)
+                    ) WITHOUT ROWID""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS deduction_counts (
+                        assignment TEXT NOT NULL,
+                        task TEXT NOT NULL,
+                        deduction REAL NOT NULL,
+                        teams INTEGER NOT NULL,
+                        PRIMARY KEY (assignment, task, deduction)
+                    ) WITHOUT ROWID""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS comment_counts (
+                        assignment TEXT NOT NULL,
+                        task TEXT NOT NULL,
+                        comment TEXT NOT NULL,
+                        uses INTEGER NOT NULL,
+                        deduction REAL NOT NULL,
+                        PRIMARY KEY (assignment, task, comment)
+                    ) WITHOUT ROWID""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_comment_counts_uses ON comment_counts (assignment, uses)")
+    conn.execute("""CREATE TABLE IF NOT EXISTS assignment_stats (
+                        assignment TEXT PRIMARY KEY,
+                        teams INTEGER NOT NULL,
+                        graded_teams INTEGER NOT NULL
+                    ) WITHOUT ROWID""")
+
+    conn.execute("""INSERT INTO task_deductions (assignment, team, task, deduction, lines)
+                    SELECT assignment, team, task, ROUND(SUM(COALESCE(ABS(penalty), 0)), 6), COUNT(*)
+                    FROM grades GROUP BY assignment, team, task""")
+    conn.execute("""INSERT INTO deduction_counts (assignment, task, deduction, teams)
+                    SELECT assignment, task, deduction, COUNT(*) FROM task_deductions
+                    GROUP BY assignment, task, deduction""")
+    conn.execute("""INSERT INTO comment_counts (assignment, task, comment, uses, deduction)
+                    SELECT assignment, task, comment, COUNT(*), ROUND(SUM(COALESCE(ABS(penalty), 0)), 6)
+                    FROM grades WHERE TRIM(comment) != '' GROUP BY assignment, task, comment""")
+    for assignment in list_assignments(conn):
+        refresh_assignment_teams(conn, assignment)
+
+    # A line added to or removed from a task moves the task's deduction and the comment's count
+    add_line = """INSERT INTO task_deductions (assignment, team, task, deduction, lines)
+                  VALUES (NEW.assignment, NEW.team, NEW.task, ROUND(COALESCE(ABS(NEW.penalty), 0), 6), 1)
+                  ON CONFLICT (assignment, team, task) DO UPDATE
+                  SET deduction = ROUND(deduction + excluded.deduction, 6), lines = lines + 1;
+                  INSERT INTO comment_counts (assignment, task, comment, uses, deduction)
+                  SELECT NEW.assignment, NEW.task, NEW.comment, 1, ROUND(COALESCE(ABS(NEW.penalty), 0), 6)
+                  WHERE TRIM(NEW.comment) != ''
+                  ON CONFLICT (assignment, task, comment) DO UPDATE
+                  SET uses = uses + 1, deduction = ROUND(deduction + excluded.deduction, 6);"""
+    remove_line = """UPDATE task_deductions SET deduction = ROUND(deduction - COALESCE(ABS(OLD.penalty), 0), 6),
+                                              lines = lines - 1
+                     WHERE assignment = OLD.assignment AND team = OLD.team AND task = OLD.task;
+                     DELETE FROM task_deductions
+                     WHERE assignment = OLD.assignment AND team = OLD.team AND task = OLD.task AND lines <= 0;
+                     UPDATE comment_counts SET uses = uses - 1,
+                                               deduction = ROUND(deduction - COALESCE(ABS(OLD.penalty), 0), 6)
+                     WHERE assignment = OLD.assignment AND task = OLD.task AND comment = OLD.comment;
+                     DELETE FROM comment_counts
+                     WHERE assignment = OLD.assignment AND task = OLD.task AND comment = OLD.comment AND uses <= 0;"""
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS grades_stats_insert AFTER INSERT ON grades BEGIN {add_line} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS grades_stats_delete AFTER DELETE ON grades BEGIN {remove_line} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS grades_stats_update AFTER UPDATE ON grades "
+                 f"BEGIN {remove_line} {add_line} END")
+
+    # A task whose deduction changed moves to another bucket, a team's first graded task and its last one
+    # change the number of graded teams
+    add_bucket = """INSERT INTO deduction_counts (assignment, task, deduction, teams)
+                    VALUES (NEW.assignment, NEW.task, NEW.deduction, 1)
+                    ON CONFLICT (assignment, task, deduction) DO UPDATE SET teams = teams + 1;"""
+    remove_bucket = """UPDATE deduction_counts SET teams = teams - 1
+                       WHERE assignment = OLD.assignment AND task = OLD.task AND deduction = OLD.deduction;
+                       DELETE FROM deduction_counts
+                       WHERE assignment = OLD.assignment AND task = OLD.task AND deduction = OLD.deduction
+                             AND teams <= 0;"""
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS task_deductions_insert AFTER INSERT ON task_deductions "
+                 f"BEGIN {add_bucket} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS task_deductions_delete AFTER DELETE ON task_deductions "
+                 f"BEGIN {remove_bucket} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS task_deductions_update AFTER UPDATE OF deduction ON task_deductions "
+                 f"WHEN OLD.deduction != NEW.deduction BEGIN {remove_bucket} {add_bucket} END")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS task_deductions_graded AFTER INSERT ON task_deductions
+                    WHEN NOT EXISTS (SELECT 1 FROM task_deductions WHERE assignment = NEW.assignment
+                                     AND team = NEW.team AND task != NEW.task)
+                    BEGIN
+                        INSERT INTO assignment_stats (assignment, teams, graded_teams) VALUES (NEW.assignment, 0, 1)
+                        ON CONFLICT (assignment) DO UPDATE SET graded_teams = graded_teams + 1;
+                    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS task_deductions_ungraded AFTER DELETE ON task_deductions
+                    WHEN NOT EXISTS (SELECT 1 FROM task_deductions WHERE assignment = OLD.assignment
+                                     AND team = OLD.team)
+                    BEGIN
+                        UPDATE assignment_stats SET graded_teams = graded_teams - 1
+                        WHERE assignment = OLD.assignment;
+                    END""")
+
+
+# Schema migrations, applied in order and tracked through PRAGMA user_version
+_MIGRATIONS = [_create_grades_table, _create_feedback_cache_table, _create_grade_tasks_table,
+               _index_assignment_teams, _create_assignment_sources_table, _add_grade_task_versions,
+               _create_statistics_tables]
+
+
+def init_db(conn: sqlite3.Connection) -> None:
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= len(_MIGRATIONS):
+        return
+    with conn:
+        for i, migration in enumerate(_MIGRATIONS[version:], start=version + 1):
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {i}")
+
+
+def connect(database: str, busy_timeout: float = 10.0, factory=sqlite3.Connection) -> sqlite3.Connection:
+    """
+    Open a connection in WAL mode, so that readers never block a writer and concurrent saves only wait for each other
+    """
+    conn = sqlite3.connect(database, timeout=busy_timeout, detect_types=sqlite3.PARSE_DECLTYPES,
+                           check_same_thread=False, cached_statements=256, factory=factory)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout * 1000)}")
+    return conn
+
+
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections, each request checks out one connection and returns it on teardown.
+    Connections are kept open, so their prepared statement caches survive across requests.
+    """
+    def __init__(self, database: str, size: int = 8, busy_timeout: float = 10.0, factory=sqlite3.Connection):
+        self.database = database
+        self.busy_timeout = busy_timeout
+        self.factory = factory
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def acquire(self, timeout: Optional[float] = None) -> sqlite3.Connection:
+        if not self._slots.acquire(timeout=timeout):
+            raise sqlite3.OperationalError("Timed out waiting for a free database connection.")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                return connect(self.database, self.busy_timeout, self.factory)
+            except Exception:
+                self._slots.release()
+                raise
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        try:
+            # Never hand out a connection with a transaction left open by the previous user
+            conn.rollback()
+            self._idle.put(conn)
+        except sqlite3.ProgrammingError:
+            # connection was closed by its user
+            pass
+        finally:
+            self._slots.release()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def team_key(team) -> str:
+    if isinstance(team, float) and team.is_integer():
+        team = int(team)
+    return str(team)
+
+
+def team_key_sql(column: str) -> str:
+    """
+    SQL expression normalizing a Team column the way team_key does, so that teams stored as REAL (e.g. 12.0 in tables
+    written by pandas when a team cell was empty) match the keys of their gradings ('12')
+    """
+    return (f"CASE WHEN typeof({column}) = 'real' AND {column} = CAST({column} AS INTEGER) "
+            f"THEN CAST(CAST({column} AS INTEGER) AS TEXT) ELSE CAST({column} AS TEXT) END")
+
+
+def table_exists(conn: sqlite3.Connection, table_name: str, schema: str = 'main') -> bool:
+    return conn.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE type='table' AND name=?",
+                        (table_name,)).fetchone() is not None
+
+
+def list_assignments(conn: sqlite3.Connection, schema: str = 'main') -> list[str]:
+    placeholders = ', '.join('?' * len(_INTERNAL_TABLES))
+    rows = conn.execute(f"SELECT name FROM {schema}.sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' "
+                        f"AND name NOT IN ({placeholders}) ORDER BY name", _INTERNAL_TABLES).fetchall()
+    return [row[0] for row in rows]
+
+
+def _read_json_grades(conn: sqlite3.Connection, assignment: str, schema: str = 'main') -> dict[str, dict]:
+    columns = [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info([{assignment}])")]
+    if 'Team' not in columns or 'Grade' not in columns:
+        return {}
+    grades = {}
+    for team, grade in conn.execute(f"SELECT Team, Grade FROM {schema}.[{assignment}]"):
+        team = team_key(team)
+        if team in grades:
+            continue
+        try: feedbacks = json.loads(grade)
+        except: continue
+        if feedbacks:
+            grades[team] = feedbacks
+    return grades
+
+
+def _insert_task_lines(conn: sqlite3.Connection, assignment: str, team: str, task: str, lines: list,
+                       updated_at: float) -> None:
+    conn.executemany("INSERT INTO grades (assignment, team, task, line, penalty, comment, updated_at) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     [(assignment, team, task, i, penalty, comment, updated_at)
+                      for i, (penalty, comment) in enumerate(lines)])
+
+
+def get_team_grades(conn: sqlite3.Connection, assignment: str, team) -> dict[str, list[tuple]]:
+    feedbacks = {}
+    for task, penalty, comment in conn.execute("SELECT task, penalty, comment FROM grades "
+                                               "WHERE assignment = ? AND team = ? ORDER BY task, line",
+                                               (assignment, team_key(team))):
+        feedbacks.setdefault(task, []).append((penalty, comment))
+    return feedbacks
+
+
+def get_team_grading(conn: sqlite3.Connection, assignment: str, team) -> tuple[dict[str, list[tuple]], dict[str, int]]:
+    """
+    Gradings of a team together with the version of every graded task, read in one statement so that they match
+    """
+    feedbacks, versions = {}, {}
+    for task, version, line, penalty, comment in conn.execute(
+            "SELECT t.task, t.version, g.line, g.penalty, g.comment FROM grade_tasks t "
+            "LEFT JOIN grades g ON g.assignment = t.assignment AND g.team = t.team AND g.task = t.task "
+            "WHERE t.assignment = ? AND t.team = ? ORDER BY t.task, g.line", (assignment, team_key(team))):
+        versions[task] = version
+        if line is not None:
+            feedbacks.setdefault(task, []).append((penalty, comment))
+    return feedbacks, versions
+
+
+def get_task_versions(conn: sqlite3.Connection, assignment: str, team) -> dict[str, int]:
+    return dict(conn.execute("SELECT task, version FROM grade_tasks WHERE assignment = ? AND team = ?",
+                             (assignment, team_key(team))).fetchall())
+
+
+def get_assignment_grades(conn: sqlite3.Connection, assignment: str, teams: Optional[list] = None,
+                          schema: str = 'main') -> dict[str, dict[str, list[tuple]]]:
+    grades = {}
+    if not table_exists(conn, 'grades', schema):
+        # Databases of older versions still keep their gradings as JSON in the assignment table
+        return _read_json_grades(conn, assignment, schema)
+    query = f"SELECT team, task, penalty, comment FROM {schema}.grades WHERE assignment = ?"
+    params = [assignment]
+    if teams is not None:
+        teams = [team_key(team) for team in teams]
+        query += f" AND team IN ({', '.join('?' * len(teams))})"
+        params += teams
+    for team, task, penalty, comment in conn.execute(query + " ORDER BY team, task, line", params):
+        grades.setdefault(team, {}).setdefault(task, []).append((penalty, comment))
+    return grades
+
+
+_TEAM_PAGE_ORDER = {'team': "team",
+                    'name': "name COLLATE NOCASE, team",
+                    'ungraded': "graded, team"}
+
+
+def _team_query(assignment: str, team_filter: Optional[str], name_filter: Optional[str], status: Optional[str],
+                sort: str) -> tuple[str, list]:
+    conditions, params = [], [assignment]
+    if team_filter:
+        conditions.append(f"{team_key_sql('t.Team')} LIKE ?")
+        params.append(f"%{team_filter}%")
+    if name_filter:
+        conditions.append(f"t.Team IN (SELECT Team FROM [{assignment}] "
+                          f"WHERE [First Name] || ' ' || [Last Name] LIKE ?)")
+        params.append(f"%{name_filter}%")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    having = {'graded': "HAVING graded = 1", 'ungraded': "HAVING graded = 0"}.get(status, '')
+    return f"""SELECT t.Team AS team, MIN(t.[Last Name]) AS name, COUNT(*) OVER () AS total,
+                      EXISTS(SELECT 1 FROM grades g WHERE g.assignment = ?
+                             AND g.team = {team_key_sql('t.Team')}) AS graded
+               FROM [{assignment}] t {where}
+               GROUP BY t.Team {having}
+               ORDER BY {_TEAM_PAGE_ORDER.get(sort, 'team')}""", params
+
+
+def query_team_page(conn: sqlite3.Connection, assignment: str, team_filter: Optional[str] = None,
+                    name_filter: Optional[str] = None, status: Optional[str] = None, sort: str = 'team',
+                    page: int = 1, page_size: int = 25) -> tuple[int, list[tuple]]:
+    """
+    Filter, sort and page the teams of an assignment in SQL, returns the number of matching teams
+    and the (team, graded) pairs of the requested page
+    """
+    query, params = _team_query(assignment, team_filter, name_filter, status, sort)
+    rows = conn.execute(query + " LIMIT ? OFFSET ?", params + [page_size, (max(page, 1) - 1) * page_size]).fetchall()
+    total = rows[0][2] if rows else 0
+    return total, [(row[0], bool(row[3])) for row in rows]
+
+
+def query_team_order(conn: sqlite3.Connection, assignment: str, team_filter: Optional[str] = None,
+                     name_filter: Optional[str] = None, status: Optional[str] = None, sort: str = 'team') -> list[str]:
+    """
+    All teams matching the filters in the order of the submission table, to step through them in the grading view
+    """
+    query, params = _team_query(assignment, team_filter, name_filter, status, sort)
+    return [team_key(row[0]) for row in conn.execute(query, params)]
+
+
+def get_team_members(conn: sqlite3.Connection, assignment: str, teams: list) -> dict[str, list[tuple[str, str]]]:
+    members = {}
+    if not teams:
+        return members
+    for first_name, last_name, team in conn.execute(f"SELECT [First Name], [Last Name], Team FROM [{assignment}] "
+                                                    f"WHERE Team IN ({', '.join('?' * len(teams))}) ORDER BY rowid",
+                                                    teams):
+        members.setdefault(team_key(team), []).append((first_name, last_name))
+    return members
+
+
+def set_task_lines(conn: sqlite3.Connection, assignment: str, team, task: str, lines: list,
+                   updated_at: Optional[float] = None) -> None:
+    team = team_key(team)
+    updated_at = updated_at or time.time()
+    conn.execute("DELETE FROM grades WHERE assignment = ? AND team = ? AND task = ?", (assignment, team, task))
+    _insert_task_lines(conn, assignment, team, task, lines, updated_at)
+    conn.execute("INSERT INTO grade_tasks (assignment, team, task, updated_at) VALUES (?, ?, ?, ?) "
+                 "ON CONFLICT (assignment, team, task) DO UPDATE SET updated_at = excluded.updated_at, "
+                 "version = grade_tasks.version + 1",
+                 (assignment, team, task, updated_at))
+
+
+def set_team_grades(conn: sqlite3.Connection, assignment: str, team, feedbacks: dict[str, list]) -> None:
+    """
+    Replace all gradings of a team by the given feedbacks (task -> list of (penalty, comment))
+    """
+    team = team_key(team)
+    now = time.time()
+    existing_tasks = {row[0] for row in conn.execute("SELECT DISTINCT task FROM grades WHERE assignment = ? AND team = ?",
+                                                     (assignment, team))}
+    for task in existing_tasks - set(feedbacks.keys()):
+        set_task_lines(conn, assignment, team, task, [], now)
+    for task, lines in feedbacks.items():
+        set_task_lines(conn, assignment, team, task, lines, now)
+
+
+def save_task_changes(conn: sqlite3.Connection, assignment: str, team,
+                      changes: dict[str, tuple[int, list]]) -> tuple[dict[str, int], list[str]]:
+    """
+    Save the changed tasks of a team (task -> (version the change is based on, lines)) with a compare-and-swap on
+    each task's version, so that concurrent saves of different tasks never overwrite each other. A task is only
+    written if nobody saved it since its version was read (0 for a task without grading). Returns the new version
+    of every saved task and the tasks left untouched because of a conflicting save.
+    """
+    team = team_key(team)
+    now = time.time()
+    saved, conflicts = {}, []
+    for task, (version, lines) in changes.items():
+        if version:
+            claimed = conn.execute("UPDATE grade_tasks SET version = version + 1, updated_at = ? "
+                                   "WHERE assignment = ? AND team = ? AND task = ? AND version = ?",
+                                   (now, assignment, team, task, version)).rowcount
+        else:
+            claimed = conn.execute("INSERT OR IGNORE INTO grade_tasks (assignment, team, task, updated_at, version) "
+                                   "VALUES (?, ?, ?, ?, 1)", (assignment, team, task, now)).rowcount
+        if not claimed:
+            conflicts.append(task)
+            continue
+        conn.execute("DELETE FROM grades WHERE assignment = ? AND team = ? AND task = ?", (assignment, team, task))
+        _insert_task_lines(conn, assignment, team, task, lines, now)
+        saved[task] = version + 1
+    return saved, conflicts
+
+
+def refresh_assignment_teams(conn: sqlite3.Connection, assignment: str) -> None:
+    """
+    Count the teams (or individual submissions) of an assignment and its graded teams anew, after (re)importing it
+    """
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info([{assignment}])")]
+    teams = conn.execute(f"SELECT COUNT(DISTINCT Team) FROM [{assignment}]" if 'Team' in columns
+                         else f"SELECT COUNT(*) FROM [{assignment}]").fetchone()[0]
+    graded = conn.execute("SELECT COUNT(DISTINCT team) FROM task_deductions WHERE assignment = ?",
+                          (assignment,)).fetchone()[0]
+    conn.execute("INSERT OR REPLACE INTO assignment_stats (assignment, teams, graded_teams) VALUES (?, ?, ?)",
+                 (assignment, teams, graded))
+
+
+def get_assignment_summary(conn: sqlite3.Connection, assignment: str) -> tuple[int, int]:
+    """
+    Number of teams and of graded teams of an assignment
+    """
+    row = conn.execute("SELECT teams, graded_teams FROM assignment_stats WHERE assignment = ?",
+                       (assignment,)).fetchone()
+    return (row[0], row[1]) if row else (0, 0)
+
+
+def get_deduction_counts(conn: sqlite3.Connection, assignment: str) -> dict[str, list[tuple[float, int]]]:
+    """
+    Per task, the (deduction, number of teams) pairs of all teams with comment lines on the task
+    """
+    counts = {}
+    for task, deduction, teams in conn.execute("SELECT task, deduction, teams FROM deduction_counts "
+                                               "WHERE assignment = ? ORDER BY task, deduction", (assignment,)):
+        counts.setdefault(task, []).append((deduction, teams))
+    return counts
+
+
+def get_top_comments(conn: sqlite3.Connection, assignment: str, limit: int = 10) -> list[tuple[str, str, int, float]]:
+    """
+    The most frequently given comments of an assignment as (task, comment, uses, total deduction)
+    """
+    return conn.execute("SELECT task, comment, uses, deduction FROM comment_counts WHERE assignment = ? "
+                        "ORDER BY uses DESC LIMIT ?", (assignment, limit)).fetchall()
+
+
+def get_assignment_sources(conn: sqlite3.Connection) -> dict[str, str]:
+    return dict(conn.execute("SELECT assignment, sha256 FROM assignment_sources").fetchall())
+
+
+def set_assignment_source(conn: sqlite3.Connection, assignment: str, sha256: Optional[str]) -> None:
+    if sha256 is None:
+        conn.execute("DELETE FROM assignment_sources WHERE assignment = ?", (assignment,))
+    else:
+        conn.execute("INSERT OR REPLACE INTO assignment_sources (assignment, sha256, imported_at) VALUES (?, ?, ?)",
+                     (assignment, sha256, time.time()))
+
+
+def delete_assignment_grades(conn: sqlite3.Connection, assignment: str) -> None:
+    conn.execute("DELETE FROM grades WHERE assignment = ?", (assignment,))
+    conn.execute("DELETE FROM grade_tasks WHERE assignment = ?", (assignment,))
+    conn.execute("DELETE FROM feedback_cache WHERE assignment = ?", (assignment,))
+
+
+# Per-task conflict resolution of merges, selecting which of the incoming tasks replace the local ones
+_MERGE_POLICIES = {
+    # every incoming task replaces the local one
+    'theirs': "1",
+    # only tasks that have not been graded locally are taken over
+    'mine': "local.updated_at IS NULL",
+    # the most recently saved version of a task wins
+    'newest': "local.updated_at IS NULL OR incoming.updated_at > local.updated_at",
+}
+
+
+def create_merge_staging(conn: sqlite3.Connection) -> None:
+    """
+    Create the temporary tables incoming gradings are staged in before being merged by apply_merge_staging
+    """
+    conn.execute("""CREATE TEMP TABLE IF NOT EXISTS merge_tasks_in (
+                        assignment TEXT, team TEXT, task TEXT, updated_at REAL,
+                        PRIMARY KEY (assignment, team, task))""")
+    conn.execute("""CREATE TEMP TABLE IF NOT EXISTS merge_grades (
+                        assignment TEXT, team TEXT, task TEXT, line INTEGER, penalty NUMERIC, comment TEXT,
+                        updated_at REAL)""")
+    conn.execute("""CREATE TEMP TABLE IF NOT EXISTS merge_tasks (
+                        assignment TEXT, team TEXT, task TEXT, updated_at REAL,
+                        PRIMARY KEY (assignment, team, task))""")
+
+
+def drop_merge_staging(conn: sqlite3.Connection) -> None:
+    for table in ('merge_tasks_in', 'merge_grades', 'merge_tasks'):
+        conn.execute(f"DROP TABLE IF EXISTS temp.{table}")
+
+
+def apply_merge_staging(conn: sqlite3.Connection, policy: str) -> tuple[int, int]:
+    """
+    Merge the staged tasks into the gradings with a few set-based statements, must run inside a transaction.
+    Returns the number of changed teams and tasks.
+    """
+    if policy not in _MERGE_POLICIES:
+        raise ValueError(f"Unknown merge policy '{policy}', expected one of {', '.join(_MERGE_POLICIES)}.")
+    # Only teams that exist in the local assignment tables are merged
+    local_assignments = list_assignments(conn)
+    conn.execute(f"DELETE FROM temp.merge_tasks_in WHERE assignment NOT IN ({', '.join('?' * len(local_assignments))})",
+                 local_assignments)
+    for (assignment,) in conn.execute("SELECT DISTINCT assignment FROM temp.merge_tasks_in").fetchall():
+        conn.execute(f"DELETE FROM temp.merge_tasks_in WHERE assignment = ? AND team NOT IN "
+                     f"(SELECT {team_key_sql('Team')} FROM main.[{assignment}] WHERE Team IS NOT NULL)", (assignment,))
+
+    # Select the tasks to take over according to the policy, skipping those identical on both sides
+    conn.execute(f"""INSERT INTO temp.merge_tasks
+                     SELECT incoming.assignment, incoming.team, incoming.task, incoming.updated_at
+                     FROM temp.merge_tasks_in incoming
+                     LEFT JOIN main.grade_tasks local
+                            ON local.assignment = incoming.assignment AND local.team = incoming.team
+                           AND local.task = incoming.task
+                     WHERE {_MERGE_POLICIES[policy]}""")
+    conn.execute("""DELETE FROM temp.merge_tasks WHERE NOT EXISTS (
+                        SELECT line, penalty, comment FROM temp.merge_grades m
+                        WHERE m.assignment = merge_tasks.assignment AND m.team = merge_tasks.team
+                          AND m.task = merge_tasks.task
+                        EXCEPT
+                        SELECT line, penalty, comment FROM main.grades g
+                        WHERE g.assignment = merge_tasks.assignment AND g.team = merge_tasks.team
+                          AND g.task = merge_tasks.task)
+                    AND NOT EXISTS (
+                        SELECT line, penalty, comment FROM main.grades g
+                        WHERE g.assignment = merge_tasks.assignment AND g.team = merge_tasks.team
+                          AND g.task = merge_tasks.task
+                        EXCEPT
+                        SELECT line, penalty, comment FROM temp.merge_grades m
+                        WHERE m.assignment = merge_tasks.assignment AND m.team = merge_tasks.team
+                          AND m.task = merge_tasks.task)""")
+
+    conn.execute("DELETE FROM main.grades WHERE (assignment, team, task) IN "
+                 "(SELECT assignment, team, task FROM temp.merge_tasks)")
+    conn.execute("""INSERT INTO main.grades (assignment, team, task, line, penalty, comment, updated_at)
+                    SELECT m.assignment, m.team, m.task, m.line, m.penalty, m.comment, t.updated_at
+                    FROM temp.merge_grades m
+                    JOIN temp.merge_tasks t ON t.assignment = m.assignment AND t.team = m.team AND t.task = m.task""")
+    conn.execute("""INSERT INTO main.grade_tasks (assignment, team, task, updated_at)
+                    SELECT assignment, team, task, updated_at FROM temp.merge_tasks WHERE true
+                    ON CONFLICT (assignment, team, task) DO UPDATE SET updated_at = excluded.updated_at,
+                                                                     version = grade_tasks.version + 1""")
+    return conn.execute("SELECT COUNT(DISTINCT assignment || char(31) || team), COUNT(*) "
+                        "FROM temp.merge_tasks").fetchone()
+
+
+def merge_database(conn: sqlite3.Connection, other_path: str, policy: str = 'theirs') -> dict:
+    """
+    Merge the gradings of another tutor's database into this one for all assignments both databases share,
+    using one set-based upsert inside a single transaction. Returns a report of what changed.
+    """
+    conn.commit()
+    conn.execute("ATTACH DATABASE ? AS other", (other_path,))
+    try:
+        local_assignments = set(list_assignments(conn))
+        other_assignments = list_assignments(conn, 'other')
+        shared = [assignment for assignment in other_assignments if assignment in local_assignments]
+
+        create_merge_staging(conn)
+        with conn:
+            if table_exists(conn, 'grades', 'other'):
+                conn.execute("INSERT INTO temp.merge_grades SELECT assignment, team, task, line, penalty, comment, "
+                             "updated_at FROM other.grades")
+            else:
+                # Databases of older versions keep their gradings as JSON, these have to be unpacked once
+                mtime = os.path.getmtime(other_path)
+                for assignment in shared:
+                    conn.executemany("INSERT INTO temp.merge_grades VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                     [(assignment, team, task, i, penalty, comment, mtime)
+                                      for team, feedbacks in _read_json_grades(conn, assignment, 'other').items()
+                                      for task, lines in feedbacks.items()
+                                      for i, (penalty, comment) in enumerate(lines)])
+            if table_exists(conn, 'grade_tasks', 'other'):
+                conn.execute("INSERT INTO temp.merge_tasks_in SELECT assignment, team, task, updated_at "
+                             "FROM other.grade_tasks")
+            else:
+                conn.execute("INSERT INTO temp.merge_tasks_in SELECT assignment, team, task, MAX(updated_at) "
+                             "FROM temp.merge_grades GROUP BY assignment, team, task")
+            teams, tasks = apply_merge_staging(conn, policy)
+        return {'assignments': shared,
+                'skipped': [assignment for assignment in other_assignments if assignment not in local_assignments],
+                'teams': teams,
+                'tasks': tasks}
+    finally:
+        conn.rollback()
+        drop_merge_staging(conn)
+        conn.execute("DETACH DATABASE other")
@@ -0,0 +1,125 @@
+import hashlib
+import itertools
+import json
+import sqlite3
+import tempfile
+import zipfile
+from typing import Optional, Sequence
+
+from src.config import AssignmentSpec
+from src.database import get_assignment_grades, team_key
+from src.scoring import score_grades
+from src.utils import format_points
+
+# Archives up to this size stay in memory, larger ones spill over into an anonymous temporary file
+_MAX_IN_MEMORY_ARCHIVE = 32 * 1024 * 1024
+# Bump whenever the output of render_feedback changes, so that cached feedbacks get rendered anew
+_RENDER_VERSION = 1
+
+
+def render_feedback(assignment: str, team, student_names: list[str], feedbacks: dict[str, list],
+                    spec: AssignmentSpec, points: Optional[Sequence[float]] = None) -> str:
+    """
+    Render the Markdown feedback of a single team, 'points' are the team's points reached per task if already scored
+    """
+    if points is None:
+        points = score_grades({team: feedbacks}, spec).points[0]
+    overall_score = 0
+    markdown_str = f"# Feedback on {assignment} for Team {team}\n\n"
+    markdown_str += f"Students: {', '.join(student_names)}\n\n"
+
+    tasks_str = ''
+    # Iterate through each task
+    for task, max_points, remaining_points in zip(spec.tasks, spec.max_points, points):
+        # List the comments, the points reached have been scored beforehand
+        penalty_str = "Penalties:\n\n"
+        if task in feedbacks.keys():
+            for penalty, comment in feedbacks[task]:
+                if penalty is None:
+                    if comment is None: continue    # Empty comment line
+                    else: penalty = 0               # Comment with no penalty
+                if penalty >= 0:
+                    penalty = -penalty
+                penalty_str += f"- **{penalty}** points: {comment}\n\n"
+
+        tasks_str += f"## Task {task}\n\n"
+        tasks_str += f"Points reached: **{format_points(remaining_points)}/{format_points(max_points)}**.\n\n"
+
+        # Determine the displayed message based on the remaining points
+        if remaining_points == max_points:
+            # In case the student has got full marks on this task,
+            # but the tutor still wants to leave a comment
+            if len(penalty_str) > 12:
+                tasks_str += penalty_str
+            tasks_str += f"Well done, you have got full marks on this task!\n\n"
+        else:
+            tasks_str += penalty_str
+        overall_score += remaining_points
+
+    markdown_str += f"Overall Score: **{format_points(overall_score)}/{format_points(spec.total_points)}**\n\n"
+    markdown_str += tasks_str
+    return markdown_str
+
+
+def feedback_hash(assignment: str, team, student_names: list[str], feedbacks: dict[str, list],
+                  spec: AssignmentSpec) -> str:
+    payload = [_RENDER_VERSION, assignment, team_key(team), student_names,
+               sorted(feedbacks.items()), spec.tasks, spec.max_points]
+    return hashlib.sha256(json.dumps(payload).encode()).hexdigest()
+
+
+def cached_feedback(conn: sqlite3.Connection, assignment: str, team, student_names: list[str],
+                    feedbacks: dict[str, list], spec: AssignmentSpec) -> str:
+    """
+    Return the feedback of a single team, rendering and caching it only if its inputs changed
+    """
+    digest = feedback_hash(assignment, team, student_names, feedbacks, spec)
+    cached = conn.execute("SELECT markdown FROM feedback_cache WHERE assignment = ? AND team = ? AND hash = ?",
+                          (assignment, team_key(team), digest)).fetchone()
+    if cached:
+        return cached[0]
+    markdown_str = render_feedback(assignment, team, student_names, feedbacks, spec)
+    conn.execute("INSERT OR REPLACE INTO feedback_cache (assignment, team, hash, markdown) VALUES (?, ?, ?, ?)",
+                 (assignment, team_key(team), digest, markdown_str))
+    conn.commit()
+    return markdown_str
+
+
+def build_feedback_archive(conn: sqlite3.Connection, assignment: str, spec: AssignmentSpec) -> bytes:
+    """
+    Render the feedbacks of all teams of an assignment straight into a zip archive, one entry per team.
+    Only teams whose gradings, members or task specification changed since the last run are rendered anew.
+    """
+    grades = get_assignment_grades(conn, assignment)
+    # Students without a team have no feedback, as when the archive was built from a pandas groupby
+    teams = [team_key(row[0]) for row in conn.execute(f"SELECT DISTINCT Team FROM [{assignment}] "
+                                                       f"WHERE Team IS NOT NULL ORDER BY Team")]
+    scores = score_grades(grades, spec, teams)
+    cache = {team: (digest, markdown_str) for team, digest, markdown_str in
+             conn.execute("SELECT team, hash, markdown FROM feedback_cache WHERE assignment = ?", (assignment,))}
+    members = conn.execute(f"SELECT [First Name], [Last Name], Team FROM [{assignment}] WHERE Team IS NOT NULL "
+                           f"ORDER BY Team, rowid").fetchall()
+    rendered = []
+
+    with tempfile.SpooledTemporaryFile(max_size=_MAX_IN_MEMORY_ARCHIVE) as buffer:
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            for i, (team, students) in enumerate(itertools.groupby(members, key=lambda student: student[2])):
+                students = list(students)
+                student_names = [f"{first_name} {last_name}" for first_name, last_name, _ in students]
+                feedbacks = grades.get(team_key(team), {})
+                digest = feedback_hash(assignment, team, student_names, feedbacks, spec)
+                if cache.get(team_key(team), (None,))[0] == digest:
+                    markdown_str = cache[team_key(team)][1]
+                else:
+                    markdown_str = render_feedback(assignment, team, student_names, feedbacks, spec, scores.points[i])
+                    rendered.append((assignment, team_key(team), digest, markdown_str))
+
+                lastnames = [last_name for _, last_name, _ in students]
+                zipf.writestr(f"{team}_{'_'.join(lastnames)}.md", markdown_str)
+        buffer.seek(0)
+        archive = buffer.read()
+
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO feedback_cache (assignment, team, hash, markdown) VALUES (?, ?, ?, ?)",
+                         rendered)
+    return archive
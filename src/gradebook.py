@@ -0,0 +1,131 @@
+import csv
+import itertools
+import sqlite3
+from typing import IO, Iterator, Union
+
+from src.config import AssignmentSpec, LectureConfig
+from src.database import list_assignments, team_key_sql
+from src.utils import format_points
+
+# Columns of the ILIAS sheets holding the login of a student, which ILIAS matches imported grades by
+_LOGIN_COLUMNS = ('Anmeldename', 'Login', 'Username', 'Benutzername')
+_STUDENT_HEADER = ['Login', 'Last Name', 'First Name']
+
+
+def gradebook_assignments(conn: sqlite3.Connection, lecture_config: LectureConfig) -> list[tuple[str, AssignmentSpec]]:
+    """
+    The assignments of the database that have a task specification in the lecture config, ordered by number
+    """
+    assignments = [(assignment, lecture_config.for_table(assignment)) for assignment in list_assignments(conn)]
+    return sorted([(assignment, spec) for assignment, spec in assignments if spec is not None],
+                  key=lambda assignment: assignment[1].number)
+
+
+def _members_query(conn: sqlite3.Connection, assignment: str) -> str:
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info([{assignment}])")]
+    login = next((f"[{column}]" for column in _LOGIN_COLUMNS if column in columns), 'NULL')
+    # Individual submissions are graded under 'Last Name,First Name'
+    team = team_key_sql('Team') if 'Team' in columns else "[Last Name] || ',' || [First Name]"
+    return (f"SELECT ? AS assignment, {team} AS team, [Last Name] AS last_name, [First Name] AS first_name, "
+            f"{login} AS login FROM [{assignment}]")
+
+
+def iter_gradebook(conn: sqlite3.Connection, assignments: list[tuple[str, AssignmentSpec]],
+                   totals_only: bool = False) -> Iterator[list]:
+    """
+    Yield the header and then one row per student with the points reached per assignment (and per task, unless
+    'totals_only') and over the whole lecture. The points of all students come from a single query over all
+    assignment tables, sorted by student, so only one student is held in memory at a time. Assignments not graded
+    for a student's team are left empty.
+    """
+    header = list(_STUDENT_HEADER)
+    for assignment, spec in assignments:
+        header.append(assignment)
+        if not totals_only:
+            header += [f"{assignment} Task {task}" for task in spec.tasks]
+    yield header + ['Total']
+    if not assignments:
+        return
+
+    members = ' UNION ALL '.join(_members_query(conn, assignment) for assignment, _ in assignments)
+    task_max = [(assignment, position, task, task_max) for assignment, spec in assignments
+                for position, (task, task_max) in enumerate(zip(spec.tasks, spec.max_points))]
+    rows = conn.execute(f"""WITH members AS ({members}),
+                                 task_max (assignment, position, task, max_points) AS
+                                     (VALUES {', '.join(['(?, ?, ?, ?)'] * len(task_max))})
+                            SELECT COALESCE(m.login, m.last_name || ',' || m.first_name) AS student,
+                                   m.login, m.last_name, m.first_name, m.assignment, t.position,
+                                   CASE WHEN EXISTS (SELECT 1 FROM task_deductions g WHERE g.assignment = m.assignment
+                                                     AND g.team = m.team)
+                                        THEN MAX(0, MIN(t.max_points, t.max_points - COALESCE(d.deduction, 0)))
+                                   END AS points
+                            FROM members m
+                            JOIN task_max t ON t.assignment = m.assignment
+                            LEFT JOIN task_deductions d ON d.assignment = m.assignment AND d.team = m.team
+                                                       AND d.task = t.task
+                            ORDER BY student""",
+                        [assignment for assignment, _ in assignments] + [value for row in task_max for value in row])
+
+    for _, student_rows in itertools.groupby(rows, key=lambda row: row[0]):
+        points = {}
+        for _, login, last_name, first_name, assignment, position, task_points in student_rows:
+            points[(assignment, position)] = task_points
+        row, total = [login, last_name, first_name], None
+        for assignment, spec in assignments:
+            task_points = [points.get((assignment, position)) for position in range(len(spec.tasks))]
+            graded = all(task is not None for task in task_points)
+            row.append(sum(task_points) if graded else None)
+            if graded:
+                total = (total or 0) + sum(task_points)
+            if not totals_only:
+                row += task_points
+        yield row + [total]
+
+
+def write_gradebook_csv(rows: Iterator[list], fp: IO[str]) -> int:
+    """
+    Write the gradebook rows as CSV, returns the number of students
+    """
+    writer = csv.writer(fp)
+    writer.writerow(next(rows))
+    students = 0
+    for row in rows:
+        writer.writerow([format_points(value) if isinstance(value, float) else value for value in row])
+        students += 1
+    return students
+
+
+def write_gradebook_xlsx(rows: Iterator[list], file: Union[str, IO[bytes]]) -> int:
+    """
+    Write the gradebook rows into a write-only workbook, which streams its rows to disk instead of keeping them
+    """
+    # Only the modes writing xlsx files should pay for importing openpyxl
+    import openpyxl
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('Gradebook')
+    sheet.append(next(rows))
+    students = 0
+    for row in rows:
+        sheet.append(row)
+        students += 1
+    workbook.save(file)
+    return students
+
+
+def export_gradebook(conn: sqlite3.Connection, lecture_config: LectureConfig, file: Union[str, IO],
+                     file_format: str = 'xlsx', totals_only: bool = False) -> dict:
+    """
+    Write the gradebook of the whole lecture as CSV (to a text file) or xlsx (to a binary file)
+    """
+    assignments = gradebook_assignments(conn, lecture_config)
+    rows = iter_gradebook(conn, assignments, totals_only)
+    if file_format == 'csv':
+        if isinstance(file, str):
+            with open(file, 'w', newline='', encoding='utf-8') as fp:
+                students = write_gradebook_csv(rows, fp)
+        else:
+            students = write_gradebook_csv(rows, file)
+    else:
+        students = write_gradebook_xlsx(rows, file)
+    return {'assignments': [assignment for assignment, _ in assignments], 'students': students}
@@ -0,0 +1,271 @@
+import json
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from html.parser import HTMLParser
+from typing import Optional
+from urllib.parse import urljoin, urlparse
+from urllib.request import Request, urlopen
+
+from src.config import DEFAULT_ILIAS_URL
+from src.utils import GERMAN_LANGUAGE_CONSTANTS, file_sha256
+
+# Journal of all upload attempts, kept next to the feedback files so that an interrupted upload can be resumed
+_JOURNAL_NAME = '.ilias_upload_journal.jsonl'
+_UPLOAD_TIMEOUT = 60
+
+
+class HandInsParser(HTMLParser):
+    """
+    Map the team number of every row of the ILIAS hand-ins table (given in parentheses in the row's first '.small'
+    element) to the data-action of the row's 'Evaluation by File' button, in a single pass over the page source
+    """
+    _VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+    _BUTTON_LABELS = ('Evaluation by File', GERMAN_LANGUAGE_CONSTANTS['Evaluation by File'])
+
+    def __init__(self):
+        super().__init__()
+        self.actions = {}
+        self._row = None
+        self._small = None
+        self._small_depth = 0
+        self._button = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'tr':
+            self._finish_row()
+            self._row = {'small': None, 'actions': []}
+        elif self._row is None:
+            return
+        if self._small is not None and tag not in self._VOID_TAGS:
+            self._small_depth += 1
+        elif self._row['small'] is None and 'small' in (attrs.get('class') or '').split():
+            self._small = []
+            self._small_depth = 0 if tag in self._VOID_TAGS else 1
+        if tag == 'button':
+            self._button = (attrs.get('data-action'), [])
+
+    def handle_endtag(self, tag):
+        if self._row is None:
+            return
+        if tag == 'button' and self._button is not None:
+            action, texts = self._button
+            if ' '.join(''.join(texts).split()) in self._BUTTON_LABELS and action:
+                self._row['actions'].append(action)
+            self._button = None
+        if self._small is not None:
+            self._small_depth -= 1
+            if self._small_depth <= 0:
+                self._row['small'] = ''.join(self._small)
+                self._small = None
+        if tag == 'tr':
+            self._finish_row()
+
+    def handle_data(self, data):
+        if self._small is not None:
+            self._small.append(data)
+        if self._button is not None:
+            self._button[1].append(data)
+
+    def _finish_row(self):
+        if self._row is not None and self._row['small'] and self._row['actions']:
+            team_number = re.search(r'\((\d+)\)', self._row['small'])
+            # In SSBI, only team submissions are accepted
+            if team_number:
+                self.actions.setdefault(team_number.group(1), self._row['actions'][0])
+        self._row = None
+
+    def close(self):
+        super().close()
+        self._finish_row()
+
+
+class UploadFormParser(HTMLParser):
+    """
+    Find the form holding the 'new_file' input of an ILIAS upload page, with its action and the fields to submit
+    """
+    def __init__(self):
+        super().__init__()
+        self.action = None
+        self.fields = []
+        self.file_field = None
+        self._form = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'form':
+            self._form = {'action': attrs.get('action') or '', 'fields': [], 'file_field': None}
+        elif tag == 'input' and self._form is not None and attrs.get('name'):
+            if attrs.get('id') == 'new_file':
+                self._form['file_field'] = attrs['name']
+            elif attrs.get('type') == 'hidden' or attrs['name'] == 'cmd[uploadFile]':
+                self._form['fields'].append((attrs['name'], attrs.get('value') or ''))
+
+    def handle_endtag(self, tag):
+        if tag == 'form' and self._form is not None:
+            if self._form['file_field'] and self.file_field is None:
+                self.action, self.fields, self.file_field = (self._form['action'], self._form['fields'],
+                                                             self._form['file_field'])
+            self._form = None
+
+
+def find_upload_urls(page_source: str, teams_view_url: str) -> dict[str, str]:
+    """
+    Build the upload page URL of every team listed on the hand-ins page at once
+    """
+    parser = HandInsParser()
+    parser.feed(page_source)
+    parser.close()
+    teams_view_url = urlparse(teams_view_url)
+    return {team: teams_view_url._replace(query=urlparse(action).query).geturl()
+            for team, action in parser.actions.items()}
+
+
+def _multipart(fields: list[tuple[str, str]], file_field: str, filename: str, content: bytes) -> tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+             for name, value in fields]
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+                 f'Content-Type: text/markdown\r\n\r\n'.encode() + content + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def upload_feedback(upload_url: str, feedback_file: str, headers: dict[str, str]) -> None:
+    """
+    Upload a single feedback file through the upload form of a team, authenticated by the given (cookie) headers.
+    Raises an IOError if ILIAS doesn't confirm the upload.
+    """
+    with urlopen(Request(upload_url, headers=headers), timeout=_UPLOAD_TIMEOUT) as response:
+        form = UploadFormParser()
+        form.feed(response.read().decode('utf-8', errors='replace'))
+        page_url = response.geturl()
+    if form.file_field is None:
+        raise IOError("No upload form found, the session may have expired")
+
+    with open(feedback_file, 'rb') as f:
+        body, content_type = _multipart(form.fields, form.file_field, os.path.basename(feedback_file), f.read())
+    request = Request(urljoin(page_url, form.action), data=body, headers=dict(headers, **{'Content-Type': content_type}))
+    with urlopen(request, timeout=_UPLOAD_TIMEOUT) as response:
+        if 'alert-success' not in response.read().decode('utf-8', errors='replace'):
+            raise IOError("ILIAS did not confirm the upload")
+
+
+def read_journal(journal_path: str) -> dict[str, dict]:
+    """
+    Latest journal entry per team
+    """
+    entries = {}
+    if os.path.exists(journal_path):
+        with open(journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A line cut off by a crash
+                    continue
+                entries[entry['team']] = entry
+    return entries
+
+
+def upload_feedbacks(upload_urls: dict[str, str], per_team_feedbacks: dict[str, str], headers: dict[str, str],
+                     journal_path: str, workers: int = 4) -> dict:
+    """
+    Upload the feedback files of all teams with a pool of concurrent workers. Every attempt is appended to the journal,
+    teams whose current feedback file was uploaded before are skipped.
+    """
+    from rich.progress import BarColumn, MofNCompleteColumn, Progress, TextColumn
+
+    journal = read_journal(journal_path)
+    report = {'uploaded': 0, 'skipped': 0, 'failed': 0}
+    pending = {}
+    for team, feedback_file in per_team_feedbacks.items():
+        digest = file_sha256(feedback_file)
+        previous = journal.get(team, {})
+        if previous.get('status') == 'uploaded' and previous.get('sha256') == digest:
+            report['skipped'] += 1
+        else:
+            pending[team] = (feedback_file, digest)
+
+    with Progress(TextColumn("[green]Uploading feedbacks..."),
+                  BarColumn(),
+                  MofNCompleteColumn()) as progress, open(journal_path, 'a', encoding='utf-8') as f:
+        task = progress.add_task("[green]Uploading feedbacks...", total=len(per_team_feedbacks))
+        progress.advance(task, report['skipped'])
+
+        def record(team: str, error: Optional[str]) -> None:
+            entry = {'team': team, 'file': os.path.basename(pending[team][0]), 'sha256': pending[team][1],
+                     'status': 'failed' if error else 'uploaded', 'at': time.time()}
+            if error:
+                entry['error'] = error
+                report['failed'] += 1
+                progress.console.print(f"Error processing {team}: {error}")
+            else:
+                report['uploaded'] += 1
+                progress.advance(task)
+            f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            futures = {}
+            for team, (feedback_file, _) in pending.items():
+                if team not in upload_urls:
+                    record(team, "team not found on the hand-ins page")
+                    continue
+                futures[executor.submit(upload_feedback, upload_urls[team], feedback_file, headers)] = team
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    record(futures[future], None)
+                except Exception as e:
+                    record(futures[future], str(e) or type(e).__name__)
+    return report
+
+
+def list_feedback_files(feedback_dir: str) -> dict[str, str]:
+    per_team_feedbacks = {}
+    for file in os.listdir(feedback_dir):
+        if file.startswith('.'):
+            continue
+        team_number = file.split('_')[0]
+        per_team_feedbacks[team_number] = os.path.join(os.path.abspath(feedback_dir), file)
+    return per_team_feedbacks
+
+
+def upload_to_ilias(feedback_dir, workers: int = 4, ilias_url: str = DEFAULT_ILIAS_URL) -> None:
+    # Selenium is only needed here, importing it lazily keeps the module cheap for the command line and the benchmarks
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    print("Now the browser should open. Please log in to ILIAS and navigate to the course page.")
+    driver = webdriver.Chrome()
+    # The browser is closed even if logging in or uploading fails
+    try:
+        wait = WebDriverWait(driver, 20)
+
+        driver.get(ilias_url)
+        print("Navigate to the Hands-in page and select the corresponding assignment.")
+
+        # While waiting for the user
+        per_team_feedbacks = list_feedback_files(feedback_dir)
+
+        input("Press Enter when you are ready to upload feedbacks...")
+        wait.until(EC.presence_of_element_located((By.CLASS_NAME, "table-responsive")))
+        # Resolve the upload page of every team from one snapshot of the hand-ins table
+        upload_urls = find_upload_urls(driver.page_source, driver.current_url)
+        # The uploads themselves are plain HTTP requests within the browser's logged-in session
+        headers = {'Cookie': '; '.join(f"{cookie['name']}={cookie['value']}" for cookie in driver.get_cookies()),
+                   'User-Agent': driver.execute_script("return navigator.userAgent")}
+
+        report = upload_feedbacks(upload_urls, per_team_feedbacks, headers,
+                                  os.path.join(feedback_dir, _JOURNAL_NAME), workers)
+    finally:
+        driver.quit()
+    print(f"Uploaded {report['uploaded']}, skipped {report['skipped']} already uploaded and failed {report['failed']} "
+          f"feedback(s). Run again to retry the failed ones.")
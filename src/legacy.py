@@ -0,0 +1,217 @@
+import csv
+import hashlib
+import itertools
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterable, Iterator, Optional
+
+from tabulate import tabulate
+
+from src.config import AssignmentSpec
+from src.scoring import score_points
+from src.utils import file_sha256
+
+_TABLE_HEADERS = ('task', 'points_reached', 'points_max', 'comment')
+# Number of grading sheet rows scored at once, memory stays bounded by this regardless of the sheet's size
+_CHUNK_SIZE = 500
+# Bump whenever the rendered feedback changes, so that the next run writes all files anew
+_MANIFEST_VERSION = 1
+
+
+def _is_int(value: str) -> bool:
+    try:
+        int(value)
+        return True
+    except ValueError:
+        return False
+
+
+class FeedbackTable:
+    """
+    Layout of the legacy feedback table of an assignment. The task and maximum points columns are fixed per assignment,
+    only the points reached and comments are filled in per team. The table is rendered by tabulate as the 'pipe' table
+    pandas' DataFrame.to_markdown() used to produce.
+    """
+    def __init__(self, spec: AssignmentSpec):
+        # Task ids that are numbers formed an integer column in the DataFrame
+        self.tasks = [int(task) if _is_int(task) else task for task in spec.tasks]
+        self.max_points = list(spec.max_points)
+
+    def render(self, points: list[float], comments: list[str]) -> str:
+        return tabulate(dict(zip(_TABLE_HEADERS, [self.tasks, points, self.max_points, comments])), headers='keys',
+                        tablefmt='pipe', showindex=False)
+
+
+def _parse_cell(cell: str) -> tuple[float, str]:
+    """
+    Split a 'points:comment' cell, empty cells have no points. Raises ValueError if the points are not a number.
+    """
+    if not cell:
+        return math.nan, ''
+    points, _, comment = cell.partition(':')
+    return float(points), comment.replace('|', '\n')
+
+
+def iter_grading_sheet(filepath: str, spec: AssignmentSpec) -> Iterator[tuple[str, list[str]]]:
+    """
+    Stream the rows of a legacy grading sheet as (names, cells per task in the order of the spec), validating the
+    number of elements of every line while reading it
+    """
+    with open(filepath, 'r', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        if len(header) - 1 != len(spec.tasks):
+            raise IOError(f"Error! Found {len(header) - 1}, not the expected {len(spec.tasks)}, number of elements in "
+                          f"line {reader.line_num} in your grading file.")
+        try:
+            order = [header[1:].index(task) for task in spec.tasks]
+        except ValueError:
+            raise IOError(f"The tasks {header[1:]} in {filepath} do not match the configured tasks {list(spec.tasks)}.")
+
+        for row in reader:
+            if not row:
+                continue
+            if len(row) - 1 != len(spec.tasks):
+                raise IOError(f"Error! Found {len(row) - 1}, not the expected {len(spec.tasks)}, number of elements "
+                              f"in line {reader.line_num} in your grading file.")
+            yield row[0], [row[1 + i] for i in order]
+
+
+def _spec_hash(spec: AssignmentSpec, lecture_marker: str) -> str:
+    payload = [_MANIFEST_VERSION, lecture_marker, spec.number, spec.tasks, spec.max_points]
+    return hashlib.sha256(json.dumps(payload).encode()).hexdigest()
+
+
+def transcribe_assignment(spec: AssignmentSpec, lecture_marker: str, output_dir: str,
+                          known_files: Optional[dict[str, str]] = None) -> dict:
+    """
+    Transcribe the grading sheet of an assignment in a single pass. Feedback files whose content hash is listed in
+    'known_files' and that still exist are not written again. Returns the hashes of all feedback files, the number of
+    written, skipped and errored files and the messages to report.
+    """
+    known_files = known_files or {}
+    result = {'files': {}, 'written': 0, 'skipped': 0, 'errored': 0, 'messages': []}
+    table = FeedbackTable(spec)
+    assignment_dir = os.path.join(output_dir, f"ass{spec.number}")
+    rows = iter_grading_sheet(spec.filepath, spec)
+
+    for chunk in iter(lambda: list(itertools.islice(rows, _CHUNK_SIZE)), []):
+        # Score the chunk at once, teams with non-floatable points are skipped
+        teams, reached, comments = [], [], []
+        for names, cells in chunk:
+            try:
+                parsed = [_parse_cell(cell) for cell in cells]
+            except ValueError:
+                result['messages'].append(f"Found non-floatable value in feedback for {names}.")
+                result['errored'] += len(names.split(','))
+                continue
+            teams.append(names)
+            reached.append([points for points, _ in parsed])
+            comments.append([comment for _, comment in parsed])
+        scores = score_points(teams, reached, spec)
+
+        for names, points, team_comments, total_points_reached in zip(teams, reached, comments, scores.totals):
+            out_str = table.render(points, team_comments)
+            out_str += f'\nTotal points reached: {total_points_reached} of {spec.total_points}'
+            if (total_points_reached <= spec.total_points) and ("TODO" not in out_str):
+                digest = hashlib.sha256(out_str.encode()).hexdigest()
+                os.makedirs(assignment_dir, exist_ok=True)
+                for name in names.split(','):
+                    filename = f"{lecture_marker}_ass{spec.number}_feedback_{name}.md"
+                    filepath = os.path.join(assignment_dir, filename)
+                    result['files'][filename] = digest
+                    if known_files.get(filename) == digest and os.path.exists(filepath):
+                        result['skipped'] += 1
+                        continue
+                    with open(filepath, 'w') as f:
+                        f.write(out_str)
+                    result['written'] += 1
+                continue
+            elif total_points_reached > spec.total_points:
+                result['messages'].append(f"Error. Total points calculated exceed total points intended:\n{out_str}\n")
+            elif "TODO" in out_str:
+                result['messages'].append(f"Error. Found TODO in output:\n{out_str}\n")
+            else:
+                result['messages'].append(f"Unknown Error in output:\n{out_str}\n")
+            result['errored'] += len(names.split(','))
+    result['messages'].append(f"Finished writing outputs for {spec.filepath}.")
+    return result
+
+
+def _load_manifest(path: str) -> dict:
+    try:
+        with open(path, 'r') as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    return manifest.get('assignments', {}) if manifest.get('version') == _MANIFEST_VERSION else {}
+
+
+def transcribe_lecture(specs: Iterable[AssignmentSpec], lecture_marker: str, output_dir: str,
+                       workers: Optional[int] = None) -> dict:
+    """
+    Transcribe the grading sheets of all assignments, tracked by a manifest in the output directory. Assignments whose
+    sheet and spec are unchanged since the last run are skipped entirely, the others are transcribed in parallel
+    worker processes, writing only the feedback files whose content changed.
+    """
+    manifest_path = os.path.join(output_dir, f"{lecture_marker}_legacy_manifest.json")
+    manifest = _load_manifest(manifest_path)
+    report = {'written': 0, 'skipped': 0, 'errored': 0}
+    pending = {}
+    for spec in specs:
+        if not spec.filepath or not os.path.exists(spec.filepath):
+            print(f"Could not find {spec.filepath}." if spec.filepath
+                  else f"No grading sheet ('filepath=') configured for assignment no.{spec.number}.")
+            continue
+        entry = {'sheet': file_sha256(spec.filepath), 'spec': _spec_hash(spec, lecture_marker)}
+        previous = manifest.get(str(spec.number), {})
+        assignment_dir = os.path.join(output_dir, f"ass{spec.number}")
+        if (previous.get('sheet') == entry['sheet'] and previous.get('spec') == entry['spec']
+                and not previous.get('errored')
+                and all(os.path.exists(os.path.join(assignment_dir, name)) for name in previous.get('files', {}))):
+            report['skipped'] += len(previous.get('files', {}))
+            print(f"Skipping unchanged {spec.filepath}.")
+            continue
+        pending[spec.number] = (spec, entry, previous.get('files', {}))
+
+    def collect(number: int, result: dict) -> None:
+        entry = pending[number][1]
+        for message in result['messages']:
+            print(message)
+        for key in report:
+            report[key] += result[key]
+        manifest[str(number)] = dict(entry, files=result['files'], errored=result['errored'])
+
+    def fail(number: int, error: Exception) -> None:
+        print(f"Unable to transcribe {pending[number][0].filepath}: {error}")
+        manifest.pop(str(number), None)
+
+    # A sheet that can't be read (e.g. not UTF-8 or malformed) only fails its own assignment, UnicodeDecodeError is
+    # a ValueError as well
+    if len(pending) == 1:
+        # Not worth starting a pool for a single assignment
+        (number, (spec, _, known_files)), = pending.items()
+        try:
+            collect(number, transcribe_assignment(spec, lecture_marker, output_dir, known_files))
+        except (IOError, csv.Error, ValueError) as e:
+            fail(number, e)
+    elif pending:
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(pending))) as executor:
+            futures = {executor.submit(transcribe_assignment, spec, lecture_marker, output_dir, known_files): number
+                       for number, (spec, _, known_files) in pending.items()}
+            for future in as_completed(futures):
+                try:
+                    collect(futures[future], future.result())
+                except (IOError, csv.Error, ValueError) as e:
+                    fail(futures[future], e)
+
+    if pending:
+        os.makedirs(output_dir, exist_ok=True)
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump({'version': _MANIFEST_VERSION, 'assignments': manifest}, f, indent=1)
+        os.replace(manifest_path + '.tmp', manifest_path)
+    print(f"Feedback files written: {report['written']}, skipped as unchanged: {report['skipped']}, "
+          f"errored: {report['errored']}.")
+    return report
@@ -0,0 +1,244 @@
+import functools
+import sqlite3
+import sys
+import threading
+import time
+from bisect import bisect_left
+from typing import Optional
+
+from flask import Response, request
+
+# Upper bounds of the histogram buckets, latencies in seconds and payload sizes in bytes
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_PAYLOAD_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+# SQL statements are labelled by their text, with whitespace collapsed and cut off after this many characters
+_STATEMENT_LABEL_LENGTH = 200
+_PREFIX = 'assignment_feedback'
+_DASH_UPDATE_PATH = '/_dash-update-component'
+
+
+class Histogram:
+    """
+    Cumulative histogram in the Prometheus sense: the count of observations at or below each bucket bound
+    """
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str) -> list[str]:
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum:.6f}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+def _label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def statement_label(sql: str) -> str:
+    statement = ' '.join(sql.split())
+    if len(statement) > _STATEMENT_LABEL_LENGTH:
+        statement = statement[:_STATEMENT_LABEL_LENGTH - 3] + '...'
+    return statement
+
+
+class Metrics:
+    """
+    Latency histograms per Dash callback and per SQL statement, and the payload sizes of callback responses.
+    Callbacks slower than 'slow_callback_seconds' are logged together with the SQL time they spent.
+    """
+    def __init__(self, slow_callback_seconds: Optional[float] = None):
+        self.slow_callback_seconds = slow_callback_seconds
+        self.callbacks = {}
+        self.payloads = {}
+        self.queries = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+        # SQL time and statement count of the request handled by the current thread
+        self._request = threading.local()
+
+    def observe_callback(self, callback: str, seconds: float, payload_bytes: int, failed: bool = False) -> None:
+        with self._lock:
+            self.callbacks.setdefault(callback, Histogram(_LATENCY_BUCKETS)).observe(seconds)
+            self.payloads.setdefault(callback, Histogram(_PAYLOAD_BUCKETS)).observe(payload_bytes)
+            if failed:
+                self.errors[callback] = self.errors.get(callback, 0) + 1
+
+    def observe_query(self, sql: str, seconds: float) -> None:
+        statement = statement_label(sql)
+        with self._lock:
+            self.queries.setdefault(statement, Histogram(_LATENCY_BUCKETS)).observe(seconds)
+        if getattr(self._request, 'active', False):
+            self._request.sql_seconds += seconds
+            self._request.statements += 1
+
+    def connection_factory(self):
+        """
+        Factory for sqlite3.connect, the connections it creates report every statement to this registry
+        """
+        return functools.partial(InstrumentedConnection, metrics=self)
+
+    def render(self) -> str:
+        """
+        All metrics in the Prometheus text exposition format
+        """
+        with self._lock:
+            lines = [f'# HELP {_PREFIX}_callback_duration_seconds Time spent handling a Dash callback request.',
+                     f'# TYPE {_PREFIX}_callback_duration_seconds histogram']
+            for callback, histogram in sorted(self.callbacks.items()):
+                lines += histogram.render(f'{_PREFIX}_callback_duration_seconds', f'callback="{_label(callback)}"')
+            lines += [f'# HELP {_PREFIX}_callback_response_bytes Size of the response body of a Dash callback.',
+                      f'# TYPE {_PREFIX}_callback_response_bytes histogram']
+            for callback, histogram in sorted(self.payloads.items()):
+                lines += histogram.render(f'{_PREFIX}_callback_response_bytes', f'callback="{_label(callback)}"')
+            lines += [f'# HELP {_PREFIX}_callback_errors_total Dash callback requests answered with a server error.',
+                      f'# TYPE {_PREFIX}_callback_errors_total counter']
+            lines += [f'{_PREFIX}_callback_errors_total{{callback="{_label(callback)}"}} {count}'
+                      for callback, count in sorted(self.errors.items())]
+            lines += [f'# HELP {_PREFIX}_sql_duration_seconds Time spent executing and fetching an SQL statement.',
+                      f'# TYPE {_PREFIX}_sql_duration_seconds histogram']
+            for statement, histogram in sorted(self.queries.items()):
+                lines += histogram.render(f'{_PREFIX}_sql_duration_seconds', f'statement="{_label(statement)}"')
+        return '\n'.join(lines) + '\n'
+
+    def instrument(self, app, dash_app, expose: bool = True) -> None:
+        """
+        Time every callback request of 'dash_app' and, if 'expose' is set, serve the metrics on '/metrics' of 'app'
+        """
+        @app.before_request
+        def start_timer():
+            if request.path.endswith(_DASH_UPDATE_PATH):
+                self._request.active = True
+                self._request.sql_seconds = 0.0
+                self._request.statements = 0
+                self._request.start = time.perf_counter()
+
+        @app.after_request
+        def record_callback(response):
+            if not getattr(self._request, 'active', False) or not request.path.endswith(_DASH_UPDATE_PATH):
+                return response
+            self._request.active = False
+            seconds = time.perf_counter() - self._request.start
+            callback = _callback_name(dash_app, request.get_json(silent=True))
+            self.observe_callback(callback, seconds, response.calculate_content_length() or 0,
+                                  failed=response.status_code >= 500)
+            if self.slow_callback_seconds is not None and seconds >= self.slow_callback_seconds:
+                print(f"Slow callback {callback}: {seconds * 1000:.0f} ms, {self._request.statements} SQL "
+                      f"statement(s) took {self._request.sql_seconds * 1000:.0f} ms, "
+                      f"{response.calculate_content_length() or 0} bytes returned", file=sys.stderr, flush=True)
+            return response
+
+        if expose:
+            @app.route('/metrics')
+            def metrics():
+                return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+
+def _callback_name(dash_app, payload: Optional[dict]) -> str:
+    output = (payload or {}).get('output')
+    callback = dash_app.callback_map.get(output, {}).get('callback') if output else None
+    if callback is None:
+        return output or 'unknown'
+    return getattr(callback, '__name__', output)
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    Cursor reporting the time spent executing a statement and fetching its rows, as one observation per execution.
+    The observation is made once the rows are exhausted, the next statement runs or the cursor is closed.
+    """
+    metrics = None
+    _sql = None
+    _elapsed = 0.0
+
+    def _flush(self) -> None:
+        if self._sql is not None and self.metrics is not None:
+            self.metrics.observe_query(self._sql, self._elapsed)
+        self._sql, self._elapsed = None, 0.0
+
+    def _timed(self, function, *args):
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self._elapsed += time.perf_counter() - start
+
+    def _run(self, function, sql, *args):
+        self._flush()
+        self._sql = sql
+        return self._timed(function, sql, *args)
+
+    def execute(self, sql, parameters=()):
+        return self._run(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(super().executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self._run(super().executescript, sql_script)
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._flush()
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        if not rows:
+            self._flush()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._flush()
+        return rows
+
+    def __next__(self):
+        try:
+            return self._timed(super().__next__)
+        except StopIteration:
+            self._flush()
+            raise
+
+    def close(self):
+        self._flush()
+        super().close()
+
+    def __del__(self):
+        self._flush()
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    Connection whose statements, including the shortcuts run on the connection itself, go through InstrumentedCursor
+    """
+    def __init__(self, *args, metrics: Metrics, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = metrics
+
+    def cursor(self, factory=InstrumentedCursor):
+        cursor = super().cursor(factory)
+        if isinstance(cursor, InstrumentedCursor):
+            cursor.metrics = self.metrics
+        return cursor
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
@@ -0,0 +1,78 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional
+
+from src.database import ConnectionPool, get_task_versions, team_key
+
+
+class GradingViewCache:
+    """
+    Small LRU cache of the data behind the grading view of a team (student names, gradings, task versions and the
+    feedback preview), filled in the background for the teams next to the one being graded. An entry is only handed
+    out while the versions of the team's tasks are unchanged, so a save of another tutor is never hidden.
+    """
+    def __init__(self, pool: ConnectionPool, load: Callable[[sqlite3.Connection, str, str], dict], size: int = 32,
+                 workers: int = 1):
+        self.pool = pool
+        self.load = load
+        self.size = size
+        self._entries = OrderedDict()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='grading-prefetch')
+
+    def get(self, conn: sqlite3.Connection, assignment: str, team) -> Optional[dict]:
+        key = (assignment, team_key(team))
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+        if data is None or get_task_versions(conn, assignment, team) != data['versions']:
+            return None
+        return data
+
+    def put(self, assignment: str, team, data: dict) -> None:
+        with self._lock:
+            self._entries[(assignment, team_key(team))] = data
+            self._entries.move_to_end((assignment, team_key(team)))
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def prefetch(self, assignment: str, teams: Iterable) -> None:
+        """
+        Load the given teams in the background, unless they are cached or being loaded already
+        """
+        for team in teams:
+            key = (assignment, team_key(team))
+            with self._lock:
+                if key in self._entries or key in self._pending:
+                    continue
+                self._pending.add(key)
+            self._executor.submit(self._prefetch, key)
+
+    def _prefetch(self, key: tuple[str, str]) -> None:
+        try:
+            # Prefetching is best effort, it only uses a connection nobody is waiting for
+            conn = self.pool.acquire(timeout=0)
+        except sqlite3.OperationalError:
+            with self._lock:
+                self._pending.discard(key)
+            return
+        try:
+            self.put(*key, self.load(conn, *key))
+        except sqlite3.Error:
+            pass
+        finally:
+            self.pool.release(conn)
+            with self._lock:
+                self._pending.discard(key)
+
+    def invalidate(self, assignment: Optional[str] = None) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if assignment is None or key[0] == assignment]:
+                del self._entries[key]
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,117 @@
+from typing import NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from src.config import AssignmentSpec
+
+
+class Scores(NamedTuple):
+    teams: list
+    tasks: tuple[str, ...]
+    max_points: np.ndarray
+    # points reached, one row per team and one column per task
+    points: np.ndarray
+
+    @property
+    def totals(self) -> np.ndarray:
+        # Empty cells of legacy grading sheets are NaN and count as no points, as in pandas' sum
+        return np.nansum(self.points, axis=1)
+
+    def index(self, team) -> int:
+        return self.teams.index(team)
+
+    def task_points(self, team) -> dict[str, float]:
+        return dict(zip(self.tasks, self.points[self.index(team)].tolist()))
+
+    def total(self, team) -> float:
+        return float(self.totals[self.index(team)])
+
+
+def score_penalties(teams: Sequence, tasks: Sequence, penalties: Sequence, spec: AssignmentSpec,
+                    all_teams: Optional[list] = None) -> Scores:
+    """
+    Score a whole assignment from its penalty lines, given as parallel arrays of team, task and penalty.
+    Every line subtracts the absolute value of its penalty (empty penalties count as 0) from the task's maximum,
+    the points reached per task are clamped to [0, maximum]. Teams without any lines are given by 'all_teams'.
+    """
+    all_teams = list(all_teams) if all_teams is not None else sorted(set(teams))
+    team_index = {team: i for i, team in enumerate(all_teams)}
+    task_index = {task: i for i, task in enumerate(spec.tasks)}
+    max_points = np.asarray(spec.max_points, dtype=float)
+
+    rows = np.fromiter((team_index.get(team, -1) for team in teams), dtype=np.intp, count=len(teams))
+    cols = np.fromiter((task_index.get(str(task), -1) for task in tasks), dtype=np.intp, count=len(tasks))
+    values = np.abs(np.asarray(penalties, dtype=float).reshape(-1))
+    # Lines of unknown teams or tasks are ignored, empty penalties don't count
+    valid = (rows >= 0) & (cols >= 0) & ~np.isnan(values)
+
+    deductions = np.zeros((len(all_teams), len(spec.tasks)))
+    np.add.at(deductions, (rows[valid], cols[valid]), values[valid])
+    points = np.clip(max_points - deductions, 0, max_points)
+    return Scores(all_teams, spec.tasks, max_points, points)
+
+
+def score_grades(grades: dict, spec: AssignmentSpec, all_teams: Optional[list] = None) -> Scores:
+    """
+    Score the gradings of several teams as loaded from the database (team -> task -> list of (penalty, comment))
+    """
+    teams, tasks, penalties = [], [], []
+    for team, feedbacks in grades.items():
+        for task, lines in feedbacks.items():
+            for penalty, _ in lines:
+                teams.append(team)
+                tasks.append(task)
+                penalties.append(np.nan if penalty is None else penalty)
+    return score_penalties(teams, tasks, penalties, spec, all_teams if all_teams is not None else list(grades))
+
+
+def score_points(students: list, points: Sequence[Sequence], spec: AssignmentSpec) -> Scores:
+    """
+    Wrap directly given points reached per task (legacy grading sheets) to share the total computation
+    """
+    points = np.asarray(points, dtype=float).reshape(len(students), len(spec.tasks))
+    return Scores(list(students), spec.tasks, np.asarray(spec.max_points, dtype=float), points)
+
+
+class TaskStatistics(NamedTuple):
+    task: str
+    max_points: float
+    mean: float
+    median: float
+    # teams per bin of points reached, the bins are delimited by 'edges'
+    histogram: np.ndarray
+    edges: np.ndarray
+
+
+def _weighted_median(values: np.ndarray, weights: np.ndarray) -> float:
+    order = np.argsort(values)
+    values, cumulative = values[order], np.cumsum(weights[order])
+    total = cumulative[-1]
+    # Average of the two middle values for an even number of teams
+    lower = values[np.searchsorted(cumulative, (total + 1) // 2)]
+    upper = values[np.searchsorted(cumulative, total // 2 + 1)]
+    return float(lower + upper) / 2
+
+
+def score_deduction_counts(counts: dict[str, list[tuple[float, int]]], spec: AssignmentSpec, graded_teams: int,
+                           bins: int = 10) -> list[TaskStatistics]:
+    """
+    Statistics of the points reached per task over the graded teams, computed from how many teams share each
+    deduction of a task rather than from the teams themselves. Graded teams without lines on a task lost no points.
+    """
+    statistics = []
+    for task, task_max in zip(spec.tasks, spec.max_points):
+        deductions = np.asarray([deduction for deduction, _ in counts.get(task, [])], dtype=float)
+        weights = np.asarray([teams for _, teams in counts.get(task, [])], dtype=np.int64)
+        # The remaining graded teams have no lines on the task and keep its maximum
+        deductions = np.append(deductions, 0.0)
+        weights = np.append(weights, max(graded_teams - int(weights.sum()), 0))
+        points = np.clip(task_max - deductions, 0, task_max)
+        edges = np.linspace(0, task_max, bins + 1) if task_max > 0 else np.array([0.0, 1.0])
+        histogram = np.histogram(points, bins=edges, weights=weights)[0].astype(np.int64)
+        if weights.sum() == 0:
+            statistics.append(TaskStatistics(task, task_max, float('nan'), float('nan'), histogram, edges))
+            continue
+        statistics.append(TaskStatistics(task, task_max, float(np.average(points, weights=weights)),
+                                         _weighted_median(points, weights), histogram, edges))
+    return statistics
@@ -1,44 +1,135 @@
-import ast
+import hashlib
+import itertools
 import os
-import re
-import time
+from datetime import date, datetime
+from typing import IO, Iterator, Optional, Union
 
-import pandas as pd
-from rich.progress import BarColumn, MofNCompleteColumn, Progress, TextColumn
+from src.database import (delete_assignment_grades, init_db, refresh_assignment_teams, set_assignment_source,
+                          table_exists)
 
-from urllib.parse import urlparse
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.common.exceptions import NoSuchElementException
 
+# Labels of the German ILIAS interface, used by the sheet import and the upload to ILIAS
+GERMAN_LANGUAGE_CONSTANTS = {'Vorname': 'First Name',
+                             'Nachname': 'Last Name',
+                             'Evaluation by File': 'Rückmeldung per Datei',
+                             'back': 'zurück'}
 
-_GERMAN_LANGUAGE_CONSTANTS = {'Vorname': 'First Name',
-                              'Nachname': 'Last Name',
-                              'Evaluation by File': 'Rückmeldung per Datei',
-                              'back': 'zurück'}
 
+# Number of spreadsheet rows inserted per executemany while importing
+_IMPORT_BATCH_SIZE = 500
 
-def excel_to_sqlite(xlsx_file: str, db_connection, is_blank: bool = False) -> bool:
+
+def translate_columns_to_english(columns: list[str]) -> list[str]:
+    if 'Vorname' in columns:
+        return [GERMAN_LANGUAGE_CONSTANTS.get(column, column) for column in columns]
+    else:
+        return columns
+
+
+def iter_xlsx_rows(xlsx_file: Union[str, IO[bytes]]) -> Iterator[tuple]:
+    """
+    Stream the first sheet of a workbook in read-only mode, the first yielded row holds the (english) column names
+    """
+    # openpyxl takes a noticeable part of the startup time, modes that read no xlsx files shouldn't pay for it
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(xlsx_file, read_only=True, data_only=True)
     try:
-        df = pd.read_excel(xlsx_file, engine='openpyxl')
-        if 'Grade' not in df.columns:
-            df['Grade'] = ''
-        df.insert(0, 'id', range(1, len(df) + 1))
-        df.set_index('id', inplace=True)
-
-        # Swap from german to english
-        df = translate_df_columns_to_english(df)
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, ())
+        # Name unnamed columns like pandas did
+        yield tuple(translate_columns_to_english([str(column) if column is not None else f"Unnamed: {i}"
+                                                  for i, column in enumerate(header)]))
+        for row in rows:
+            if any(value is not None for value in row):
+                yield tuple(value.isoformat(sep=' ') if isinstance(value, (datetime, date)) else value
+                            for value in row)
+    finally:
+        workbook.close()
+
+
+def _column_type(values: list) -> str:
+    values = [value for value in values if value is not None]
+    if values and all(isinstance(value, int) for value in values):
+        return 'INTEGER'
+    if values and all(isinstance(value, (int, float)) for value in values):
+        return 'REAL'
+    return 'TEXT'
+
+
+def replace_assignment_table(db_connection, table_name: str, rows: Iterator[tuple], keep_grades: bool = False,
+                             source_hash: Optional[str] = None) -> None:
+    """
+    (Re)create an assignment table from streamed spreadsheet rows (column names first) within the caller's transaction
+    """
+    columns = list(next(rows))
+    batch = list(itertools.islice(rows, _IMPORT_BATCH_SIZE))
+    column_types = [_column_type([row[i] for row in batch if i < len(row)]) for i in range(len(columns))]
+
+    if table_exists(db_connection, table_name):
+        db_connection.execute(f"DROP TABLE [{table_name}]")
+        if not keep_grades:
+            # Replacing an assignment discards all of its gradings
+            delete_assignment_grades(db_connection, table_name)
+    column_defs = ', '.join(f"[{column}] {column_type}" for column, column_type in zip(columns, column_types))
+    db_connection.execute(f"CREATE TABLE [{table_name}] (id INTEGER PRIMARY KEY, {column_defs})")
+    insert = (f"INSERT INTO [{table_name}] ({', '.join(f'[{column}]' for column in columns)}) "
+              f"VALUES ({', '.join('?' * len(columns))})")
+    while batch:
+        db_connection.executemany(insert, [(row + (None,) * len(columns))[:len(columns)] for row in batch])
+        batch = list(itertools.islice(rows, _IMPORT_BATCH_SIZE))
+    if 'Team' in columns:
+        db_connection.execute(f"CREATE INDEX [idx_{table_name}_team] ON [{table_name}] (Team)")
+    set_assignment_source(db_connection, table_name, source_hash)
+    refresh_assignment_teams(db_connection, table_name)
+
+
+def write_assignment_table(db_connection, table_name: str, rows: Iterator[tuple], is_blank: bool = False,
+                           source_hash: Optional[str] = None) -> None:
+    """
+    Write streamed spreadsheet rows (column names first) into an assignment table within one transaction
+    """
+    init_db(db_connection)
+    if is_blank and table_exists(db_connection, table_name):
+        # If new tables are added, keep the identically named one that already exists
+        return
+
+    db_connection.commit()
+    db_connection.execute("BEGIN")
+    try:
+        replace_assignment_table(db_connection, table_name, rows, source_hash=source_hash)
+        db_connection.commit()
+    except BaseException:
+        db_connection.rollback()
+        raise
+
+
+def file_sha256(xlsx_file: Union[str, bytes]) -> str:
+    """
+    Hash an assignment sheet given as path or as its content
+    """
+    if isinstance(xlsx_file, bytes):
+        return hashlib.sha256(xlsx_file).hexdigest()
+    digest = hashlib.sha256()
+    with open(xlsx_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def excel_to_sqlite(xlsx_file: Union[str, IO[bytes]], db_connection, is_blank: bool = False,
+                    table_name: Optional[str] = None, source_hash: Optional[str] = None) -> bool:
+    """
+    Import an ILIAS assignment sheet, given as path or in-memory buffer, into the table 'table_name'
+    (by default the name of the file, which a buffer doesn't have)
+    """
+    if not table_name:
+        if not isinstance(xlsx_file, str):
+            raise ValueError("A table name is required to import an assignment sheet from a buffer.")
         table_name = os.path.splitext(os.path.basename(xlsx_file))[0]
-        if is_blank:
-            # If new tables are added, drop new blank table if identically named one already exists
-            try:
-                df.to_sql(table_name, db_connection, if_exists='fail')
-            except ValueError:
-                pass
-        else:
-            df.to_sql(table_name, db_connection, if_exists='replace')
+    rows = iter_xlsx_rows(xlsx_file)
+    try:
+        write_assignment_table(db_connection, table_name, rows, is_blank, source_hash)
     except FileNotFoundError:
         print(f"Could not find {xlsx_file}")
         return False
@@ -46,125 +137,10 @@ def excel_to_sqlite(xlsx_file: str, db_connection, is_blank: bool = False) -> bo
         print(f"Error importing Excel to SQLite: {str(e)}")
         return False
     finally:
-        return True
+        rows.close()
+    return True
 
 
-def translate_df_columns_to_english(df: pd.DataFrame) -> pd.DataFrame:
-    if 'Vorname' in df.columns:
-        return df.rename(mapper=_GERMAN_LANGUAGE_CONSTANTS, axis=1)
-    else:
-        return df
-
-
-def read_config(config: str) -> dict[str, list[str]]:
-    assignments = {"nums": [], "files": [], "tasks": []}#, "ass_xl": []}
-    with open(config, 'r') as f:
-        lines = f.read().split('\n')
-        for line in lines:
-            if line.startswith('number='):
-                num = int(line.replace('number=', ''))
-                assignments['nums'].append(num)
-            elif line.startswith('filepath='):
-                assignments["files"].append(line.replace('filepath=', ''))
-            elif line.startswith('max_points='):
-                assignments["tasks"].append(ast.literal_eval(line.replace('max_points=', '')))
-            # elif line.startswith('assignment_xlsx='):
-            #     assignments["ass_xl"].append(line.replace('assignment_xlsx=', ''))
-    if len(assignments["nums"]) != len(assignments["files"]) != len(assignments["tasks"]):
-        raise IOError("Configuration must contain equal number of assignment numbers, filepaths, and max_points.")
-    return assignments
-
-
-def test_no_of_elements(lines: list[str], max_num: int) -> None:
-    for i, line in enumerate(lines):
-        if line:
-            opened = False
-            element_count = 0
-            for c in line:
-                if (not opened) and (c == '\"'):
-                    opened = True
-                elif opened and (c == '\"'):
-                    opened = False
-                elif (c == ',') and (not opened):
-                    element_count += 1
-            if element_count != max_num:
-                print(line.split(','))
-                raise Exception(f"Error! Found {element_count}, not the expected {max_num}, number of elements in line "
-                                f"{i + 1} in your grading file.")
-
-
-def upload_to_ilias(feedback_dir) -> None:
-    print("Now the browser should open. Please log in to ILIAS and navigate to the course page.")
-    driver = webdriver.Chrome()
-    wait = WebDriverWait(driver, 20)
-
-    driver.get("https://ovidius.uni-tuebingen.de/")
-    print("Navigate to the Hands-in page and select the corresponding assignment.")
-
-    # While waiting for the user
-    per_team_feedbacks = {}
-    for file in os.listdir(feedback_dir):
-        team_number = file.split('_')[0]
-        per_team_feedbacks[team_number] = os.path.join(os.path.abspath(feedback_dir), file)
-
-    input("Press Enter when you are ready to upload feedbacks...")
-    with Progress(TextColumn("[green]Uploading feedbacks..."),
-                BarColumn(),
-                MofNCompleteColumn()) as progress:
-        task = progress.add_task("[green]Uploading feedbacks...", total=len(per_team_feedbacks))
-        
-        # Record the current URL for the RETURN functionality
-        teams_view_url = urlparse(driver.current_url)
-        teams_view_window = driver.current_window_handle
-        table = wait.until(EC.presence_of_element_located((By.CLASS_NAME, "table-responsive")))
-        rows = table.find_elements(By.TAG_NAME, "tr")
-
-        for team, feedback_file in per_team_feedbacks.items():
-            for row in rows[1:]:
-                # Find team name in small div with parentheses
-                try:
-                    small_div = row.find_element(By.CLASS_NAME, "small")
-                    team_name_text = small_div.text
-                    team_number = re.search(r'\((\d+)\)', team_name_text)
-
-                    # In SSBI, only team submissions are accepted
-                    if team_number:
-                        team_number = team_number.group(1)
-                        if team != team_number: continue
-
-                        try:
-                            button = row.find_element(By.XPATH, f".//button[normalize-space(text())='Evaluation by File']")
-                        except NoSuchElementException:
-                            button = row.find_element(By.XPATH, f".//button[normalize-space(text())='{_GERMAN_LANGUAGE_CONSTANTS['Evaluation by File']}']")
-
-                        # open a new tab for uploading
-                        upload_page_data_action = urlparse(button.get_attribute('data-action'))
-                        upload_url = teams_view_url._replace(query=upload_page_data_action.query).geturl()
-                        driver.switch_to.new_window('tab')
-                        driver.get(upload_url)
-                        for window_handle in driver.window_handles:
-                            if window_handle != teams_view_window:
-                                driver.switch_to.window(window_handle)
-                                break
-                        wait.until(EC.presence_of_element_located((By.ID, "new_file")))
-
-                        # Upload feedback file
-                        file_input = driver.find_element(By.ID, "new_file")
-                        file_input.send_keys(feedback_file)
-                        upload_button = driver.find_element(By.XPATH, "//input[@type='submit' and @name='cmd[uploadFile]']")
-                        upload_button.click()
-                        time.sleep(1)
-                        wait.until(EC.presence_of_element_located((By.XPATH, "//div[contains(@class, 'alert-success')] | //table[contains(@class, 'table-striped')]//a")))
-
-                        # Return
-                        driver.close()
-                        driver.switch_to.window(teams_view_window)
-                        wait.until(EC.presence_of_element_located((By.CLASS_NAME, "table-responsive")))
-
-                        print(f"Successfully uploaded feedback for team {team}...", end='')
-                        progress.advance(task)
-                        print("progressing")
-                        break
-
-                except Exception as e:
-                    print(f"Error processing {team}: {str(e)}")
+def format_points(points) -> str:
+    points = float(points)
+    return str(int(points)) if points.is_integer() else str(points)
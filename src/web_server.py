@@ -1,12 +1,10 @@
+import io
 import os
-import re
-import json
-import shutil
 import base64
 import secrets
 import sqlite3
-import zipfile
-import pandas as pd
+import tempfile
+import time
 
 import dash
 import dash_bootstrap_components as dbc
@@ -14,21 +12,38 @@ from dash import (ALL, MATCH, Dash, Input, Output, Patch, State, ctx, dcc,
                   html, set_props)
 from flask import Flask, current_app, g
 
-from src.utils import read_config, excel_to_sqlite
+from src.autocomplete import CommentIndex
+from src.changeset import export_changeset, import_changeset
+from src.config import LectureConfig
+from src.database import (ConnectionPool, get_assignment_grades, get_assignment_summary, get_deduction_counts,
+                          get_team_grades, get_team_grading, get_team_members, get_top_comments, init_db,
+                          list_assignments, merge_database, query_team_order, query_team_page, save_task_changes,
+                          table_exists, team_key)
+from src.feedback import build_feedback_archive, cached_feedback
+from src.gradebook import export_gradebook
+from src.prefetch import GradingViewCache
+from src.scoring import score_deduction_counts, score_grades
+from src.utils import excel_to_sqlite, file_sha256, format_points
+
+
+# Number of teams (or individual submissions) shown per page of the submission table
+_PAGE_SIZE = 25
 
 
 def get_db():
     if 'db' not in g:
-        g.db = sqlite3.connect(
-            current_app.config['DATABASE'],
-            detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        g.db.row_factory = sqlite3.Row
+        g.db = current_app.extensions['db_pool'].acquire()
 
     return g.db
 
 
-def create_app(lecture_marker, output_dir, config):
+def close_db(e=None):
+    db = g.pop('db', None)
+    if db is not None:
+        current_app.extensions['db_pool'].release(db)
+
+
+def create_app(lecture_marker, output_dir, config, pool_size=8, metrics=None, expose_metrics=True):
     app = Flask(lecture_marker, instance_relative_config=True)
     app.config.from_mapping(
         DATABASE=os.path.join(output_dir, f'{lecture_marker}.sqlite3'),
@@ -37,6 +52,17 @@ def create_app(lecture_marker, output_dir, config):
     )
     print(os.path.abspath(app.config['DATABASE']))
     print(f"Database path: {app.config['DATABASE']}")
+    lecture_config = LectureConfig(config)
+    # With metrics, every statement run on a connection from get_db() is timed
+    app.extensions['db_pool'] = ConnectionPool(app.config['DATABASE'], size=pool_size,
+                                               factory=metrics.connection_factory() if metrics else sqlite3.Connection)
+    app.teardown_appcontext(close_db)
+    # Comments given so far, suggested while typing a comment and kept up to date by every save
+    comment_index = CommentIndex()
+    app.extensions['comment_index'] = comment_index
+    with app.app_context():
+        init_db(get_db())
+        comment_index.build(get_db())
 
     dash_app = Dash(lecture_marker, server=app,
         external_scripts=[{
@@ -55,11 +81,21 @@ def create_app(lecture_marker, output_dir, config):
             'rel': 'stylesheet'
         }],
         suppress_callback_exceptions=True)
+    if metrics is not None:
+        metrics.instrument(app, dash_app, expose=expose_metrics)
 
     dash_app.layout = dbc.Container([
         dcc.ConfirmDialog(id='confirm-overwrite'),
         dcc.Download(id="downloader"),
+        dcc.Download(id="changeset-downloader"),
+        dcc.Download(id="gradebook-downloader"),
+        dcc.Store(id='task-max-points'),
+        # Gradings and task versions the open grading view is based on, saves only send what changed since
+        dcc.Store(id='grading-base'),
+        dcc.Store(id='grading-order'),
+        dcc.Store(id='last-export', storage_type='local'),
         dbc.Modal(id="modal-view", size="lg", is_open=False, backdrop="static", centered=True),
+        dbc.Modal(id="modal-stats", size="xl", is_open=False, centered=True, scrollable=True),
         dbc.Toast("", id="toast-save", header="Info", is_open=False, duration=3000,
                   style={"position": "fixed", "top": 66, "right": 10, "width": 350, "zIndex": 9999}),
         dbc.Row([
@@ -77,9 +113,22 @@ def create_app(lecture_marker, output_dir, config):
                             html.Button('Merge Gradings', className="btn btn-primary"),
                             id='upload-db',style={'textAlign': 'center'}
                         ), width='auto'),
+                    dbc.Col(
+                        dbc.Select(id='merge-policy', value='theirs', options=[
+                            {'label': 'Merge: take theirs', 'value': 'theirs'},
+                            {'label': 'Merge: keep mine', 'value': 'mine'},
+                            {'label': 'Merge: newest wins', 'value': 'newest'}]),
+                        width='auto'),
                 ], className='justify-content-start'),
             width=6),
-            dbc.Col(dbc.Button("Generate Feedbacks", id='generate', className="btn btn-primary", style={'width': '33%'}), width=6, className='d-flex justify-content-end'),
+            dbc.Col([
+                dbc.Select(id='export-scope', value='since-last', options=[
+                    {'label': 'Changes since last export', 'value': 'since-last'},
+                    {'label': 'All gradings', 'value': 'all'}], className='w-auto me-2'),
+                dbc.Button("Export Changes", id='export-changes', className="btn btn-secondary me-2"),
+                dbc.Button("Export Gradebook", id='export-gradebook', className="btn btn-secondary me-2"),
+                dbc.Button("Generate Feedbacks", id='generate', className="btn btn-primary", style={'width': '33%'}),
+            ], width=6, className='d-flex justify-content-end'),
             dbc.Col(html.Hr(), width=12)
         ], className='mt-3 gy-3 justify-content-between'),
         dbc.Row([
@@ -90,90 +139,180 @@ def create_app(lecture_marker, output_dir, config):
                     options=[],
                 ),
             ], className='col-2'),
+            dbc.Col(dbc.Button("Statistics", id='open-stats', className="btn btn-secondary"), width='auto'),
         ], className='mt-3 mb-2 align-items-center'),
+        dbc.Row([
+            dbc.Col(dbc.Input(id='filter-team', placeholder='Filter by team', debounce=400), width=2),
+            dbc.Col(dbc.Input(id='filter-name', placeholder='Filter by student name', debounce=400), width=3),
+            dbc.Col(dbc.Select(id='filter-status', value='all', options=[
+                {'label': 'All teams', 'value': 'all'},
+                {'label': 'Graded', 'value': 'graded'},
+                {'label': 'Ungraded', 'value': 'ungraded'}]), width=2),
+            dbc.Col(dbc.Select(id='sort-teams', value='team', options=[
+                {'label': 'Sort by team', 'value': 'team'},
+                {'label': 'Sort by name', 'value': 'name'},
+                {'label': 'Ungraded first', 'value': 'ungraded'}]), width=2),
+        ], className='mb-2 g-2'),
+        dcc.Store(id='submission-refresh'),
         dbc.Row([
             dbc.Col([], id='submission-list', className='mx-auto'),
-        ])
+        ]),
+        dbc.Row([
+            dbc.Col(dbc.Pagination(id='submission-pagination', max_value=1, active_page=1, fully_expanded=False), width='auto'),
+        ], className='justify-content-center'),
     ], id='main-content', fluid='xl')
 
     @dash_app.callback(Output('assignment-select', 'options'),
             Input('main-content', 'className'))
     def get_assignments(yes):
-        with app.app_context():
-            db = get_db()
+        db = get_db()
         # Get assignment names from the database
-        cursor = db.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = cursor.fetchall()
-        assignment_list = [table['name'] for table in tables]
+        assignment_list = list_assignments(db)
         return [{"label": assignment, "value": assignment} for assignment in assignment_list]
 
     @dash_app.callback(Output('submission-list', 'children'),
+            Output('submission-pagination', 'max_value'),
+            Output('submission-pagination', 'active_page'),
             Input('assignment-select', 'value'),
+            Input('filter-team', 'value'),
+            Input('filter-name', 'value'),
+            Input('filter-status', 'value'),
+            Input('sort-teams', 'value'),
+            Input('submission-pagination', 'active_page'),
+            Input('submission-refresh', 'data'),
             prevent_initial_call=True)
-    def get_submission_list(assignment):
-        with app.app_context():
-            conn = get_db()
-        df = pd.read_sql_query(f"SELECT * FROM [{assignment}]", conn)
-
-        assignment_match = re.search(r'\d+$', assignment)
-        assignment_id = int(assignment_match.group()) if assignment_match else None
-        per_task_scores = read_config(app.config['LECTURE_CONFIG'])['tasks'][assignment_id-1]
-
+    def get_submission_list(assignment, team_filter, name_filter, status, sort, page, refresh):
+        """
+        Render one page of the submission table, filtering, sorting and paging is done in SQL
+        """
+        if not assignment:
+            raise dash.exceptions.PreventUpdate
+        conn = get_db()
+        spec = lecture_config.for_table(assignment)
+        if spec is None:
+            return dbc.Alert(f"No task specification found for {assignment} in the lecture config.", color='danger'), 1, 1
+        # Changing the assignment or any of the filters starts over at the first page, a refresh keeps the page
+        if ctx.triggered_id not in ('submission-pagination', 'submission-refresh') or not page:
+            page = 1
+
+        columns = [row['name'] for row in conn.execute(f"PRAGMA table_info([{assignment}])")]
         # Check if 'Team' column exists
-        if 'Team' in df.columns:
-            # Group by Teams
-            grouped_dfs = []
-            for team, group in df.groupby('Team'):
-                addViewButton = 0
-                for index, row in group.iterrows():
-                    try: feedbacks = json.loads(row['Grade'])
-                    except: feedbacks = {}
-
-                    # names and teams
-                    row_dict = {
-                        "Graded": html.I(className="fa-solid fa-circle-info" if not feedbacks else "fa-solid fa-check", id=f"graded_{team}") if addViewButton == 0 else "",
-                        "First Name": row['First Name'],
-                        "Last Name": row['Last Name'],
-                        "Team": team,
-                    }
-                    # per task scores
-                    for task, max_points in per_task_scores.items():
-                        remaining_points = int(max_points)
-                        if task not in feedbacks.keys():
-                            row_dict[f"Task {task}"] = max_points
-                        else:
-                            for penalty, comment in feedbacks[task]:
-                                if penalty is None:
-                                    if comment is None: continue
-                                    else: penalty = 0
-                                if penalty >= 0: penalty = -penalty
-                                remaining_points += penalty
-                            if remaining_points < 0: remaining_points = 0
-                            row_dict[f"Task {task}"] = remaining_points
-                    row_dict[""] = dbc.Button("View", id={'type': 'view-button', 'index': team}, className="btn btn-primary") if addViewButton == 0 else ""
-                    grouped_dfs.append(row_dict)
-                    addViewButton += 1
-            df_new = pd.DataFrame(grouped_dfs)
-            return dbc.Table.from_dataframe(df_new, striped=True, bordered=False, hover=True)
+        if 'Team' in columns:
+            total, teams = query_team_page(conn, assignment, team_filter, name_filter, status, sort, page, _PAGE_SIZE)
+            if not teams and page > 1:
+                page = 1
+                total, teams = query_team_page(conn, assignment, team_filter, name_filter, status, sort, page, _PAGE_SIZE)
+            members = get_team_members(conn, assignment, [team for team, _ in teams])
+            grades = get_assignment_grades(conn, assignment, [team for team, _ in teams])
+
+            scores = score_grades(grades, spec, [team_key(team) for team, _ in teams])
+
+            header = ["Graded", "First Name", "Last Name", "Team"] + [f"Task {task}" for task in spec.tasks] + [""]
+            rows = []
+            for (team, graded), team_points in zip(teams, scores.points):
+                # per task scores
+                task_scores = [format_points(points) for points in team_points]
+                # names and teams, only the first member's row carries the status and the button
+                for i, (first_name, last_name) in enumerate(members.get(team_key(team), [])):
+                    rows.append(html.Tr([
+                        html.Td(html.I(className="fa-solid fa-check" if graded else "fa-solid fa-circle-info", id=f"graded_{team}") if i == 0 else ""),
+                        html.Td(first_name),
+                        html.Td(last_name),
+                        html.Td(team),
+                    ] + [html.Td(score) for score in task_scores] + [
+                        html.Td(dbc.Button("View", id={'type': 'view-button', 'index': team}, className="btn btn-primary") if i == 0 else "")
+                    ]))
         # logic for individual submissions haven't been implemented yet
         else:
-            submission_cols = [col for col in df.columns if col.startswith('Submission')]
-            if submission_cols:
-                df = df.drop(columns=submission_cols)
-            new_data = []
-            for index, row in df.iterrows():
-                row_dict = row.to_dict()
-                row_dict[""] = dbc.Button("View", id={'type': 'view-button', 'index': f"{row['Last Name']},{row['First Name']}"}, className="btn btn-primary")
-                new_data.append(row_dict)
-            return dbc.Table.from_dataframe(pd.DataFrame(new_data), striped=True, bordered=False, hover=True)
+            columns = [col for col in columns if not col.startswith('Submission')]
+            condition, params = '', []
+            if name_filter:
+                condition = "WHERE [First Name] || ' ' || [Last Name] LIKE ?"
+                params.append(f"%{name_filter}%")
+            total = conn.execute(f"SELECT COUNT(*) FROM [{assignment}] {condition}", params).fetchone()[0]
+            header = columns + [""]
+            rows = []
+            for row in conn.execute(f"SELECT * FROM [{assignment}] {condition} ORDER BY rowid LIMIT ? OFFSET ?",
+                                    params + [_PAGE_SIZE, (page - 1) * _PAGE_SIZE]):
+                rows.append(html.Tr([html.Td(row[col]) for col in columns] + [html.Td(
+                    dbc.Button("View", id={'type': 'view-button', 'index': f"{row['Last Name']},{row['First Name']}"}, className="btn btn-primary"))]))
+
+        table = dbc.Table([html.Thead(html.Tr([html.Th(col) for col in header])), html.Tbody(rows)],
+                          striped=True, bordered=False, hover=True)
+        return table, max(1, -(-total // _PAGE_SIZE)), page
+
+    @dash_app.callback(Output('modal-stats', 'is_open'),
+            Output('modal-stats', 'children'),
+            Input('open-stats', 'n_clicks'),
+            State('assignment-select', 'value'),
+            prevent_initial_call=True)
+    def open_statistics(yes, assignment):
+        """
+        Show the grade distribution and the most frequent comments of an assignment, read from the summary tables
+        the database keeps up to date with every saved grading, so opening them costs the same for any number of teams
+        """
+        if not assignment:
+            set_props('toast-save', {'is_open': True})
+            set_props('toast-save', {'children': "You need to select an assignment!"})
+            raise dash.exceptions.PreventUpdate
+        spec = lecture_config.for_table(assignment)
+        if spec is None:
+            return True, dbc.ModalBody(dbc.Alert(f"No task specification found for {assignment} in the lecture config.",
+                                                 color='danger'))
+        conn = get_db()
+        teams, graded = get_assignment_summary(conn, assignment)
+        statistics = score_deduction_counts(get_deduction_counts(conn, assignment), spec, graded)
+
+        task_rows = []
+        for task in statistics:
+            labels = [f"{format_points(low)}–{format_points(high)}" for low, high in zip(task.edges, task.edges[1:])]
+            figure = {'data': [{'type': 'bar', 'x': labels, 'y': task.histogram.tolist(), 'marker': {'color': '#0d6efd'}}],
+                      'layout': {'height': 140, 'margin': {'l': 30, 'r': 10, 't': 10, 'b': 30},
+                                 'xaxis': {'type': 'category'}, 'yaxis': {'rangemode': 'tozero'}}}
+            task_rows.append(html.Tr([
+                html.Td(f"Task {task.task}"),
+                html.Td(format_points(task.max_points)),
+                html.Td(format_points(round(task.mean, 2)) if graded else "–"),
+                html.Td(format_points(task.median) if graded else "–"),
+                html.Td(dcc.Graph(figure=figure, config={'displayModeBar': False}), style={'width': '50%'}),
+            ]))
+        mean_total = sum(task.mean for task in statistics) if graded else None
+        comment_rows = [html.Tr([html.Td(f"Task {task}"), html.Td(comment), html.Td(uses),
+                                 html.Td(format_points(-deduction) if deduction else "")])
+                        for task, comment, uses, deduction in get_top_comments(conn, assignment)]
+
+        children = [
+            dbc.ModalHeader(dbc.ModalTitle(f"Statistics of {assignment}")),
+            dbc.ModalBody([
+                html.P([html.Span(f"Graded {graded} of {teams} team(s)", className='h5 me-4'),
+                        html.Span(f"Mean total: {format_points(round(mean_total, 2))} of "
+                                  f"{format_points(spec.total_points)}" if mean_total is not None else "")]),
+                dbc.Progress(value=100 * graded / teams if teams else 0, className='mb-4'),
+                dbc.Table([html.Thead(html.Tr([html.Th("Task"), html.Th("Max"), html.Th("Mean"), html.Th("Median"),
+                                               html.Th("Points reached (teams)")])),
+                           html.Tbody(task_rows)], bordered=False, hover=True, size='sm'),
+                html.H5("Most frequent comments", className='mt-4'),
+                dbc.Table([html.Thead(html.Tr([html.Th("Task"), html.Th("Comment"), html.Th("Uses"),
+                                               html.Th("Total Penalty")])),
+                           html.Tbody(comment_rows)], striped=True, bordered=False, size='sm')
+                if comment_rows else html.P("No comments given yet."),
+            ]),
+        ]
+        return True, children
 
     @dash_app.callback(Output('modal-view', 'is_open'),
             Output('modal-view', 'children'),
+            Output('task-max-points', 'data'),
+            Output('grading-base', 'data'),
+            Output('grading-order', 'data'),
             Input({'type': 'view-button', 'index': ALL}, 'n_clicks'),
             State('assignment-select', 'value'),
+            State('filter-team', 'value'),
+            State('filter-name', 'value'),
+            State('filter-status', 'value'),
+            State('sort-teams', 'value'),
             prevent_initial_call=True)
-    def open_grading_modal(yes, assignment):
+    def open_grading_modal(yes, assignment, team_filter, name_filter, status, sort):
         for y in yes:
             if y is not None:
                 break
@@ -181,34 +320,64 @@ def create_app(lecture_marker, output_dir, config):
             raise dash.exceptions.PreventUpdate
         triggered = ctx.triggered_id
         team = triggered['index']
-        return True, get_grading_view(team, assignment)
-
-    def get_grading_view(team, assignment):
-        # Extract assignment number from the assignment name
-        assignment_match = re.search(r'\d+$', assignment)
-        assignment_num = int(assignment_match.group()) if assignment_match else None
-
-        with app.app_context():
-            conn = get_db()
-        cursor = conn.cursor()
+        # The teams of the submission table in its current order, stepped through by 'Save & Next/Previous'
+        conn = get_db()
+        order = []
+        if 'Team' in [row['name'] for row in conn.execute(f"PRAGMA table_info([{assignment}])")]:
+            order = query_team_order(conn, assignment, team_filter, name_filter, status, sort or 'team')
+        # The task maxima travel along with the modal for the score computation in the browser
+        spec = lecture_config.for_table(assignment)
+        children, base = get_grading_view(team, assignment, order)
+        return True, children, spec.task_max_points() if spec else None, base, {'assignment': assignment,
+                                                                               'teams': order}
+
+    def load_grading_data(conn, assignment, team):
+        """
+        Everything the grading view of a team shows, the gradings and task versions are read in one statement
+        """
         try:
-            cursor.execute(f"SELECT [First Name], [Last Name], [Grade] FROM [{assignment}] WHERE Team = ?", (team,))
-            students = cursor.fetchall()
-            student_names = [f"{student['First Name']} {student['Last Name']}" for student in students]
+            student_names = [f"{first_name} {last_name}" for first_name, last_name in
+                             get_team_members(conn, assignment, [team]).get(team_key(team), [])]
         except sqlite3.Error as e:
             student_names = [f"Error loading students: {str(e)}"]
-
+        spec = lecture_config.for_table(assignment)
+        grades, versions = get_team_grading(conn, assignment, team)
+        preview = cached_feedback(conn, assignment, team, student_names, grades, spec) if spec else None
+        return {'spec': spec, 'student_names': student_names, 'grades': grades, 'versions': versions,
+                'preview': preview}
+
+    # The teams next to the one being graded are loaded in the background, so stepping to them needs no queries
+    grading_cache = GradingViewCache(app.extensions['db_pool'], load_grading_data)
+    app.extensions['grading_cache'] = grading_cache
+
+    def get_grading_view(team, assignment, order=()):
+        conn = get_db()
         # Get scores from config files
-        per_task_scores = read_config(app.config['LECTURE_CONFIG'])['tasks'][assignment_num-1]
-        try: grades = json.loads(students[0]['Grade'])
-        except: grades = {}
+        spec = lecture_config.for_table(assignment)
+        if spec is None:
+            return dbc.ModalBody(dbc.Alert(f"No task specification found for {assignment} in the lecture config.", color='danger')), None
+        data = grading_cache.get(conn, assignment, team)
+        if data is None or data['spec'] != spec:
+            data = load_grading_data(conn, assignment, team)
+            grading_cache.put(assignment, team, data)
+        student_names, grades, versions, preview = (data['student_names'], data['grades'], data['versions'],
+                                                    data['preview'])
+        position = order.index(team_key(team)) if team_key(team) in order else None
+        if position is not None:
+            grading_cache.prefetch(assignment, order[max(position - 1, 0):position + 2])
+        task_points = score_grades({team: grades}, spec).points[0]
         children = [
-            dbc.ModalHeader([dbc.ModalTitle("Grading View for Team "), dbc.ModalTitle(team, id='team-name', className='ms-2')]),
+            dbc.ModalHeader([dbc.ModalTitle("Grading View for Team "), dbc.ModalTitle(team, id='team-name', className='ms-2'),
+                             html.Small(f"({position + 1} of {len(order)})" if position is not None else "",
+                                        className='ms-3 text-muted')]),
             dbc.ModalBody(dbc.Container([
                 dbc.Row([
                     dbc.Col(html.H5("Student Name: " + ", ".join(student_names)), className='col-auto'),
-                    dbc.Col(dbc.Button("Save", id='save-button', className='btn btn-primary'), className='col-auto')
-                ], className='d-flex justify-content-between align-items-center mb-5'),
+                    dbc.Col([dbc.Button("Preview", id='preview-button', className='btn btn-secondary me-2'),
+                             dbc.Button("Save", id='save-button', className='btn btn-primary')], className='col-auto')
+                ], className='d-flex justify-content-between align-items-center mb-3'),
+                dbc.Collapse(dbc.Card(dbc.CardBody(dcc.Markdown(preview, id='feedback-preview'))),
+                             id='preview-collapse', is_open=False, className='mb-5'),
             # task rows
             ] + [dbc.Row([
                     # task title and the button
@@ -217,7 +386,7 @@ def create_app(lecture_marker, output_dir, config):
                                         # update n_clicks to match the comment saving state
                                         n_clicks=0 if len(grades) == 0 or not grades.get(task, False) else len(grades.get(task))
                                     ), className='mx-auto col-3'),
-                    dbc.Col([html.Span(score, id={'type': 'per-task-total-score', 'index': task}), html.Span(f"/{score} points reached")], className='mx-auto col-6 align-items-center justify-content-end d-flex'),
+                    dbc.Col([html.Span(format_points(points), id={'type': 'per-task-total-score', 'index': task}), html.Span(f"/{format_points(score)} points reached")], className='mx-auto col-6 align-items-center justify-content-end d-flex'),
 
                     # comments input boxes
                     html.Div(id={'type': 'comment-placeholder', 'index': task}) if len(grades) == 0 or not grades.get(task, False) else
@@ -227,10 +396,25 @@ def create_app(lecture_marker, output_dir, config):
                             ], id={'type': 'comment-placeholder', 'index': task}),
                     # spacer
                     html.Hr(className='mt-3 mb-3'),
-                ]) for task, score in per_task_scores.items()]
-            ))
+                ]) for task, score, points in zip(spec.tasks, spec.max_points, task_points)]
+            )),
+            dbc.ModalFooter([
+                dbc.Button("Save & Previous", id='save-previous', className='btn btn-secondary',
+                           disabled=position is None or position == 0),
+                dbc.Button("Save & Next", id='save-next', className='btn btn-primary',
+                           disabled=position is None or position == len(order) - 1),
+            ], className='justify-content-between'),
         ]
-        return children
+        base = {'team': team_key(team), 'assignment': assignment, 'versions': versions,
+                'lines': {task: [list(line) for line in lines] for task, lines in grades.items()}}
+        return children, base
+
+    @dash_app.callback(Output('preview-collapse', 'is_open'),
+            Input('preview-button', 'n_clicks'),
+            State('preview-collapse', 'is_open'),
+            prevent_initial_call=True)
+    def toggle_feedback_preview(n_clicks, is_open):
+        return not is_open
 
     @dash_app.callback(Output({'type': 'comment-placeholder', 'index': MATCH}, 'children'),
             Input({'type': 'add-comment', 'index': MATCH}, 'n_clicks'),
@@ -253,9 +437,44 @@ def create_app(lecture_marker, output_dir, config):
         return dbc.Row([
             dbc.Col(dbc.Button("❌", color='warning', id={'type': 'remove-comment', 'index': index}), width=1, className='mt-1'),
             dbc.Col(dbc.Input(type='number', placeholder='Penalty', id={'type': 'penalty-input', 'index': index}, value=penalty), width=3, className='mt-1'),
-            dbc.Col(dbc.Textarea(placeholder='Comment', id={'type': 'comment-input', 'index': index}, value=comment), width=8, className='mt-1'),
+            dbc.Col(dbc.Textarea(placeholder='Comment', id={'type': 'comment-input', 'index': index}, value=comment, debounce=400), width=8, className='mt-1'),
+            dbc.Col([dcc.Store(id={'type': 'comment-suggestion-data', 'index': index}),
+                     dbc.ListGroup([], id={'type': 'comment-suggestions', 'index': index}, className='small')],
+                    width={'size': 8, 'offset': 4}),
         ], id={'type': 'comment-row', 'index': index}, className='align-items-center')
 
+    @dash_app.callback(Output({'type': 'comment-suggestions', 'index': MATCH}, 'children'),
+            Output({'type': 'comment-suggestion-data', 'index': MATCH}, 'data'),
+            Output({'type': 'comment-input', 'index': MATCH}, 'value'),
+            Output({'type': 'penalty-input', 'index': MATCH}, 'value'),
+            Input({'type': 'comment-input', 'index': MATCH}, 'value'),
+            Input({'type': 'comment-suggestion', 'index': MATCH, 'rank': ALL}, 'n_clicks'),
+            State({'type': 'comment-suggestion-data', 'index': MATCH}, 'data'),
+            prevent_initial_call=True)
+    def suggest_comments(comment, clicks, suggestions):
+        """
+        Suggest comments given before while a comment is typed, picking one fills in the comment and its usual penalty
+        """
+        triggered = ctx.triggered_id
+        if isinstance(triggered, dict) and triggered.get('type') == 'comment-suggestion':
+            if not suggestions or not any(clicks) or triggered['rank'] >= len(suggestions):
+                raise dash.exceptions.PreventUpdate
+            chosen, penalty = suggestions[triggered['rank']]
+            return [], None, chosen, dash.no_update if penalty is None else penalty
+        index = triggered['index']
+        # Nothing to suggest for a comment that is one of the suggestions already
+        found = [suggestion for suggestion in comment_index.suggest(comment or '')
+                 if suggestion.comment != (comment or '').strip()]
+        if len(comment or '') < 2 or not found:
+            return [], None, dash.no_update, dash.no_update
+        items = [dbc.ListGroupItem([html.Span(format_points(suggestion.penalty) if suggestion.penalty is not None
+                                              else "–", className='badge bg-secondary me-2'),
+                                    suggestion.comment, html.Span(f"{suggestion.uses}×", className='text-muted ms-2')],
+                                   id={'type': 'comment-suggestion', 'index': index, 'rank': rank}, action=True,
+                                   className='py-1')
+                 for rank, suggestion in enumerate(found)]
+        return items, [[suggestion.comment, suggestion.penalty] for suggestion in found], dash.no_update, dash.no_update
+
     @dash_app.callback(Output({'type': 'comment-row', 'index': MATCH}, 'children'),
             Input({'type': 'remove-comment', 'index': MATCH}, 'n_clicks'),
             prevent_initial_call=True)
@@ -264,14 +483,11 @@ def create_app(lecture_marker, output_dir, config):
             raise dash.exceptions.PreventUpdate
         return None
 
-    @dash_app.callback(Input('save-button', 'n_clicks'),
-            State({'type': 'penalty-input', 'index': ALL}, 'value'),
-            State({'type': 'comment-input', 'index': ALL}, 'value'),
-            State({'type': 'comment-input', 'index': ALL}, 'id'),
-            State('team-name', 'children'),
-            State('assignment-select', 'value'),
-            prevent_initial_call=True)
-    def save_gradings(save, penalties, comments, tasks, team_name, assignment):
+    def save_grading_view(assignment, team_name, penalties, comments, tasks, base, navigating=False):
+        """
+        Save the tasks changed in the grading view and report the outcome in the toast, returns the tasks that
+        were not saved because of a conflicting save and the grading base advanced by the saved tasks
+        """
         feedbacks = {}
         for task, penalty, comment in zip(tasks, penalties, comments):
             if not task: continue
@@ -279,71 +495,128 @@ def create_app(lecture_marker, output_dir, config):
             task = task_id.split('_')[0]
             if task not in feedbacks:
                 feedbacks[task] = []
-            feedbacks[task].append((penalty, comment))
-
-        # Save the feedbacks to the database
-        with app.app_context():
-            conn = get_db()
-        cursor = conn.cursor()
-
-        # Before saving, check if the feedbacks already exist (for multiple tutor grading at the same time)
-        # This way we can only add new comments but not overwrite the existing ones
-        # existing_feedbacks = cursor.execute(f"SELECT Grade FROM [{assignment}] WHERE Team = ?", (team_name,)).fetchone()
-        # if existing_feedbacks:
-        #     existing_feedbacks = json.loads(existing_feedbacks['Grade'])
-        #     existing_tasks = set(existing_feedbacks.keys())
-        #     my_tasks = set(feedbacks.keys())
-        #     # one tutor only responsible for their own tasks
-        #     for task in existing_tasks - my_tasks:
-        #         feedbacks[task] = existing_feedbacks[task]
-        feedbacks_json = json.dumps(feedbacks)
-        cursor.execute(f"UPDATE [{assignment}] SET Grade = ? WHERE Team = ?",
-                        (feedbacks_json, team_name))
+            feedbacks[task].append([penalty, comment])
+
+        if not base or base['team'] != team_key(team_name) or base['assignment'] != assignment:
+            base = {'team': team_key(team_name), 'assignment': assignment, 'versions': {}, 'lines': {}}
+        # Only the tasks changed in the grading view are saved, each one only if nobody else saved it in the meantime
+        changes = {task: (base['versions'].get(task, 0), [tuple(line) for line in feedbacks.get(task, [])])
+                   for task in set(feedbacks) | set(base['lines'])
+                   if feedbacks.get(task, []) != base['lines'].get(task, [])}
+        if not changes:
+            if not navigating:
+                set_props('toast-save', {'is_open': True})
+                set_props('toast-save', {'children': "No changes to save."})
+            return [], base
+
+        conn = get_db()
+        saved, conflicts = save_task_changes(conn, assignment, team_name, changes)
         conn.commit()
-        conn.close()
+        for task, version in saved.items():
+            comment_index.remove(base['lines'].get(task, []))
+            comment_index.add(feedbacks.get(task, []))
+            base['versions'][task] = version
+            base['lines'][task] = feedbacks.get(task, [])
+        spec = lecture_config.for_table(assignment)
+        # When moving on to another team, its grading view replaces the current one anyway. A conflict keeps the
+        # current team open, the caller then hands on the advanced base.
+        if not navigating or conflicts:
+            if not navigating:
+                set_props('grading-base', {'data': base})
+            if spec is not None:
+                student_names = [f"{first_name} {last_name}" for first_name, last_name in
+                                 get_team_members(conn, assignment, [team_name]).get(team_key(team_name), [])]
+                set_props('feedback-preview', {'children': cached_feedback(conn, assignment, team_name, student_names,
+                                                                           get_team_grades(conn, assignment, team_name), spec)})
 
         set_props('toast-save', {'is_open': True})
-        set_props('toast-save',
-                  {'children': html.Span([html.I(className="fa-solid fa-square-check me-1",
-                                                 style={"color": "#63e6be"}), "Feedback saved successfully!"])})
-        set_props(f'graded_{team_name}', {'className': 'fa-solid fa-check'})
-
-    @dash_app.callback(Input('modal-view', 'is_open'),
-                       Input({'type': 'penalty-input', 'index': ALL}, 'value'),
-                       State({'type': 'comment-input', 'index': ALL}, 'id'),
-                       State('assignment-select', 'value'))
-    def update_score(ready_to_update, penalties, tasks, assignment):
+        if conflicts:
+            set_props('toast-save', {'children': html.Span([html.I(
+                className="fa-solid fa-triangle-exclamation me-1", style={"color": "#ffa94d"}),
+                f"Task(s) {', '.join(sorted(conflicts))} of team {team_name} were changed by someone else since you "
+                f"opened it and have not been saved. Copy your comments, then reopen the team to see the current "
+                f"grading." + (f" Saved task(s) {', '.join(sorted(saved))}." if saved else '')])})
+        else:
+            set_props('toast-save',
+                      {'children': html.Span([html.I(className="fa-solid fa-square-check me-1",
+                                                     style={"color": "#63e6be"}), "Feedback saved successfully!"])})
+        if saved:
+            # The team's row may be on another page or filtered out, the list is refreshed rather than its icon set
+            set_props('submission-refresh', {'data': time.time()})
+        return conflicts, base
+
+    @dash_app.callback(Input('save-button', 'n_clicks'),
+            State({'type': 'penalty-input', 'index': ALL}, 'value'),
+            State({'type': 'comment-input', 'index': ALL}, 'value'),
+            State({'type': 'comment-input', 'index': ALL}, 'id'),
+            State('team-name', 'children'),
+            State('assignment-select', 'value'),
+            State('grading-base', 'data'),
+            prevent_initial_call=True)
+    def save_gradings(save, penalties, comments, tasks, team_name, assignment, base):
+        save_grading_view(assignment, team_name, penalties, comments, tasks, base)
+
+    @dash_app.callback(Output('modal-view', 'children', allow_duplicate=True),
+            Output('task-max-points', 'data', allow_duplicate=True),
+            Output('grading-base', 'data', allow_duplicate=True),
+            Input('save-previous', 'n_clicks'),
+            Input('save-next', 'n_clicks'),
+            State({'type': 'penalty-input', 'index': ALL}, 'value'),
+            State({'type': 'comment-input', 'index': ALL}, 'value'),
+            State({'type': 'comment-input', 'index': ALL}, 'id'),
+            State('team-name', 'children'),
+            State('grading-base', 'data'),
+            State('grading-order', 'data'),
+            prevent_initial_call=True)
+    def navigate_teams(previous_clicks, next_clicks, penalties, comments, tasks, team_name, base, order):
         """
-        Update the scores in the grading view after changing the penalties
+        Save the grading view and move on to the previous or next team of the submission table
         """
-        if not ready_to_update:
+        if not order or not (previous_clicks or next_clicks):
             raise dash.exceptions.PreventUpdate
+        assignment = order['assignment']
+        conflicts, base = save_grading_view(assignment, team_name, penalties, comments, tasks, base, navigating=True)
+        if conflicts:
+            # Stay on the team, so that the comments of the conflicting tasks are not lost. The tasks just saved
+            # must be based on their new versions, or the next save reports them as conflicting.
+            return dash.no_update, dash.no_update, base
+        teams = order['teams']
+        position = teams.index(team_key(team_name)) if team_key(team_name) in teams else -1
+        position += -1 if ctx.triggered_id == 'save-previous' else 1
+        if position < 0 or position >= len(teams):
+            raise dash.exceptions.PreventUpdate
+        spec = lecture_config.for_table(assignment)
+        children, base = get_grading_view(teams[position], assignment, teams)
+        return children, spec.task_max_points() if spec else None, base
 
-        assignment_match = re.search(r'\d+$', assignment)
-        assignment_id = int(assignment_match.group()) if assignment_match else None
-        per_task_scores = read_config(app.config['LECTURE_CONFIG'])['tasks'][assignment_id - 1]
-
-        penalties_grouped = {}
-        for task, penalty in zip(tasks, penalties):
-            if not task: continue
-            task_id = task['index']
-            task = task_id.split('_')[0]
-            if task not in penalties_grouped:
-                penalties_grouped[task] = []
-            if type(penalty) in [int, float]:
-                penalties_grouped[task].append(penalty)
-        for task, penalty in penalties_grouped.items():
-            total_penalty = sum(penalties_grouped[task])
-            if total_penalty > 0:
-                total_penalty = -total_penalty
-            score = float(per_task_scores[task]) + total_penalty
-            if int(score) == float(score):
-                score = int(score)
-            if score < 0:
-                score = 0
-            if score > int(per_task_scores[task]):
-                score = int(per_task_scores[task])
-            set_props({'type': 'per-task-total-score', 'index': task}, {'children': str(score)})
+    # Recompute the points reached per task in the browser, so typing a penalty needs no round trip to the server
+    dash_app.clientside_callback(
+        """
+        function(isOpen, penalties, penaltyIds, scoreIds, maxPoints) {
+            if (!isOpen || !maxPoints) {
+                return window.dash_clientside.no_update;
+            }
+            const penaltySums = {};
+            penaltyIds.forEach((id, i) => {
+                const task = String(id.index).split('_')[0];
+                const penalty = penalties[i];
+                if (typeof penalty === 'number' && !isNaN(penalty)) {
+                    penaltySums[task] = (penaltySums[task] || 0) - Math.abs(penalty);
+                }
+            });
+            return scoreIds.map(id => {
+                const maxScore = maxPoints[id.index];
+                const score = Math.min(Math.max(maxScore + (penaltySums[id.index] || 0), 0), maxScore);
+                return String(Number(score.toFixed(10)));
+            });
+        }
+        """,
+        Output({'type': 'per-task-total-score', 'index': ALL}, 'children'),
+        Input('modal-view', 'is_open'),
+        Input({'type': 'penalty-input', 'index': ALL}, 'value'),
+        State({'type': 'penalty-input', 'index': ALL}, 'id'),
+        State({'type': 'per-task-total-score', 'index': ALL}, 'id'),
+        State('task-max-points', 'data'))
 
     @dash_app.callback(Input('upload-ass', 'contents'),
                        Input('upload-ass', 'filename'),
@@ -361,21 +634,14 @@ def create_app(lecture_marker, output_dir, config):
         else:
             content_type, content_string = content.split(',')
             decoded = base64.b64decode(content_string)
-            with open(xlsx_name, 'wb') as f:
-                f.write(decoded)
-            with app.app_context():
-                conn = get_db()
+            conn = get_db()
             table_name = os.path.splitext(os.path.basename(xlsx_name))[0]
 
-            cursor = conn.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
             # If table doesn't exist, create it
-            if not cursor.fetchone():
-                if excel_to_sqlite(xlsx_name, conn):
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-                    tables = cursor.fetchall()
-                    assignment_list = [table['name'] for table in tables]
+            if not table_exists(conn, table_name):
+                if excel_to_sqlite(io.BytesIO(decoded), conn, table_name=table_name,
+                                   source_hash=file_sha256(decoded)):
+                    assignment_list = list_assignments(conn)
                     set_props('toast-save', {'is_open': True})
                     set_props('toast-save', {'children': html.Span([html.I(
                         className="fa-solid fa-square-check me-1", style={"color": "#63e6be"}),
@@ -394,9 +660,6 @@ def create_app(lecture_marker, output_dir, config):
                                         "This is going to overwrite all your gradings. \n"+
                                         "Are you sure to proceed?"})
 
-            if os.path.exists(xlsx_name):
-                os.remove(xlsx_name)
-
     @dash_app.callback(Input('confirm-overwrite', 'submit_n_clicks'),
                        State('upload-ass', 'contents'),
                        State('upload-ass', 'filename'),
@@ -404,13 +667,14 @@ def create_app(lecture_marker, output_dir, config):
     def let_user_confirm_duplicate_action(proceed, content, xlsx_name):
         content_type, content_string = content.split(',')
         decoded = base64.b64decode(content_string)
-        with open(xlsx_name, 'wb') as f:
-            f.write(decoded)
 
-        with app.app_context():
-            conn = get_db()
+        conn = get_db()
         table_name = os.path.splitext(os.path.basename(xlsx_name))[0]
-        if excel_to_sqlite(xlsx_name, conn):
+        # Overwriting an assignment may change its teams and members, cached grading views are stale then
+        grading_cache.invalidate(table_name)
+        if excel_to_sqlite(io.BytesIO(decoded), conn, table_name=table_name,
+                           source_hash=file_sha256(decoded)):
+            comment_index.build(conn)
             set_props('toast-save', {'is_open': True})
             set_props('toast-save', {'children': html.Span([html.I(
                 className="fa-solid fa-square-check me-1", style={"color": "#63e6be"}),
@@ -421,88 +685,96 @@ def create_app(lecture_marker, output_dir, config):
                 className="fa-solid fa-square-xmark me-1", style={"color": "#ff3333"}),
                 f"Update failed! Please check the log."])})
 
-        if os.path.exists(xlsx_name):
-            os.remove(xlsx_name)
-
-
     @dash_app.callback(Input('upload-db', 'contents'),
                        Input('upload-db', 'filename'),
                        Input('upload-db', 'last_modified'),
-                       State('assignment-select', 'value'),
+                       State('merge-policy', 'value'),
                        prevent_initial_call=True)
-    def merge_grading_from_other_tutors(content, name, last_modified, assignment):
+    def merge_grading_from_other_tutors(content, name, last_modified, policy):
         """
-        Merge grading from other tutors into the current database
+        Merge grading from other tutors into the current database, for all assignments in the uploaded file.
+        Accepts either a whole database or a changeset exported by another tutor.
         """
         content_type, content_string = content.split(',')
         decoded = base64.b64decode(content_string)
-        name = name + 'new'
-        with open(name, 'wb') as f:
+        conn = get_db()
+        if name.endswith('.jsonl'):
+            try:
+                report = import_changeset(conn, io.TextIOWrapper(io.BytesIO(decoded), encoding='utf-8'),
+                                          policy or 'theirs')
+                grading_cache.invalidate()
+                comment_index.build(conn)
+                set_props('toast-save', {'is_open': True})
+                set_props('toast-save', {'children': html.Span([html.I(
+                    className="fa-solid fa-square-check me-1", style={"color": "#63e6be"}),
+                    f"Applied {report['tasks']} of {report['received']} changed task(s) "
+                    f"for {report['teams']} team(s)."])})
+                set_props('submission-refresh', {'data': time.time()})
+            except (ValueError, KeyError, TypeError, sqlite3.Error) as e:
+                set_props('toast-save', {'is_open': True})
+                set_props('toast-save', {'children': html.Span([html.I(
+                    className="fa-solid fa-square-xmark me-1", style={"color": "#ff3333"}),
+                    f"Error applying changeset: {str(e)}"])})
+            return
+
+        with tempfile.NamedTemporaryFile(suffix='.sqlite3', delete=False) as f:
             f.write(decoded)
-        with app.app_context():
-            conn = get_db()
-        cursor = conn.cursor()
+            name = f.name
         try:
-            # Connect to the uploaded database
-            other_conn = sqlite3.connect(name)
-            other_conn.row_factory = sqlite3.Row
-            other_cursor = other_conn.cursor()
-            other_cursor.execute(f"SELECT Team, Grade FROM [{assignment}]")
-            other_grades = other_cursor.fetchall()
-
-            # Process each record from the uploaded database
-            for row in other_grades:
-                team = row['Team']
-                uploaded_grade = row['Grade']
-
-                if not uploaded_grade:
-                    continue
-
-                cursor.execute(f"SELECT Grade FROM [{assignment}] WHERE Team = ?", (team,))
-                local_record = cursor.fetchone()
-
-                if local_record:
-                    try:
-                        # In case the team have got full marks on all tasks
-                        try: uploaded_grades = json.loads(uploaded_grade)
-                        except: uploaded_grades = {}
-                        try: local_grades = json.loads(local_record['Grade'])
-                        except: local_grades = {}
-
-                        # Only update the records that have penalties
-                        for task, comments in uploaded_grades.items():
-                            local_grades[task] = comments
-                        cursor.execute(f"UPDATE [{assignment}] SET Grade = ? WHERE Team = ?",
-                                    (json.dumps(local_grades), team))
-                    except:
-                        continue
-            conn.commit()
-            other_conn.close()
-
+            report = merge_database(conn, name, policy or 'theirs')
+            grading_cache.invalidate()
+            # Merges replace gradings wholesale, the comment index is rebuilt rather than updated line by line
+            comment_index.build(conn)
+
+            message = (f"Merged {report['tasks']} task(s) of {report['teams']} team(s) "
+                       f"from {len(report['assignments'])} assignment(s).")
+            if report['skipped']:
+                message += f" Skipped assignments missing locally: {', '.join(report['skipped'])}."
             set_props('toast-save', {'is_open': True})
             set_props('toast-save', {'children': html.Span([html.I(
-                className="fa-solid fa-square-check me-1", style={"color": "#63e6be"}),
-                "Grades from other tutors merged successfully!"])})
-            set_props('submission-list', {'children': get_submission_list(assignment)})
+                className="fa-solid fa-square-check me-1", style={"color": "#63e6be"}), message])})
+            set_props('submission-refresh', {'data': time.time()})
         except sqlite3.Error as e:
             set_props('toast-save', {'is_open': True})
             set_props('toast-save', {'children': html.Span([html.I(
                 className="fa-solid fa-square-xmark me-1", style={"color": "#ff3333"}),
                 f"Error merging grades: {str(e)}"])})
         finally:
-            # add connection close for second connection, in case sql operation failed without closing first
-            try:
-                other_conn.close()
-            except sqlite3.Error:
-                # connection already closed
-                pass
-            except NameError:
-                # connection was never defined
-                pass
-
             if os.path.exists(name):
                 os.remove(name)
 
+    @dash_app.callback(Output('changeset-downloader', 'data'),
+                       Output('last-export', 'data'),
+                       Input('export-changes', 'n_clicks'),
+                       State('export-scope', 'value'),
+                       State('last-export', 'data'),
+                       prevent_initial_call=True)
+    def export_changes(export, scope, last_export):
+        """
+        Download the gradings changed since the last export from this browser as a changeset
+        """
+        since = (last_export or 0.0) if scope == 'since-last' else 0.0
+        conn = get_db()
+        changeset = io.StringIO()
+        report = export_changeset(conn, changeset, since)
+        if not report['tasks']:
+            set_props('toast-save', {'is_open': True})
+            set_props('toast-save', {'children': "No gradings changed since the last export."})
+            return dash.no_update, dash.no_update
+        return (dcc.send_string(changeset.getvalue(), f"{lecture_marker}_changes_{int(report['until'])}.jsonl"),
+                report['until'])
+
+    @dash_app.callback(Output('gradebook-downloader', 'data'),
+                       Input('export-gradebook', 'n_clicks'),
+                       prevent_initial_call=True)
+    def export_lecture_gradebook(export):
+        """
+        Download the points of every student in all assignments of the lecture as an xlsx workbook
+        """
+        conn = get_db()
+        return dcc.send_bytes(lambda buffer: export_gradebook(conn, lecture_config, buffer, 'xlsx'),
+                              f"Gradebook_{lecture_marker}.xlsx")
+
     @dash_app.callback(Output('downloader', 'data'),
                        Input('generate', 'n_clicks'),
                        State('assignment-select', 'value'),
@@ -513,79 +785,14 @@ def create_app(lecture_marker, output_dir, config):
             set_props('toast-save', {'children': "You need to select an assignment!"})
             return dash.no_update
 
-        assignment_match = re.search(r'\d+$', assignment)
-        assignment_id = int(assignment_match.group()) if assignment_match else None
-        per_task_scores = read_config(app.config['LECTURE_CONFIG'])['tasks'][assignment_id - 1]
-
-        os.makedirs('feedbacks', exist_ok=True)
-        with app.app_context():
-            conn = get_db()
-        groups = pd.read_sql_query(f"SELECT [First Name], [Last Name], Team, Grade FROM [{assignment}]", conn)
-        conn.close()
-
-        for team, group in groups.groupby('Team'):
-            members = group.reset_index(drop=True)
-            student_names = [f"{student[1]['First Name']} {student[1]['Last Name']}"
-                             for student in members.iterrows()]
+        spec = lecture_config.for_table(assignment)
+        if spec is None:
+            set_props('toast-save', {'is_open': True})
+            set_props('toast-save', {'children': f"No task specification found for {assignment} in the lecture config!"})
+            return dash.no_update
 
-            try:
-                feedbacks = json.loads(members.at[0, 'Grade'])
-            except:
-                feedbacks = {}
-
-            overall_score = 0
-            markdown_str = f"# Feedback on {assignment} for Team {team}\n\n"
-            markdown_str += f"Students: {', '.join(student_names)}\n\n"
-
-            tasks_str = ''
-            # Iterate through each task
-            for task, max_points in per_task_scores.items():
-                remaining_points = int(max_points)
-
-                # Calculate the remaining points and update the comments
-                penalty_str = "Penalties:\n\n"
-                if task in feedbacks.keys():
-                    for penalty, comment in feedbacks[task]:
-                        if penalty is None:
-                            if comment is None: continue    # Empty comment line
-                            else: penalty = 0               # Comment with no penalty
-                        if penalty >= 0:
-                            penalty = -penalty
-                        penalty_str += f"- **{penalty}** points: {comment}\n\n"
-                        remaining_points += penalty
-                    if remaining_points < 0:
-                        remaining_points = 0
-
-                tasks_str += f"## Task {task}\n\n"
-                tasks_str += f"Points reached: **{remaining_points}/{max_points}**.\n\n"
-
-                # Determine the displayed message based on the remaining points
-                if remaining_points == int(max_points):
-                    # In case the student has got full marks on this task,
-                    # but the tutor still wants to leave a comment
-                    if len(penalty_str) > 12:
-                        tasks_str += penalty_str
-                    tasks_str += f"Well done, you have got full marks on this task!\n\n"
-                else:
-                    tasks_str += penalty_str
-                overall_score += remaining_points
-
-            markdown_str += f"Overall Score: **{overall_score}/100**\n\n"
-            markdown_str += tasks_str
-
-            lastnames = [student[1]['Last Name'] for student in members.iterrows()]
-            with open(os.path.join('feedbacks', f"{team}_{'_'.join(lastnames)}.md"), 'w') as f:
-                f.write(markdown_str)
-        # zip the files
-        with zipfile.ZipFile(f"Feedbacks_{assignment}.zip", 'w') as zipf:
-            for file in os.listdir('feedbacks'):
-                zipf.write(os.path.join('feedbacks', file),
-                           os.path.relpath(os.path.join('feedbacks', file), 'feedbacks'))
-        # clean up
-        with open(f"Feedbacks_{assignment}.zip", 'rb') as f:
-            zip_byte = f.read()
-        os.remove(f"Feedbacks_{assignment}.zip")
-        shutil.rmtree('feedbacks', ignore_errors=True)
+        conn = get_db()
+        zip_byte = build_feedback_archive(conn, assignment, spec)
 
         return dcc.send_bytes(zip_byte, f"Feedbacks_{assignment}.zip")
     return app
@@ -0,0 +1,24 @@
+import sqlite3
+
+import pytest
+
+from src.database import init_db
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    init_db(conn)
+    yield conn
+    conn.close()
+
+
+def create_real_team_table(conn: sqlite3.Connection, assignment: str = 'Assignment 1') -> None:
+    """
+    Assignment table as pandas' to_sql wrote it when a team cell was empty: the Team column is REAL
+    """
+    conn.execute(f"""CREATE TABLE [{assignment}] ([Last Name] TEXT, [First Name] TEXT, Anmeldename TEXT, Team REAL)""")
+    conn.executemany(f"INSERT INTO [{assignment}] VALUES (?, ?, ?, ?)",
+                     [('Muster', 'Alex', 'a.muster', 12.0), ('Ley', 'Eliza', 'e.ley', 12.0),
+                      ('May', 'Karl', 'k.may', 13.0), ('Karl', 'May', 'm.karl', None)])
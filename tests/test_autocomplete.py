@@ -0,0 +1,41 @@
+from src.autocomplete import CommentIndex, Suggestion
+from src.database import set_team_grades
+
+
+def test_suggest_by_3grams(conn):
+    set_team_grades(conn, 'Assignment 1', 1, {'1': [(-1, 'Missing edge case'), (None, 'Nice recursion')],
+                                              '2': [(-2, 'Off-by-one in the loop')]})
+    set_team_grades(conn, 'Assignment 1', 2, {'1': [(-1, 'Missing edge case'), (-0.5, 'Edge case for empty input')]})
+    index = CommentIndex()
+    index.build(conn)
+
+    # Comments starting with the text come first, then the most frequent ones
+    assert index.suggest('edge') == [Suggestion('Edge case for empty input', -0.5, 1),
+                                     Suggestion('Missing edge case', -1.0, 2)]
+    # Every word has to occur, in any order and case
+    assert index.suggest('CASE  missing') == [Suggestion('Missing edge case', -1.0, 2)]
+    # Words shorter than a 3-gram are looked up by prefix
+    assert [suggestion.comment for suggestion in index.suggest('ni')] == ['Nice recursion']
+    assert [suggestion.comment for suggestion in index.suggest('e')] == ['Edge case for empty input']
+    assert index.suggest('edge zzz') == []
+    assert index.suggest('  ') == []
+    assert index.suggest('case', limit=1) == [Suggestion('Missing edge case', -1.0, 2)]
+
+
+def test_index_follows_edits_and_deletes():
+    index = CommentIndex()
+    index.add([(-1, 'Missing edge case'), (-1, 'Missing edge case'), (None, 'Nice')])
+    assert index.suggest('edge') == [Suggestion('Missing edge case', -1.0, 2)]
+
+    # Editing one of the comments replaces its line
+    index.remove([(-1, 'Missing edge case')])
+    index.add([(-2, 'Missing edge case for empty input')])
+    assert index.suggest('edge') == [Suggestion('Missing edge case', -1.0, 1),
+                                     Suggestion('Missing edge case for empty input', -2.0, 1)]
+
+    # Once its last line is deleted a comment is forgotten, also by its 3-grams and its prefix
+    index.remove([(-1, 'Missing edge case'), (None, 'Nice')])
+    assert index.suggest('edge') == [Suggestion('Missing edge case for empty input', -2.0, 1)]
+    assert index.suggest('ni') == []
+    index.remove([(-2, 'Missing edge case for empty input'), (-2, 'Never given')])
+    assert index.suggest('mis') == [] and index.suggest('m') == []
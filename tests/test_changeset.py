@@ -0,0 +1,96 @@
+import io
+import json
+import sqlite3
+
+import pytest
+
+from src.changeset import export_changeset, import_changeset
+from src.database import get_team_grades, init_db, set_task_lines, set_team_grades
+
+from tests.conftest import create_real_team_table
+
+
+def _changeset(*changes) -> io.StringIO:
+    header = {'format': 'grading-changeset', 'version': 1, 'since': 0.0, 'until': 0.0, 'tasks': len(changes)}
+    return io.StringIO(''.join(json.dumps(record) + '\n' for record in (header,) + changes))
+
+
+def _change(team, task, lines, updated_at=100.0, assignment='Assignment 1') -> dict:
+    return {'assignment': assignment, 'team': team, 'task': task, 'lines': lines, 'updated_at': updated_at}
+
+
+@pytest.fixture
+def other():
+    other = sqlite3.connect(':memory:')
+    init_db(other)
+    create_real_team_table(other)
+    yield other
+    other.close()
+
+
+def test_export_import_roundtrip(conn, other):
+    create_real_team_table(conn)
+    set_team_grades(other, 'Assignment 1', 12, {'1': [(-1, 'Missing edge case'), (None, 'Nice')], '2': []})
+    set_team_grades(other, 'Assignment 1', 13, {'1': [(-2.5, 'Wrong base case')]})
+    changeset = io.StringIO()
+    assert export_changeset(other, changeset)['tasks'] == 3
+
+    changeset.seek(0)
+    # Task 2 has no lines on either side and is left alone
+    assert import_changeset(conn, changeset) == {'received': 3, 'teams': 2, 'tasks': 2}
+    for team in (12, 13):
+        assert get_team_grades(conn, 'Assignment 1', team) == get_team_grades(other, 'Assignment 1', team)
+
+    # Only what changed after the 'until' of an export is exported next
+    until = json.loads(changeset.getvalue().splitlines()[0])['until']
+    assert export_changeset(other, io.StringIO(), until)['tasks'] == 0
+
+
+@pytest.mark.parametrize('policy, expected', [
+    ('theirs', {'1': [(-3, 'Theirs, older')], '2': [(-4, 'Theirs, newer')]}),
+    ('mine', {'1': [(-1, 'Mine, newer')], '2': [(-2, 'Mine, older')]}),
+    ('newest', {'1': [(-1, 'Mine, newer')], '2': [(-4, 'Theirs, newer')]}),
+])
+def test_import_policies(conn, policy, expected):
+    create_real_team_table(conn)
+    set_task_lines(conn, 'Assignment 1', 12, '1', [(-1, 'Mine, newer')], 200.0)
+    set_task_lines(conn, 'Assignment 1', 12, '2', [(-2, 'Mine, older')], 100.0)
+    conn.commit()
+
+    import_changeset(conn, _changeset(_change(12, '1', [[-3, 'Theirs, older']], 150.0),
+                                      _change(12, '2', [[-4, 'Theirs, newer']], 150.0)), policy)
+    assert get_team_grades(conn, 'Assignment 1', 12) == expected
+
+
+def test_import_repeated_task_takes_last_occurrence(conn):
+    create_real_team_table(conn)
+    report = import_changeset(conn, _changeset(_change(12, '1', [[-1, 'First'], [-1, 'Second']]),
+                                               _change(12.0, '1', [[-2, 'Last']], 200.0)))
+    assert report['received'] == 1
+    assert get_team_grades(conn, 'Assignment 1', 12) == {'1': [(-2, 'Last')]}
+
+
+def test_import_concatenated_changesets(conn):
+    create_real_team_table(conn)
+    changeset = io.StringIO(_changeset(_change(12, '1', [[-1, 'First']])).getvalue() +
+                            _changeset(_change(12, '1', [[-2, 'Second']], 200.0),
+                                       _change(13, '1', [[None, 'Nice']], 200.0)).getvalue())
+    assert import_changeset(conn, changeset)['received'] == 2
+    assert get_team_grades(conn, 'Assignment 1', 12) == {'1': [(-2, 'Second')]}
+    assert get_team_grades(conn, 'Assignment 1', 13) == {'1': [(None, 'Nice')]}
+
+
+@pytest.mark.parametrize('lines, message', [
+    (['{"assignment": "Assignment 1", "team": 12, "task": "1", "lines": []}'], "Line 2 .* missing updated_at"),
+    (['{"format": "grading-changeset", "version": 2}'], "unsupported changeset version"),
+    (['', '{"assignment": "Assignment 1"'], "Line 3 .* not valid JSON"),
+    (['[1, 2]'], "Line 2 .* not a change record"),
+    (['{"assignment": "Assignment 1", "team": 12, "task": "1", "lines": [-1], "updated_at": 1}'],
+     "Line 2 .* malformed lines"),
+])
+def test_import_rejects_malformed_records(conn, lines, message):
+    create_real_team_table(conn)
+    changeset = _changeset().getvalue() + ''.join(line + '\n' for line in lines)
+    with pytest.raises(ValueError, match=message):
+        import_changeset(conn, io.StringIO(changeset))
+    assert get_team_grades(conn, 'Assignment 1', 12) == {}
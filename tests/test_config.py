@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from src.config import AssignmentSpec, LectureConfig, parse_config
+from src.feedback import render_feedback
+
+CONFIG = """# TODO
+number=5
+filepath=grading_5.csv
+max_points={'1': '27.5', '2': 3, 3: 101}
+assignment_xlsx=Assignment 5.xlsx
+# Assignment 6 was skipped
+number=7
+max_points={'1a': 10, '1b': 5.5}
+"""
+
+
+def _write(path, text: str) -> str:
+    with open(path, 'w') as f:
+        f.write(text)
+    return str(path)
+
+
+def test_parse_config(tmp_path):
+    specs = parse_config(_write(tmp_path / 'config.txt', CONFIG))
+    assert specs == {5: AssignmentSpec(5, ('1', '2', '3'), (27.5, 3.0, 101.0), 'grading_5.csv', 'Assignment 5.xlsx'),
+                     7: AssignmentSpec(7, ('1a', '1b'), (10.0, 5.5))}
+    assert specs[5].total_points == 131.5
+
+
+def test_parse_config_without_max_points(tmp_path):
+    with pytest.raises(IOError, match="missing max_points for assignment no.6"):
+        parse_config(_write(tmp_path / 'config.txt', CONFIG + "number=6\nfilepath=grading_6.csv\n"))
+
+
+def test_lecture_config_lookup_and_reload(tmp_path):
+    path = _write(tmp_path / 'config.txt', CONFIG)
+    config = LectureConfig(path)
+    assert config.for_table('Assignment 7').max_points == (10.0, 5.5)
+    assert config.for_table('Assignment 6') is None
+    assert config.for_table('Notes') is None
+
+    _write(path, CONFIG.replace("'1b': 5.5", "'1b': 6"))
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 1))
+    assert config.get(7).max_points == (10.0, 6.0)
+
+
+def test_render_feedback_totals(tmp_path):
+    spec = parse_config(_write(tmp_path / 'config.txt', CONFIG))[5]
+    # Task 3 has no grading and counts with its full points
+    feedback = render_feedback('Assignment 5', 12, ['Alex Muster'], {'1': [(-2, 'Off-by-one'), (None, 'Nice')],
+                                                                     '2': [(5, 'Way off')]}, spec)
+    assert "Overall Score: **126.5/131.5**" in feedback
+    assert "Points reached: **25.5/27.5**" in feedback
+    assert "Points reached: **0/3**" in feedback
+    assert "Points reached: **101/101**" in feedback
+
+    spec = parse_config(_write(tmp_path / 'config.txt', CONFIG))[7]
+    assert "Overall Score: **15.5/15.5**" in render_feedback('Assignment 7', 1, [], {}, spec)
@@ -0,0 +1,59 @@
+import sqlite3
+
+from src.database import (get_task_versions, get_team_grades, init_db, merge_database, query_team_order,
+                          query_team_page, save_task_changes, set_task_lines, set_team_grades, team_key_sql)
+
+from tests.conftest import create_real_team_table
+
+
+def test_team_key_sql_matches_team_key(conn):
+    for value, key in ((12.0, '12'), (12.5, '12.5'), (12, '12'), ('12.0', '12.0'), ('a', 'a')):
+        assert conn.execute(f"SELECT {team_key_sql('Team')} FROM (SELECT ? AS Team)", (value,)).fetchone()[0] == key
+
+
+def test_query_team_page_with_real_teams(conn):
+    create_real_team_table(conn)
+    set_team_grades(conn, 'Assignment 1', 12, {'1': [(-1, 'Missing edge case')]})
+
+    total, teams = query_team_page(conn, 'Assignment 1', status='graded')
+    assert (total, teams) == (1, [(12.0, True)])
+    total, teams = query_team_page(conn, 'Assignment 1', status='ungraded')
+    assert [team for team, _ in teams] == [None, 13.0]
+    assert query_team_page(conn, 'Assignment 1', team_filter='12.0') == (0, [])
+    assert query_team_page(conn, 'Assignment 1', team_filter='12')[0] == 1
+    assert query_team_order(conn, 'Assignment 1', status='graded') == ['12']
+
+
+def test_merge_into_real_teams(conn, tmp_path):
+    other = sqlite3.connect(tmp_path / 'other.sqlite3')
+    init_db(other)
+    create_real_team_table(other)
+    set_team_grades(other, 'Assignment 1', 12, {'1': [(-1, 'Missing edge case')], '2': [(None, 'Nice')]})
+    set_team_grades(other, 'Assignment 1', 99, {'1': [(-2, 'Unknown team')]})
+    other.commit()
+    other.close()
+    create_real_team_table(conn)
+
+    report = merge_database(conn, str(tmp_path / 'other.sqlite3'))
+    # Team 99 doesn't exist locally, the row without a team must not keep it from being skipped
+    assert (report['teams'], report['tasks']) == (1, 2)
+    assert get_team_grades(conn, 'Assignment 1', 99) == {}
+    assert get_team_grades(conn, 'Assignment 1', 12) == {'1': [(-1, 'Missing edge case')], '2': [(None, 'Nice')]}
+
+
+def test_save_task_changes_compare_and_swap(conn):
+    create_real_team_table(conn)
+    set_task_lines(conn, 'Assignment 1', 12, '1', [(-1, 'First save')])
+    assert get_task_versions(conn, 'Assignment 1', 12) == {'1': 1}
+
+    # Task 1 is based on its current version, task 2 on never having been graded
+    saved, conflicts = save_task_changes(conn, 'Assignment 1', 12.0, {'1': (1, [(-2, 'Mine')]), '2': (0, [])})
+    assert (saved, conflicts) == ({'1': 2, '2': 1}, [])
+
+    # A save based on versions someone else has since advanced changes nothing
+    saved, conflicts = save_task_changes(conn, 'Assignment 1', 12, {'1': (1, [(-3, 'Stale')]),
+                                                                    '2': (0, [(-4, 'Stale')]),
+                                                                    '3': (0, [(None, 'New')])})
+    assert (saved, sorted(conflicts)) == ({'3': 1}, ['1', '2'])
+    assert get_team_grades(conn, 'Assignment 1', 12) == {'1': [(-2, 'Mine')], '3': [(None, 'New')]}
+    assert get_task_versions(conn, 'Assignment 1', 12) == {'1': 2, '2': 1, '3': 1}
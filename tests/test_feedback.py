@@ -0,0 +1,20 @@
+import io
+import zipfile
+
+from src.config import AssignmentSpec
+from src.database import set_team_grades
+from src.feedback import build_feedback_archive
+
+from tests.conftest import create_real_team_table
+
+SPEC = AssignmentSpec(number=1, tasks=('1', '2'), max_points=(10.0, 5.0))
+
+
+def test_archive_skips_students_without_team(conn):
+    create_real_team_table(conn)
+    set_team_grades(conn, 'Assignment 1', 12, {'1': [(-1, 'Missing edge case')]})
+
+    with zipfile.ZipFile(io.BytesIO(build_feedback_archive(conn, 'Assignment 1', SPEC))) as archive:
+        names = archive.namelist()
+    assert len(names) == 2
+    assert not any(name.startswith('None') for name in names)
@@ -0,0 +1,44 @@
+import io
+
+import pytest
+
+from src.config import AssignmentSpec
+from src.database import get_assignment_grades, set_team_grades, team_key
+from src.gradebook import iter_gradebook, write_gradebook_csv
+from src.scoring import score_grades
+
+from tests.conftest import create_real_team_table
+
+SPEC = AssignmentSpec(number=1, tasks=('1', '2', '3'), max_points=(10.0, 5.0, 2.5))
+
+
+@pytest.fixture
+def graded(conn):
+    create_real_team_table(conn)
+    set_team_grades(conn, 'Assignment 1', 12, {'1': [(-2, 'Off-by-one'), (-0.5, 'Units')],
+                                               '2': [(-7, 'Wrong base case')], '3': [(None, 'Nice')]})
+    return conn
+
+
+def test_gradebook_matches_score_grades(graded):
+    header, *rows = iter_gradebook(graded, [('Assignment 1', SPEC)])
+    assert header == ['Login', 'Last Name', 'First Name', 'Assignment 1', 'Assignment 1 Task 1',
+                      'Assignment 1 Task 2', 'Assignment 1 Task 3', 'Total']
+
+    grades = get_assignment_grades(graded, 'Assignment 1')
+    scores = score_grades(grades, SPEC, ['12'])
+    rows = {row[0]: row for row in rows}
+    for login in ('a.muster', 'e.ley'):
+        assert rows[login][4:7] == scores.points[scores.index('12')].tolist()
+        assert rows[login][3] == rows[login][7] == scores.total('12')
+    # Teams without gradings stay empty instead of getting full points
+    assert rows['k.may'][3:] == [None, None, None, None, None]
+
+
+def test_gradebook_csv_totals_only(graded):
+    output = io.StringIO()
+    assert write_gradebook_csv(iter_gradebook(graded, [('Assignment 1', SPEC)], totals_only=True), output) == 4
+    lines = output.getvalue().splitlines()
+    assert lines[0] == 'Login,Last Name,First Name,Assignment 1,Total'
+    assert 'a.muster,Muster,Alex,10,10' in lines
+    assert 'k.may,May,Karl,,' in lines
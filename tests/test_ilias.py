@@ -0,0 +1,21 @@
+import pytest
+from selenium import webdriver
+
+from src.ilias import upload_to_ilias
+
+
+class _FailingDriver:
+    quit_calls = 0
+
+    def get(self, url):
+        raise RuntimeError("ILIAS is not reachable")
+
+    def quit(self):
+        _FailingDriver.quit_calls += 1
+
+
+def test_browser_closed_when_upload_fails(tmp_path, monkeypatch):
+    monkeypatch.setattr(webdriver, 'Chrome', _FailingDriver)
+    with pytest.raises(RuntimeError):
+        upload_to_ilias(str(tmp_path), ilias_url='http://127.0.0.1:1/')
+    assert _FailingDriver.quit_calls == 1
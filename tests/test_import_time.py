@@ -0,0 +1,9 @@
+from benchmarks.import_time import MODES, check_modes
+
+
+def test_modes_import_within_budget():
+    results = check_modes(runs=1)
+    assert [result['mode'] for result in results] == list(MODES)
+    for result in results:
+        assert result['milliseconds'] <= result['budget'], result
+        assert result['forbidden'] == [], result
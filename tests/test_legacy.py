@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+from src.config import AssignmentSpec, parse_config
+from src.legacy import transcribe_assignment, transcribe_lecture
+
+SPEC = AssignmentSpec(number=1, tasks=('1', '2', '3'), max_points=(27.5, 3.0, 101.0))
+
+
+def test_blank_cell_counts_no_points(tmp_path):
+    sheet = tmp_path / 'grading.csv'
+    sheet.write_text(',1,2,3\n"bob","27.5","","101:nice work"\n')
+    result = transcribe_assignment(SPEC._replace(filepath=str(sheet)), 'test', str(tmp_path))
+
+    assert (result['written'], result['errored']) == (1, 0)
+    with open(os.path.join(tmp_path, 'ass1', 'test_ass1_feedback_bob.md')) as f:
+        assert f.read().endswith('\nTotal points reached: 128.5 of 131.5')
+
+
+# Grading sheets and the feedbacks the pandas/tabulate implementation (DataFrame.to_markdown) wrote for them:
+# multiline, wide and unicode comments, empty (NaN) points and integer as well as float columns
+DATA = os.path.join(os.path.dirname(__file__), 'data', 'legacy')
+SHEETS = [(AssignmentSpec(number=1, tasks=('1', '2', '3'), max_points=(27.5, 3.0, 101.0),
+                          filepath=os.path.join(DATA, 'grading_ass1.csv')), 1),
+          (AssignmentSpec(number=2, tasks=('1', '2'), max_points=(10.0, 5.0),
+                          filepath=os.path.join(DATA, 'grading_ass2.csv')), 0)]
+
+
+@pytest.mark.parametrize('spec, errored', SHEETS)
+def test_feedbacks_match_tabulate_output(tmp_path, spec, errored):
+    result = transcribe_assignment(spec, 'test', str(tmp_path))
+
+    expected_dir = os.path.join(DATA, 'expected', f"ass{spec.number}")
+    assert sorted(result['files']) == sorted(os.listdir(expected_dir))
+    assert result['errored'] == errored
+    for name in os.listdir(expected_dir):
+        with open(os.path.join(expected_dir, name)) as expected, open(tmp_path / f"ass{spec.number}" / name) as f:
+            assert f.read() == expected.read(), name
+
+
+def test_example_feedbacks_unchanged(tmp_path):
+    root = os.path.dirname(os.path.dirname(__file__))
+    spec = parse_config(os.path.join(root, 'example', 'config_example.txt'))[1]
+    transcribe_assignment(spec._replace(filepath=os.path.join(root, spec.filepath)), 'ssbi24', str(tmp_path))
+
+    for name in os.listdir(os.path.join(root, 'example', 'ass1')):
+        with open(os.path.join(root, 'example', 'ass1', name)) as expected, open(tmp_path / 'ass1' / name) as f:
+            assert f.read() == expected.read(), name
+
+
+def test_unreadable_sheets_fail_only_their_assignment(tmp_path, capsys):
+    broken = tmp_path / 'broken.csv'
+    broken.write_bytes(b',1,2,3\n"b\xf6b","27.5","3","101"\n')
+    specs = [SPEC._replace(number=1, filepath=str(broken)), SPEC._replace(number=2, filepath=None),
+             SHEETS[0][0]._replace(number=3)]
+    report = transcribe_lecture(specs, 'test', str(tmp_path / 'out'), workers=2)
+
+    output = capsys.readouterr().out
+    assert f"Unable to transcribe {broken}" in output
+    assert "No grading sheet ('filepath=') configured for assignment no.2." in output
+    assert report['written'] == len(os.listdir(os.path.join(DATA, 'expected', 'ass1')))
@@ -0,0 +1,76 @@
+import contextlib
+import io
+import re
+
+import pytest
+
+from benchmarks.suite import DashClient, _value
+from benchmarks.synthetic_lecture import generate_lecture
+from src.metrics import Metrics
+from src.web_server import create_app
+
+# A sample of the text exposition format: name, optional labels, value
+_SAMPLE = re.compile(r'^([a-z_]+)(\{.*\})? (-?[0-9.e+-]+|\+Inf|NaN)$')
+
+
+@pytest.fixture
+def client(tmp_path):
+    lecture = generate_lecture(str(tmp_path), teams=3, tasks=2, assignments=1, lines=1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = create_app(lecture.lecture_marker, str(tmp_path), lecture.config, metrics=Metrics())
+    yield DashClient(app)
+    app.extensions['grading_cache'].close()
+    app.extensions['db_pool'].close()
+
+
+def _scrape(client) -> dict[str, float]:
+    response = client.client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    samples, types = {}, {}
+    for line in response.get_data(as_text=True).splitlines():
+        if line.startswith('# TYPE '):
+            _, _, name, kind = line.split(' ')
+            types[name] = kind
+        elif not line.startswith('# HELP '):
+            match = _SAMPLE.match(line)
+            assert match, line
+            name = match.group(1)
+            assert any(name == family or name.startswith(family + '_') for family in types), line
+            samples[name + (match.group(2) or '')] = float(match.group(3))
+    assert types == {'assignment_feedback_callback_duration_seconds': 'histogram',
+                     'assignment_feedback_callback_response_bytes': 'histogram',
+                     'assignment_feedback_callback_errors_total': 'counter',
+                     'assignment_feedback_sql_duration_seconds': 'histogram'}
+    return samples
+
+
+def _histogram(samples: dict[str, float], name: str, labels: str) -> tuple[list[float], float]:
+    buckets = [value for sample, value in samples.items()
+               if sample.startswith(f'{name}_bucket{{{labels},le=')]
+    # Buckets are cumulative and the last one holds every observation
+    assert buckets == sorted(buckets) and buckets[-1] == samples[f'{name}_count{{{labels}}}']
+    return buckets, samples[f'{name}_sum{{{labels}}}']
+
+
+def test_metrics_change_after_callback(client):
+    before = _scrape(client)
+    assert not any('callback="get_submission_list"' in sample for sample in before)
+
+    for _ in range(2):
+        client.call({'id': 'assignment-select', 'property': 'value'},
+                    [_value('assignment-select', 'value', 'Assignment 1'), _value('filter-team', 'value', None),
+                     _value('filter-name', 'value', None), _value('filter-status', 'value', 'all'),
+                     _value('sort-teams', 'value', 'team'), _value('submission-pagination', 'active_page', 1),
+                     _value('submission-refresh', 'data', None)])
+    after = _scrape(client)
+
+    labels = 'callback="get_submission_list"'
+    buckets, seconds = _histogram(after, 'assignment_feedback_callback_duration_seconds', labels)
+    assert buckets[-1] == 2 and seconds > 0
+    buckets, size = _histogram(after, 'assignment_feedback_callback_response_bytes', labels)
+    assert buckets[-1] == 2 and size > 0
+    # The statements of the callback were timed as well
+    statements = [sample for sample in after if sample.startswith('assignment_feedback_sql_duration_seconds_count')]
+    assert any(after[sample] > before.get(sample, 0) for sample in statements)
+    assert 'assignment_feedback_callback_errors_total{callback="get_submission_list"}' not in after
@@ -0,0 +1,93 @@
+import io
+import json
+import sqlite3
+
+from src.changeset import import_changeset
+from src.database import (delete_assignment_grades, init_db, merge_database, refresh_assignment_teams,
+                          save_task_changes, set_task_lines, set_team_grades)
+
+from tests.conftest import create_real_team_table
+
+# The summary tables as a full recomputation from the grades table yields them
+_RECOMPUTED = {
+    'task_deductions': """SELECT assignment, team, task, ROUND(SUM(COALESCE(ABS(penalty), 0)), 6), COUNT(*)
+                          FROM grades GROUP BY assignment, team, task""",
+    'deduction_counts': """SELECT assignment, task, deduction, COUNT(*)
+                           FROM (SELECT assignment, task, ROUND(SUM(COALESCE(ABS(penalty), 0)), 6) AS deduction
+                                 FROM grades GROUP BY assignment, team, task)
+                           GROUP BY assignment, task, deduction""",
+    'comment_counts': """SELECT assignment, task, comment, COUNT(*), ROUND(SUM(COALESCE(ABS(penalty), 0)), 6)
+                         FROM grades WHERE TRIM(comment) != '' GROUP BY assignment, task, comment""",
+}
+
+
+def assert_statistics_consistent(conn: sqlite3.Connection) -> None:
+    for table, query in _RECOMPUTED.items():
+        assert sorted(map(tuple, conn.execute(f"SELECT * FROM {table}"))) == sorted(map(tuple, conn.execute(query))), \
+            table
+    graded = dict(conn.execute("SELECT assignment, COUNT(DISTINCT team) FROM grades GROUP BY assignment").fetchall())
+    for assignment, teams, graded_teams in conn.execute("SELECT * FROM assignment_stats").fetchall():
+        assert graded_teams == graded.get(assignment, 0), assignment
+        assert teams == conn.execute(f"SELECT COUNT(DISTINCT Team) FROM [{assignment}]").fetchone()[0], assignment
+
+
+def _create_assignment(conn: sqlite3.Connection, assignment: str = 'Assignment 1') -> None:
+    # Importing an assignment sheet counts its teams, which the triggers don't
+    create_real_team_table(conn, assignment)
+    refresh_assignment_teams(conn, assignment)
+
+
+def test_statistics_follow_writes(conn):
+    for assignment in ('Assignment 1', 'Assignment 2'):
+        _create_assignment(conn, assignment)
+    assert tuple(conn.execute("SELECT * FROM assignment_stats WHERE assignment = 'Assignment 1'").fetchone()) == \
+        ('Assignment 1', 2, 0)
+
+    set_team_grades(conn, 'Assignment 1', 12, {'1': [(-0.1, 'Off-by-one'), (-0.2, 'Units')],
+                                               '2': [(None, 'Nice'), (-1, '  ')]})
+    set_team_grades(conn, 'Assignment 1', 13.0, {'1': [(-0.3, 'Off-by-one')], '2': [(None, 'Nice')]})
+    set_team_grades(conn, 'Assignment 2', 12, {'1': [(2, 'Off-by-one')]})
+    assert_statistics_consistent(conn)
+
+    # Replacing, emptying and compare-and-swapping single tasks
+    set_task_lines(conn, 'Assignment 1', 12, '1', [(-0.3, 'Off-by-one')])
+    set_task_lines(conn, 'Assignment 1', 13, '2', [])
+    save_task_changes(conn, 'Assignment 1', 13, {'1': (1, [(-5, 'Wrong base case')]), '3': (0, [(None, 'Nice')])})
+    assert_statistics_consistent(conn)
+
+    # Updates and deletes straight on the grades table
+    conn.execute("UPDATE grades SET penalty = -4, comment = 'Wrong base case' WHERE team = '12' AND task = '1'")
+    conn.execute("UPDATE grades SET task = '3' WHERE assignment = 'Assignment 1' AND team = '12' AND task = '2'")
+    assert_statistics_consistent(conn)
+    conn.execute("DELETE FROM grades WHERE assignment = 'Assignment 1' AND team = '13'")
+    assert_statistics_consistent(conn)
+    set_team_grades(conn, 'Assignment 1', 12, {})
+    delete_assignment_grades(conn, 'Assignment 2')
+    assert_statistics_consistent(conn)
+    assert conn.execute("SELECT COUNT(*) FROM task_deductions").fetchone()[0] == 0
+
+
+def test_statistics_follow_merges_and_changesets(conn, tmp_path):
+    _create_assignment(conn)
+    set_team_grades(conn, 'Assignment 1', 12, {'1': [(-1, 'Off-by-one')], '2': [(-2, 'Units')]})
+    set_team_grades(conn, 'Assignment 1', 13, {'1': [(-1, 'Off-by-one')]})
+    conn.commit()
+
+    other = sqlite3.connect(tmp_path / 'other.sqlite3')
+    init_db(other)
+    create_real_team_table(other)
+    set_team_grades(other, 'Assignment 1', 12, {'1': [(-0.5, 'Off-by-one'), (None, 'Nice')], '2': []})
+    set_team_grades(other, 'Assignment 1', 13, {'2': [(-3, 'Units')]})
+    other.commit()
+    other.close()
+    merge_database(conn, str(tmp_path / 'other.sqlite3'))
+    assert_statistics_consistent(conn)
+
+    header = {'format': 'grading-changeset', 'version': 1, 'since': 0.0, 'until': 0.0, 'tasks': 3}
+    changes = [{'assignment': 'Assignment 1', 'team': 13, 'task': '1', 'lines': [], 'updated_at': 4e9},
+               {'assignment': 'Assignment 1', 'team': 12, 'task': '3', 'lines': [[-1, 'Units'], [-1, 'Units']],
+                'updated_at': 4e9},
+               {'assignment': 'Assignment 1', 'team': 12, 'task': '2', 'lines': [[-2, 'Units']], 'updated_at': 4e9}]
+    import_changeset(conn, io.StringIO(''.join(json.dumps(record) + '\n' for record in [header] + changes)))
+    assert_statistics_consistent(conn)
+    assert tuple(conn.execute("SELECT uses, deduction FROM comment_counts WHERE task = '3'").fetchone()) == (2, 2.0)
@@ -0,0 +1,49 @@
+import io
+
+import openpyxl
+import pytest
+
+import src.utils
+from src.database import get_assignment_summary
+from src.utils import excel_to_sqlite
+
+ROWS = 25
+
+
+def _workbook(path_or_buffer) -> None:
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(['Vorname', 'Nachname', 'Anmeldename', 'Team', 'Punkte'])
+    for i in range(ROWS):
+        # Points are integers in the first rows and floats afterwards, their column must still be REAL
+        sheet.append([f"First{i}", f"Last{i}", f"login{i}", i // 2 + 1, i if i < 5 else i + 0.5])
+    workbook.save(path_or_buffer)
+
+
+@pytest.mark.parametrize('from_buffer', [False, True])
+def test_excel_to_sqlite(conn, tmp_path, monkeypatch, from_buffer):
+    monkeypatch.setattr(src.utils, '_IMPORT_BATCH_SIZE', 10)
+    if from_buffer:
+        xlsx_file = io.BytesIO()
+        _workbook(xlsx_file)
+        xlsx_file.seek(0)
+    else:
+        xlsx_file = str(tmp_path / 'Assignment 1.xlsx')
+        _workbook(xlsx_file)
+
+    assert excel_to_sqlite(xlsx_file, conn, table_name='Assignment 1' if from_buffer else None)
+    columns = {row[1]: row[2] for row in conn.execute("PRAGMA table_info([Assignment 1])")}
+    assert columns == {'id': 'INTEGER', 'First Name': 'TEXT', 'Last Name': 'TEXT', 'Anmeldename': 'TEXT',
+                       'Team': 'INTEGER', 'Punkte': 'REAL'}
+    rows = conn.execute("SELECT [First Name], Team, Punkte FROM [Assignment 1] ORDER BY id").fetchall()
+    assert len(rows) == ROWS
+    assert tuple(rows[0]) == ('First0', 1, 0.0)
+    assert tuple(rows[-1]) == (f"First{ROWS - 1}", 13, ROWS - 0.5)
+    assert get_assignment_summary(conn, 'Assignment 1') == (13, 0)
+
+
+def test_excel_to_sqlite_buffer_needs_table_name(conn):
+    xlsx_file = io.BytesIO()
+    _workbook(xlsx_file)
+    with pytest.raises(ValueError, match="table name is required"):
+        excel_to_sqlite(xlsx_file, conn)
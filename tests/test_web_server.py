@@ -0,0 +1,120 @@
+import contextlib
+import io
+import json
+
+import pytest
+
+from benchmarks.suite import DashClient, _value
+from benchmarks.synthetic_lecture import generate_lecture
+from src.database import connect, get_team_grades, set_task_lines
+import src.web_server
+from src.web_server import create_app
+
+ASSIGNMENT = 'Assignment 1'
+
+
+@pytest.fixture
+def client(tmp_path):
+    lecture = generate_lecture(str(tmp_path), teams=3, tasks=2, assignments=1, lines=1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = create_app(lecture.lecture_marker, str(tmp_path), lecture.config)
+    yield DashClient(app), lecture
+    app.extensions['grading_cache'].close()
+    app.extensions['db_pool'].close()
+
+
+def _open_team(client, team):
+    button = {'type': 'view-button', 'index': team}
+    response = json.loads(client.call({'id': button, 'property': 'n_clicks'}, [[_value(button, 'n_clicks', 1)]],
+                                      [_value('assignment-select', 'value', ASSIGNMENT),
+                                       _value('filter-team', 'value', None), _value('filter-name', 'value', None),
+                                       _value('filter-status', 'value', 'all'), _value('sort-teams', 'value', 'team')]))
+    return response['response']['grading-base']['data'], response['response']['grading-order']['data']
+
+
+def _grading_inputs(team, lines):
+    ids = [f"{task}_{i}" for task, task_lines in lines.items() for i in range(len(task_lines))]
+    values = [line for task_lines in lines.values() for line in task_lines]
+    return [[_value({'type': 'penalty-input', 'index': i}, 'value', penalty) for i, (penalty, _) in zip(ids, values)],
+            [_value({'type': 'comment-input', 'index': i}, 'value', comment) for i, (_, comment) in zip(ids, values)],
+            [_value({'type': 'comment-input', 'index': i}, 'id', {'type': 'comment-input', 'index': i}) for i in ids],
+            _value('team-name', 'children', team)]
+
+
+def _toast(response: bytes) -> str:
+    return json.dumps(json.loads(response).get('sideUpdate', {}).get('toast-save', {}))
+
+
+def test_save_after_conflicting_save_and_next(client):
+    client, lecture = client
+    team = str(lecture.teams[0])
+    base, order = _open_team(client, team)
+
+    # Another tutor saves task 2 while the team is open
+    conn = connect(lecture.database)
+    set_task_lines(conn, ASSIGNMENT, team, '2', [(-1, 'Graded by someone else')])
+    conn.commit()
+    conn.close()
+
+    lines = {'1': [(-2, 'Mine')], '2': [(-3, 'Also mine')]}
+    response = json.loads(client.call({'id': 'save-next', 'property': 'n_clicks'},
+                                      [_value('save-previous', 'n_clicks', None), _value('save-next', 'n_clicks', 1)],
+                                      _grading_inputs(team, lines) + [_value('grading-base', 'data', base),
+                                                                      _value('grading-order', 'data', order)]))
+    assert 'Task(s) 2 of team' in json.dumps(response['sideUpdate']['toast-save'])
+    # The view stays on the team, with task 1 based on the version just saved
+    assert 'modal-view' not in response['response']
+    base = response['response']['grading-base']['data']
+    assert base['lines']['1'] == [[-2, 'Mine']]
+
+    # Saving again only reports task 2, task 1 is unchanged since its save
+    toast = _toast(client.call({'id': 'save-button', 'property': 'n_clicks'}, [_value('save-button', 'n_clicks', 1)],
+                               _grading_inputs(team, lines) + [_value('assignment-select', 'value', ASSIGNMENT),
+                                                               _value('grading-base', 'data', base)],
+                               no_output=True))
+    assert 'Task(s) 2 of team' in toast and 'Task(s) 1' not in toast
+
+
+def _save(client, team, lines, base):
+    return json.loads(client.call({'id': 'save-button', 'property': 'n_clicks'}, [_value('save-button', 'n_clicks', 1)],
+                                  _grading_inputs(team, lines) + [_value('assignment-select', 'value', ASSIGNMENT),
+                                                                  _value('grading-base', 'data', base)],
+                                  no_output=True))
+
+
+def test_save_conflict(client):
+    client, lecture = client
+    team = str(lecture.teams[0])
+    base, _ = _open_team(client, team)
+
+    conn = connect(lecture.database)
+    set_task_lines(conn, ASSIGNMENT, team, '1', [(-1, 'Graded by someone else')])
+    conn.commit()
+
+    response = _save(client, team, {'1': [(-2, 'Mine')]}, base)
+    assert 'Task(s) 1 of team' in json.dumps(response['sideUpdate']['toast-save'])
+    # Nothing was saved, so the submission list is left alone
+    assert 'submission-refresh' not in response['sideUpdate']
+    assert get_team_grades(conn, ASSIGNMENT, team) == {'1': [(-1, 'Graded by someone else')]}
+    conn.close()
+
+
+def test_save_refreshes_submission_page(client, monkeypatch):
+    client, lecture = client
+    monkeypatch.setattr(src.web_server, '_PAGE_SIZE', 1)
+    team = str(lecture.teams[-1])
+    base, _ = _open_team(client, team)
+
+    response = _save(client, team, {'1': [(-2, 'Mine')]}, base)
+    # The saved team's row is not necessarily rendered, the list is refreshed instead of updating its icon
+    assert 'submission-refresh' in response['sideUpdate']
+    assert not any(component.startswith('graded_') for component in response['sideUpdate'])
+
+    response = json.loads(client.call({'id': 'submission-refresh', 'property': 'data'},
+                                      [_value('assignment-select', 'value', ASSIGNMENT),
+                                       _value('filter-team', 'value', None), _value('filter-name', 'value', None),
+                                       _value('filter-status', 'value', 'all'), _value('sort-teams', 'value', 'team'),
+                                       _value('submission-pagination', 'active_page', 3),
+                                       _value('submission-refresh', 'data', 1.0)]))
+    assert response['response']['submission-pagination'] == {'max_value': 3, 'active_page': 3}
+    assert 'fa-solid fa-check' in json.dumps(response['response']['submission-list'])